@@ -0,0 +1,218 @@
+#
+# bench_compute.py
+#
+# End-to-end throughput benchmark of the proj04_compute handler,
+# without deploying it. Generates a corpus of synthetic PDFs (see
+# synthpdf.py) across page counts, numbers per page, layouts and
+# digit distributions, then runs the unmodified handler on each
+# against filesystem stand-ins for S3 and the database (see
+# localenv.py). Reports pages/sec, numbers/sec, peak RSS and the
+# time split across the stages of the job.
+#
+# Each case runs in a fresh interpreter, so that peak RSS and
+# import costs are per case.
+#
+# Usage:
+#   python3 benchmarks/bench_compute.py [--pages 10,50] [--numbers 50,400]
+#           [--layouts prose,table] [--distributions benford,uniform]
+#           [--set section.option=value ...] [--keep DIR]
+#           [--s3-latency-ms 0] [--s3-mbps 0] [--db-latency-ms 0]
+#           [--options JSON]
+#
+# The last three simulate the network as seen from Lambda, so that
+# the I/O stages (and pipelined mode, see config.ini) can be
+# measured. --options gives the job options of every case, e.g.
+# '{"sample": {"percent": 10}}' (see joboptions.py).
+#
+
+import argparse
+import configparser
+import contextlib
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+COMPUTE_DIR = os.path.join(HERE, "..", "lambda-functions", "proj04_compute")
+LAYER_DIR = os.path.join(HERE, "..", "lambda-functions", "layer", "python")
+
+sys.path.insert(0, HERE)
+
+import localenv  # noqa: E402
+import synthpdf  # noqa: E402
+
+
+#
+# settings for every run, so each case measures the full
+# pipeline in a single invocation; override with --set
+#
+DEFAULT_SETTINGS = {
+  'compute.workers': '1',
+  'cache.enabled': 'false',
+  'numstore.enabled': 'false',
+  'pagematrix.enabled': 'false',
+  'checkpoint.enabled': 'false',
+  'fanout.enabled': 'false',
+}
+
+STAGES = ('download', 'parse', 'extract', 'tally', 'upload', 'db')
+
+
+def write_config(workdir, settings):
+  """
+  Writes workdir/config.ini: the compute function's config.ini
+  with the given section.option settings applied.
+  """
+
+  configur = configparser.ConfigParser()
+  configur.read(os.path.join(COMPUTE_DIR, "config.ini"))
+
+  for (name, value) in settings.items():
+    (section, option) = name.split(".", 1)
+    if not configur.has_section(section):
+      configur.add_section(section)
+    configur.set(section, option, value)
+
+  with open(os.path.join(workdir, "config.ini"), "w") as outfile:
+    configur.write(outfile)
+
+  return configur.get('s3', 'bucket_name')
+
+
+def run_case(workdir, bucketkey, s3_latency_ms=0, s3_mbps=0, db_latency_ms=0):
+  """
+  Child process: runs the handler once on bucketkey and prints
+  its metrics as JSON on the last line.
+  """
+
+  sys.path.insert(0, os.path.abspath(LAYER_DIR))
+  sys.path.insert(0, os.path.abspath(COMPUTE_DIR))
+  localenv.install(workdir, s3_latency_ms, s3_mbps, db_latency_ms)
+  os.chdir(workdir)
+
+  import lambda_function
+
+  captured = {}
+
+  class CapturingMetrics(lambda_function.JobMetrics):
+    def report(self):
+      captured.update(self.as_dict())
+
+  lambda_function.JobMetrics = CapturingMetrics
+
+  event = {'Records': [{'s3': {'object': {'key': bucketkey}}}]}
+
+  #
+  # time the whole invocation: the job's own metrics start once
+  # the database connection is open
+  #
+  t0 = time.perf_counter()
+
+  with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+    response = lambda_function.lambda_handler(event, None)
+
+  captured['handler_secs'] = time.perf_counter() - t0
+
+  captured['statusCode'] = response['statusCode']
+  if response['statusCode'] != 200:
+    captured['error'] = json.loads(response['body'])
+
+  print(json.dumps(captured))
+
+
+def main():
+  if len(sys.argv) > 1 and sys.argv[1] == "--run":
+    run_case(sys.argv[2], sys.argv[3], *[float(arg) for arg in sys.argv[4:7]])
+    return
+
+  parser = argparse.ArgumentParser(description="proj04_compute throughput benchmark")
+  parser.add_argument("--pages", default="10,50")
+  parser.add_argument("--numbers", default="50,400", help="numbers per page")
+  parser.add_argument("--layouts", default=",".join(synthpdf.LAYOUTS))
+  parser.add_argument("--distributions", default=",".join(synthpdf.DISTRIBUTIONS))
+  parser.add_argument("--set", action="append", default=[], metavar="SECTION.OPTION=VALUE",
+                      help="override a config.ini setting")
+  parser.add_argument("--keep", metavar="DIR",
+                      help="build the environment in DIR and keep it")
+  parser.add_argument("--s3-latency-ms", type=float, default=0,
+                      help="simulated latency of each S3 request")
+  parser.add_argument("--s3-mbps", type=float, default=0,
+                      help="simulated S3 download bandwidth (0 for unlimited)")
+  parser.add_argument("--db-latency-ms", type=float, default=0,
+                      help="simulated latency of each database round trip")
+  parser.add_argument("--options", default="",
+                      help="job options of each case, as JSON")
+  args = parser.parse_args()
+
+  settings = dict(DEFAULT_SETTINGS)
+  for setting in args.set:
+    (name, value) = setting.split("=", 1)
+    settings[name] = value
+
+  if args.keep:
+    workdir = os.path.abspath(args.keep)
+    os.makedirs(workdir, exist_ok=True)
+  else:
+    workdir = tempfile.mkdtemp(prefix="bench-compute-")
+
+  try:
+    (s3_root, db_path) = (os.path.join(workdir, "s3"), os.path.join(workdir, "benfordapp.db"))
+    localenv.create_database(db_path)
+    bucketname = write_config(workdir, settings)
+    bucket = localenv.LocalBucket(s3_root, bucketname)
+
+    cases = list(itertools.product([int(p) for p in args.pages.split(",")],
+                                   [int(n) for n in args.numbers.split(",")],
+                                   args.layouts.split(","),
+                                   args.distributions.split(",")))
+
+    print("**Benchmarking", len(cases), "cases in", workdir, "**")
+    for (name, value) in sorted(settings.items()):
+      print("  " + name, "=", value)
+
+    header = "{:<30} {:>7} {:>9} {:>9} {:>11} {:>8}".format(
+      "case", "pages", "pages/s", "numbers", "numbers/s", "rss MB")
+    header += "".join(" {:>8}".format(stage) for stage in STAGES)
+    print(header)
+
+    for (pages, numbers, layout, distribution) in cases:
+      name = "{}p-{}n-{}-{}".format(pages, numbers, layout, distribution)
+      bucketkey = "bench/" + name + ".pdf"
+
+      bucket.put_object(Key=bucketkey,
+                        Body=synthpdf.make_pdf(pages, numbers, layout, distribution))
+      localenv.add_job(db_path, bucketkey, options=args.options)
+
+      child = subprocess.run([sys.executable, os.path.abspath(__file__), "--run", workdir, bucketkey,
+                              str(args.s3_latency_ms), str(args.s3_mbps), str(args.db_latency_ms)],
+                             capture_output=True, text=True)
+
+      if child.returncode != 0:
+        print("{:<30} FAILED".format(name))
+        print(child.stderr)
+        continue
+
+      m = json.loads(child.stdout.strip().splitlines()[-1])
+
+      if m['statusCode'] != 200:
+        print("{:<30} ERROR {}".format(name, m.get('error')))
+        continue
+
+      total = m['handler_secs']
+      row = "{:<30} {:>7} {:>9.1f} {:>9} {:>11.0f} {:>8.1f}".format(
+        name, m['pages'], m['pages'] / total, m['numbers'], m['numbers'] / total, m['peak_rss_mb'])
+      row += "".join(" {:>8.3f}".format(m.get(stage + "_secs", 0.0)) for stage in STAGES)
+      print(row)
+
+  finally:
+    if not args.keep:
+      shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+  main()
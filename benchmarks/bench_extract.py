@@ -0,0 +1,115 @@
+#
+# bench_extract.py
+#
+# Benchmarks the proj04_compute text extractors (see extraction.py
+# and rawtext.py) on a corpus of PDFs. For each document, every page
+# is extracted and tallied with both the "layout" extractor and the
+# fast "raw" extractor; reports the throughput of each, and how well
+# the raw extractor agrees with the layout extractor: the fraction
+# of pages with identical histograms, and the numbers found by each.
+#
+# Usage:
+#   python3 benchmarks/bench_extract.py [pdf or directory ...]
+#
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "lambda-functions", "layer", "python"))
+
+import extraction  # noqa: E402
+import tally  # noqa: E402
+
+from pypdf import PdfReader  # noqa: E402
+
+
+def corpus_files(args):
+  """
+  Expands the command line into a list of PDF filenames.
+  """
+
+  if len(args) == 0:
+    args = ["update09.pdf"]
+
+  files = []
+  for arg in args:
+    if os.path.isdir(arg):
+      for name in sorted(os.listdir(arg)):
+        if name.lower().endswith(".pdf"):
+          files.append(os.path.join(arg, name))
+    else:
+      files.append(arg)
+
+  return files
+
+
+def run(pdf, extractor):
+  """
+  Extracts and tallies every page of a PDF; returns (seconds,
+  list of per-page histograms, number of pages without text).
+  """
+
+  reader = PdfReader(pdf)
+  pages = []
+  empty = 0
+
+  t0 = time.perf_counter()
+  for page in reader.pages:
+    text = extraction.page_text(page, extractor)
+    histograms = tally.new_histograms()
+    tally.tally_text(text, histograms)
+    pages.append(histograms)
+    if text.strip() == "":
+      empty += 1
+  secs = time.perf_counter() - t0
+
+  return secs, pages, empty
+
+
+def main():
+  files = corpus_files(sys.argv[1:])
+
+  print("**Benchmarking extractors on", len(files), "documents**")
+  print("{:<32} {:>6} {:>10} {:>10} {:>8} {:>8} {:>10} {:>10}".format(
+    "document", "pages", "layout/s", "raw/s", "speedup", "agree", "layout n", "raw n"))
+
+  totals = {'pages': 0, 'layout': 0.0, 'raw': 0.0, 'agree': 0, 'layout_n': 0, 'raw_n': 0}
+
+  for pdf in files:
+    (layout_secs, layout_pages, _) = run(pdf, 'layout')
+    (raw_secs, raw_pages, raw_empty) = run(pdf, 'raw')
+
+    n = len(layout_pages)
+    agree = sum(1 for (a, b) in zip(layout_pages, raw_pages) if a == b)
+    layout_n = sum(sum(h['first']) for h in layout_pages)
+    raw_n = sum(sum(h['first']) for h in raw_pages)
+
+    print("{:<32} {:>6} {:>10.1f} {:>10.1f} {:>8.2f} {:>7.1f}% {:>10} {:>10}".format(
+      os.path.basename(pdf)[0:32], n,
+      n / layout_secs, n / raw_secs, layout_secs / raw_secs,
+      100.0 * agree / max(1, n), layout_n, raw_n))
+
+    if raw_empty > 0:
+      print("  ", raw_empty, "pages without text operators skipped")
+
+    totals['pages'] += n
+    totals['layout'] += layout_secs
+    totals['raw'] += raw_secs
+    totals['agree'] += agree
+    totals['layout_n'] += layout_n
+    totals['raw_n'] += raw_n
+
+  print("**RESULTS**")
+  print("pages:", totals['pages'])
+  print("layout: {:.1f} pages/sec".format(totals['pages'] / totals['layout']))
+  print("raw:    {:.1f} pages/sec, {:.2f}x".format(totals['pages'] / totals['raw'],
+                                                  totals['layout'] / totals['raw']))
+  print("pages with identical histograms: {:.1f}%".format(
+    100.0 * totals['agree'] / max(1, totals['pages'])))
+  print("numbers found: layout", totals['layout_n'], ", raw", totals['raw_n'])
+
+
+if __name__ == "__main__":
+  main()
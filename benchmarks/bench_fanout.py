@@ -0,0 +1,61 @@
+#
+# bench_fanout.py
+#
+# Benchmarks map-reduce fan-out of a PDF (see proj04_compute/
+# fanout.py) against the single-invocation serial loop, using the
+# in-process LocalExecutor in place of lambda invocations. Checks
+# that every configuration produces the same histograms.
+#
+# Usage:
+#   python3 benchmarks/bench_fanout.py [pdf] [shard_pages]
+#
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "lambda-functions", "layer", "python"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "lambda-functions", "proj04_compute"))
+
+import extraction  # noqa: E402
+import fanout  # noqa: E402
+
+
+def main():
+  pdf = sys.argv[1] if len(sys.argv) > 1 else "update09.pdf"
+  shard_pages = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+  number_of_pages = extraction.page_count(pdf)
+
+  print("**Serial baseline:", pdf, ",", number_of_pages, "pages**")
+
+  t0 = time.perf_counter()
+  (_, baseline) = extraction.extract_counts(pdf, workers=1)
+  serial_secs = time.perf_counter() - t0
+
+  print("first digit histogram:", baseline['first'])
+
+  rows = []
+  for max_shards in (1, 2, 4, 8, 16):
+    executor = fanout.LocalExecutor(pdf, max_concurrency=max_shards)
+
+    t0 = time.perf_counter()
+    histograms = fanout.fan_out(executor, pdf, number_of_pages, shard_pages, max_shards)
+    secs = time.perf_counter() - t0
+
+    if histograms != baseline:
+      raise Exception("fan-out with " + str(max_shards) + " shards disagrees")
+
+    rows.append((max_shards, secs))
+
+  print("**RESULTS**")
+  print("{:>8} {:>10} {:>8}".format("shards", "secs", "speedup"))
+  print("{:>8} {:>10.3f} {:>8.2f}".format("serial", serial_secs, 1.0))
+  for (max_shards, secs) in rows:
+    print("{:>8} {:>10.3f} {:>8.2f}".format(max_shards, secs, serial_secs / secs))
+
+
+if __name__ == "__main__":
+  main()
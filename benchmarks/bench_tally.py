@@ -0,0 +1,102 @@
+#
+# bench_tally.py
+#
+# Micro-benchmark of the proj04_compute tally backends. Generates
+# synthetic page text (prose mixed with numbers and tables), checks
+# that the "regex" backend produces the same histograms as the
+# "python" reference backend, then times each backend. The "tokens"
+# backend reads numbers differently (e.g. "0.000123" or "1.5e3"),
+# so only its token count is reported alongside.
+#
+# Usage:
+#   python3 benchmarks/bench_tally.py [pages] [repeat]
+#
+
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "lambda-functions", "layer", "python"))
+
+import tally  # noqa: E402
+
+
+def make_page(rng, words_per_page=600, numeric_fraction=0.4):
+  """
+  Generates one page of synthetic text.
+  """
+
+  prose = ["the", "total", "revenue", "(net)", "for", "Q3", "was", "as",
+           "follows:", "see", "note", "FY2023", "in", "USD", "—", "and"]
+  words = []
+
+  for _ in range(words_per_page):
+    if rng.random() < numeric_fraction:
+      kind = rng.randrange(5)
+      value = int(10 ** rng.uniform(0, 7))
+      if kind == 0:
+        words.append(str(value))
+      elif kind == 1:
+        words.append("{:,}".format(value))
+      elif kind == 2:
+        words.append("$" + "{:,.2f}".format(value / 100))
+      elif kind == 3:
+        words.append("(" + str(value) + ")")
+      else:
+        words.append("0." + str(value).zfill(6))
+    else:
+      words.append(rng.choice(prose))
+
+    if rng.random() < 0.08:
+      words.append("\n")
+
+  return " ".join(words)
+
+
+def main():
+  pages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+  repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+  rng = random.Random(310)
+  corpus = [make_page(rng) for _ in range(pages)]
+
+  print("**Checking backend equivalence on", pages, "pages**")
+
+  reference = tally.new_histograms()
+  for text in corpus:
+    tally.tally_text(text, reference, 'python')
+
+  histograms = tally.new_histograms()
+  for text in corpus:
+    tally.tally_text(text, histograms, 'regex')
+  if histograms != reference:
+    raise Exception("backend regex disagrees")
+
+  print("first digit histogram:", reference['first'])
+
+  tokens = tally.new_histograms()
+  for text in corpus:
+    tally.tally_text(text, tokens, 'tokens')
+
+  print("numbers: python", sum(reference['first']), ", tokens", sum(tokens['first']))
+
+  print("**Timing backends (best of", repeat, ")**")
+
+  timings = {}
+  for backend in tally.BACKENDS:
+    def run(backend=backend):
+      histograms = tally.new_histograms()
+      for text in corpus:
+        tally.tally_text(text, histograms, backend)
+    timings[backend] = min(timeit.repeat(run, number=1, repeat=repeat))
+
+  for backend in tally.BACKENDS:
+    secs = timings[backend]
+    print("{:>8}: {:8.2f} ms total, {:8.1f} pages/sec, {:5.2f}x vs python".format(
+      backend, secs * 1000, pages / secs, timings['python'] / secs))
+
+
+if __name__ == "__main__":
+  main()
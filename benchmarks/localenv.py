@@ -0,0 +1,467 @@
+#
+# localenv.py
+#
+# Filesystem stand-ins for S3 and the database, so the proj04_compute
+# handler can be run and benchmarked locally, unmodified:
+#
+#   boto3   - buckets are directories under a root directory, and
+#             objects are files; supports the calls the compute
+#             function makes (Object get/put/copy_from/delete,
+#             objects.filter, put_object, upload_file, download_file)
+#   pymysql - a sqlite3 database file, with the MySQL-isms used by
+#             the compute function (%s parameters, NOW(), INTERVAL,
+#             REPLACE INTO) translated
+#
+# install() puts both into sys.modules, so it must be called before
+# the handler (or datatier) is imported. It can also slow S3 and
+# the database down to a given latency per request (and S3 to a
+# given bandwidth), as seen from Lambda.
+#
+
+import io
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import time
+import types
+
+
+CHUNK_SIZE = 1024 * 1024
+
+#
+# simulated network: seconds per S3 request, S3 bytes per second
+# (0 for unlimited), and seconds per database round trip; see
+# install()
+#
+NETWORK = {'latency': 0.0, 'bandwidth': 0, 'db_latency': 0.0}
+
+
+def _request(name='latency'):
+  if NETWORK[name] > 0:
+    time.sleep(NETWORK[name])
+
+
+def _transfer(nbytes):
+  if NETWORK['bandwidth'] > 0:
+    time.sleep(nbytes / NETWORK['bandwidth'])
+
+
+class LocalBody:
+  """
+  The streaming body of a get() response.
+  """
+
+  def __init__(self, path):
+    self.infile = open(path, "rb")
+
+  def read(self, amt=None):
+    data = self.infile.read() if amt is None else self.infile.read(amt)
+    _transfer(len(data))
+    return data
+
+  def iter_chunks(self, chunk_size=CHUNK_SIZE):
+    while True:
+      chunk = self.read(chunk_size)
+      if not chunk:
+        return
+      yield chunk
+
+  def close(self):
+    self.infile.close()
+
+
+class LocalObject:
+  """
+  An S3 object, stored as a file.
+  """
+
+  def __init__(self, bucket, key):
+    self.bucket = bucket
+    self.key = key
+    self.path = bucket.path_of(key)
+
+  def get(self, **kwargs):
+    _request()
+
+    if not os.path.exists(self.path):
+      raise Exception("NoSuchKey: " + self.key)
+    return {'Body': LocalBody(self.path), 'ContentLength': os.path.getsize(self.path)}
+
+  def put(self, Body, **kwargs):
+    self.bucket.put_object(Key=self.key, Body=Body)
+
+  def delete(self, **kwargs):
+    if os.path.exists(self.path):
+      os.remove(self.path)
+
+  def copy_from(self, CopySource, **kwargs):
+    source = self.bucket.path_of(CopySource['Key'])
+    if not os.path.exists(source):
+      raise Exception("NoSuchKey: " + CopySource['Key'])
+    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+    shutil.copyfile(source, self.path)
+
+
+class LocalObjects:
+  """
+  The bucket.objects collection.
+  """
+
+  def __init__(self, bucket):
+    self.bucket = bucket
+
+  def all(self):
+    return self.filter(Prefix="")
+
+  def filter(self, Prefix=""):
+    found = []
+    for (dirpath, _, filenames) in os.walk(self.bucket.root):
+      for filename in filenames:
+        key = os.path.relpath(os.path.join(dirpath, filename), self.bucket.root)
+        key = key.replace(os.sep, "/")
+        if key.startswith(Prefix):
+          found.append(LocalObject(self.bucket, key))
+    return sorted(found, key=lambda obj: obj.key)
+
+
+class LocalBucket:
+  """
+  An S3 bucket, stored as a directory.
+  """
+
+  def __init__(self, root, name):
+    self.name = name
+    self.root = os.path.join(root, name)
+    self.objects = LocalObjects(self)
+    os.makedirs(self.root, exist_ok=True)
+
+  def path_of(self, key):
+    return os.path.join(self.root, *key.split("/"))
+
+  def Object(self, key):
+    return LocalObject(self, key)
+
+  def put_object(self, Key, Body, **kwargs):
+    _request()
+    path = self.path_of(Key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if isinstance(Body, str):
+      Body = Body.encode('utf-8')
+    with open(path, "wb") as outfile:
+      if isinstance(Body, (bytes, bytearray)):
+        outfile.write(Body)
+      else:
+        shutil.copyfileobj(Body, outfile)
+
+  def upload_file(self, Filename, Key, ExtraArgs=None):
+    _request()
+    path = self.path_of(Key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    shutil.copyfile(Filename, path)
+
+  def download_file(self, Key, Filename):
+    _request()
+    shutil.copyfile(self.path_of(Key), Filename)
+    _transfer(os.path.getsize(Filename))
+
+
+class LocalS3:
+  """
+  The boto3 s3 resource.
+  """
+
+  def __init__(self, root):
+    self.root = root
+
+  def Bucket(self, name):
+    return LocalBucket(self.root, name)
+
+
+###################################################################
+#
+# make_boto3:
+#
+# A boto3 stand-in module whose S3 buckets are directories.
+#
+def make_boto3(root):
+  """
+  Builds a module that can stand in for boto3.
+
+  Parameters
+  ----------
+  root : str
+    The directory holding one subdirectory per bucket.
+
+  Returns
+  -------
+  module
+  """
+
+  module = types.ModuleType("boto3")
+
+  def setup_default_session(**kwargs):
+    pass
+
+  def resource(service, **kwargs):
+    if service != 's3':
+      raise Exception("localenv: no stand-in for boto3.resource('" + service + "')")
+    return LocalS3(root)
+
+  def client(service, **kwargs):
+    raise Exception("localenv: no stand-in for boto3.client('" + service + "')")
+
+  module.setup_default_session = setup_default_session
+  module.resource = resource
+  module.client = client
+
+  return module
+
+
+#
+# MySQL-isms used by the compute function, and their sqlite
+# equivalents
+#
+_TRANSLATIONS = [
+  (re.compile(r"NOW\(\)\s*-\s*INTERVAL\s+%s\s+DAY", re.IGNORECASE), "datetime('now', '-' || %s || ' days')"),
+  (re.compile(r"NOW\(\)\s*-\s*INTERVAL\s+%s\s+SECOND", re.IGNORECASE), "datetime('now', '-' || %s || ' seconds')"),
+  (re.compile(r"NOW\(\)", re.IGNORECASE), "datetime('now')"),
+  (re.compile(r"%s"), "?"),
+]
+
+
+def translate(sql):
+  """
+  Rewrites a MySQL query for sqlite.
+  """
+
+  for (pattern, replacement) in _TRANSLATIONS:
+    sql = pattern.sub(replacement, sql)
+
+  return sql
+
+
+class LocalCursor:
+  """
+  A pymysql cursor over a sqlite3 connection.
+  """
+
+  def __init__(self, conn):
+    self.cursor = conn.cursor()
+    self.rowcount = -1
+
+  def execute(self, sql, parameters=None):
+    _request('db_latency')
+    self.cursor.execute(translate(sql), tuple(parameters or ()))
+    self.rowcount = self.cursor.rowcount
+    return self.rowcount
+
+  def executemany(self, sql, rows):
+    _request('db_latency')
+    self.cursor.executemany(translate(sql), [tuple(row) for row in rows])
+    self.rowcount = self.cursor.rowcount
+    return self.rowcount
+
+  def fetchone(self):
+    return self.cursor.fetchone()
+
+  def fetchmany(self, size=1):
+    return tuple(self.cursor.fetchmany(size))
+
+  def fetchall(self):
+    return tuple(self.cursor.fetchall())
+
+  def close(self):
+    self.cursor.close()
+
+
+class LocalConnection:
+  """
+  A pymysql connection to a sqlite3 database file. Like a pymysql
+  connection, it may be used from several threads, one at a time.
+  """
+
+  def __init__(self, path):
+    #
+    # the handshake (TCP, TLS and login) takes several round trips
+    #
+    for _ in range(3):
+      _request('db_latency')
+    self.conn = sqlite3.connect(path, check_same_thread=False)
+
+  def cursor(self, cursorclass=None):
+    return LocalCursor(self.conn)
+
+  def commit(self):
+    self.conn.commit()
+
+  def rollback(self):
+    self.conn.rollback()
+
+  def ping(self, reconnect=False):
+    pass
+
+  def close(self):
+    self.conn.close()
+
+
+###################################################################
+#
+# make_pymysql:
+#
+# A pymysql stand-in module backed by a sqlite3 database file.
+#
+def make_pymysql(path):
+  """
+  Builds a module that can stand in for pymysql.
+
+  Parameters
+  ----------
+  path : str
+    The sqlite3 database file.
+
+  Returns
+  -------
+  module
+  """
+
+  module = types.ModuleType("pymysql")
+
+  def connect(**kwargs):
+    return LocalConnection(path)
+
+  module.connect = connect
+  module.cursors = types.SimpleNamespace(Cursor=None, SSCursor=None)
+
+  return module
+
+
+#
+# the tables of benfordapp-database.sql that the compute function
+# uses, in sqlite's dialect
+#
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs
+(
+    jobid             integer primary key autoincrement,
+    userid            int not null,
+    status            varchar(256) not null,
+    originaldatafile  varchar(256) not null,
+    datafilekey       varchar(256) not null,
+    resultsfilekey    varchar(256) not null,
+    options           varchar(1024) not null default '',
+    claimedat         datetime null,
+    computedinline    boolean not null default false
+);
+
+CREATE TABLE IF NOT EXISTS resultcache
+(
+    digest            char(64) not null,
+    variant           varchar(64) not null,
+    resultsfilekey    varchar(256) not null,
+    datafilekey       varchar(256) not null default '',
+    hits              int not null,
+    created           datetime not null,
+    lastused          datetime not null,
+    PRIMARY KEY (digest, variant)
+);
+
+CREATE TABLE IF NOT EXISTS cachestats
+(
+    name              varchar(64) not null,
+    value             bigint not null,
+    PRIMARY KEY (name)
+);
+
+INSERT OR IGNORE INTO cachestats(name, value) VALUES('hits', 0);
+INSERT OR IGNORE INTO cachestats(name, value) VALUES('misses', 0);
+INSERT OR IGNORE INTO cachestats(name, value) VALUES('evictions', 0);
+INSERT OR IGNORE INTO cachestats(name, value) VALUES('duplicates', 0);
+"""
+
+
+def create_database(path):
+  """
+  Creates (if need be) the benfordapp tables in a sqlite3
+  database file.
+  """
+
+  conn = sqlite3.connect(path)
+  conn.executescript(SCHEMA)
+  conn.commit()
+  conn.close()
+
+
+def add_job(path, datafilekey, userid=80001, options=''):
+  """
+  Adds a pending job for a data file, with the given options
+  (JSON, see joboptions.py); returns its jobid.
+  """
+
+  conn = sqlite3.connect(path)
+  cursor = conn.execute(
+    "INSERT INTO jobs(userid, status, originaldatafile, datafilekey, resultsfilekey, options) "
+    "VALUES(?, 'pending', ?, ?, '', ?);",
+    (userid, os.path.basename(datafilekey), datafilekey, options))
+  conn.commit()
+  jobid = cursor.lastrowid
+  conn.close()
+
+  return jobid
+
+
+###################################################################
+#
+# install:
+#
+# Replaces boto3 and pymysql with the local stand-ins.
+#
+def install(workdir, s3_latency_ms=0, s3_mbps=0, db_latency_ms=0):
+  """
+  Installs the local stand-ins for boto3 and pymysql, storing
+  buckets under workdir/s3 and the database in
+  workdir/benfordapp.db. Call before importing the handler.
+
+  Parameters
+  ----------
+  workdir : str
+    The directory holding the local environment.
+  s3_latency_ms : float
+    Simulated latency of each S3 request. Defaults to 0.
+  s3_mbps : float
+    Simulated S3 download bandwidth, in megabits per second;
+    0 (the default) for unlimited.
+  db_latency_ms : float
+    Simulated latency of each database round trip. Defaults
+    to 0.
+
+  Returns
+  -------
+  tuple
+    (S3 root directory, database file)
+  """
+
+  s3_root = os.path.join(workdir, "s3")
+  db_path = os.path.join(workdir, "benfordapp.db")
+
+  os.makedirs(s3_root, exist_ok=True)
+  create_database(db_path)
+
+  NETWORK['latency'] = s3_latency_ms / 1000.0
+  NETWORK['bandwidth'] = s3_mbps * 1000000 / 8
+  NETWORK['db_latency'] = db_latency_ms / 1000.0
+
+  sys.modules['boto3'] = make_boto3(s3_root)
+  sys.modules['pymysql'] = make_pymysql(db_path)
+
+  return s3_root, db_path
+
+
+def read_text(s3_root, bucketname, key):
+  """
+  Reads a text object written by the handler.
+  """
+
+  with io.open(LocalBucket(s3_root, bucketname).path_of(key), "r", encoding="utf-8") as infile:
+    return infile.read()
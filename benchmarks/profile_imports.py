@@ -0,0 +1,213 @@
+#
+# profile_imports.py
+#
+# Profiles the cold-start import cost of each proj04_* function:
+# imports its lambda_function.py in a fresh interpreter (as Lambda
+# does on a cold start), with the function's folder and the shared
+# layer (see lambda-functions/layer) on the path, and reports the
+# import time, the costliest modules (from python -X importtime)
+# and which heavy dependencies were loaded.
+#
+# With --event, the handler is also invoked once with the given
+# event, to see which dependencies a request pulls in on first
+# use; e.g. '{}' exercises the cheapest (400) path.
+#
+# Dependencies that are not installed are reported, not stubbed.
+#
+# Usage:
+#   python3 benchmarks/profile_imports.py [--functions proj04_auth,...]
+#           [--event JSON] [--top 8]
+#
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FUNCTIONS_DIR = os.path.join(HERE, "..", "lambda-functions")
+LAYER_DIR = os.path.join(FUNCTIONS_DIR, "layer", "python")
+
+#
+# the dependencies worth deferring
+#
+HEAVY = ['boto3', 'botocore', 'pymysql', 'bcrypt', 'jwt', 'pypdf']
+
+#
+# runs in the child interpreter: argv[1] is the event, or ""
+#
+CHILD = """
+import json, sys, time
+t0 = time.perf_counter()
+import lambda_function
+import_secs = time.perf_counter() - t0
+status = None
+if sys.argv[1]:
+  result = lambda_function.lambda_handler(json.loads(sys.argv[1]), None)
+  status = result.get('statusCode') if isinstance(result, dict) else None
+heavy = [m for m in %r if m in sys.modules]
+print("@@" + json.dumps({'import_secs': import_secs, 'status': status, 'heavy': heavy}))
+""" % (HEAVY,)
+
+
+###################################################################
+#
+# parse_importtime:
+#
+# The slowest imports of lambda_function, from -X importtime.
+#
+def parse_importtime(stderr, top):
+  """
+  Parses the -X importtime report, keeping lambda_function itself
+  and the modules it imports directly (with their own imports
+  folded into their cumulative time).
+
+  Parameters
+  ----------
+  stderr : str
+    The child's stderr.
+  top : int
+    How many modules to keep.
+
+  Returns
+  -------
+  list
+    (cumulative seconds, module) pairs, slowest first.
+  """
+
+  entries = []
+
+  for line in stderr.splitlines():
+    if not line.startswith("import time:") or line.count("|") != 2:
+      continue
+
+    (_, cumulative, name) = line[len("import time:"):].split("|")
+
+    if not cumulative.strip().isdigit():  # the header line
+      continue
+
+    #
+    # nesting is shown by indentation, two spaces a level
+    #
+    depth = (len(name) - len(name.lstrip()) - 1) // 2
+
+    entries.append((depth, int(cumulative) / 1e6, name.strip()))
+
+  #
+  # a module is reported after everything it imports, so the
+  # imports of lambda_function are the entries between it and the
+  # previous top-level import
+  #
+  rows = []
+
+  for (i, (depth, secs, name)) in enumerate(entries):
+    if depth == 0 and name == "lambda_function":
+      rows.append((secs, name))
+
+      for (depth, secs, name) in reversed(entries[0:i]):
+        if depth == 0:
+          break
+        if depth == 1:
+          rows.append((secs, name))
+
+      break
+
+  rows.sort(reverse=True)
+
+  return rows[0:top]
+
+
+###################################################################
+#
+# profile:
+#
+# Imports one function in a fresh interpreter.
+#
+def profile(function, event, top):
+  """
+  Imports (and optionally invokes) a function's lambda_function
+  in a child interpreter.
+
+  Parameters
+  ----------
+  function : str
+    The function's folder, e.g. proj04_auth.
+  event : str
+    The event, as JSON, or "" to only import.
+  top : int
+    How many modules to report.
+
+  Returns
+  -------
+  dict
+    import_secs, status, heavy and modules; or error, if the
+    import or the invocation raised.
+  """
+
+  cwd = os.path.abspath(os.path.join(FUNCTIONS_DIR, function))
+
+  env = dict(os.environ)
+  env['PYTHONPATH'] = os.pathsep.join(
+    [cwd, os.path.abspath(LAYER_DIR)] +
+    ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+
+  proc = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD, event],
+                        cwd=cwd, env=env, capture_output=True, text=True)
+
+  lines = [line for line in proc.stdout.splitlines() if line.startswith("@@")]
+
+  if proc.returncode != 0 or not lines:
+    errors = [line for line in proc.stderr.splitlines() if not line.startswith("import time:")]
+    return {'error': errors[-1] if errors else "exit code " + str(proc.returncode)}
+
+  report = json.loads(lines[-1][2:])
+  report['modules'] = parse_importtime(proc.stderr, top)
+
+  return report
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__)
+  parser.add_argument("--functions", default="",
+                      help="comma-separated folders, default all proj04_*")
+  parser.add_argument("--event", default="",
+                      help="invoke the handler once with this JSON event")
+  parser.add_argument("--top", type=int, default=8)
+  args = parser.parse_args()
+
+  if args.functions:
+    functions = args.functions.split(",")
+  else:
+    functions = sorted(d for d in os.listdir(FUNCTIONS_DIR) if d.startswith("proj04_"))
+
+  print(f"{'function':<16} {'import s':>9} {'status':>7}  heavy modules loaded")
+
+  reports = {}
+
+  for function in functions:
+    report = profile(function, args.event, args.top)
+    reports[function] = report
+
+    if 'error' in report:
+      print(f"{function:<16} {'-':>9} {'-':>7}  ERROR: {report['error']}")
+      continue
+
+    status = '-' if report['status'] is None else report['status']
+    heavy = ", ".join(report['heavy']) or "none"
+
+    print(f"{function:<16} {report['import_secs']:>9.3f} {status!s:>7}  {heavy}")
+
+  for (function, report) in reports.items():
+    if 'error' in report:
+      continue
+
+    print()
+    print("**" + function + ": slowest imports (cumulative s)**")
+
+    for (secs, name) in report['modules']:
+      print(f"  {secs:>8.4f}  {name}")
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,225 @@
+#
+# synthpdf.py
+#
+# Generates synthetic PDFs for benchmarking proj04_compute, using
+# only the standard library. Each page holds a given number of
+# numeric values, either flowed through prose or laid out as a
+# table, with first digits drawn from Benford's distribution or
+# uniformly from 1-9. Content streams are Flate-compressed, as
+# most real-world PDFs are.
+#
+# Usage:
+#   python3 benchmarks/synthpdf.py out.pdf [pages] [numbers_per_page]
+#                                  [prose|table] [benford|uniform]
+#
+
+import math
+import random
+import sys
+import zlib
+
+
+LAYOUTS = ('prose', 'table')
+DISTRIBUTIONS = ('benford', 'uniform')
+
+_PROSE = ["the", "total", "revenue", "for", "the", "quarter", "was", "and",
+          "expenses", "of", "were", "reported", "in", "note", "see", "net",
+          "income", "increased", "by", "compared", "with", "prior", "year"]
+
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+MARGIN = 54
+
+
+def make_value(rng, distribution):
+  """
+  Draws one number: with a Benford-distributed first digit
+  (log-uniform over 1 to 10^7), or with a uniform first digit.
+  """
+
+  if distribution == 'benford':
+    return int(10 ** rng.uniform(0, 7))
+
+  first = rng.randint(1, 9)
+  rest = rng.randint(0, 6)
+  return first * 10 ** rest + rng.randrange(10 ** rest)
+
+
+def format_value(rng, value):
+  """
+  Formats a number the way financial documents do.
+  """
+
+  kind = rng.randrange(5)
+  if kind == 0:
+    return str(value)
+  elif kind == 1:
+    return "{:,}".format(value)
+  elif kind == 2:
+    return "$" + "{:,.2f}".format(value / 100)
+  elif kind == 3:
+    return "(" + "{:,}".format(value) + ")"
+  else:
+    return "{:,.1f}".format(value / 10)
+
+
+def _escape(text):
+  return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def prose_page(rng, numbers, distribution):
+  """
+  Content stream for a page of prose with numbers mixed in, one
+  Tj per line.
+  """
+
+  words = []
+  for _ in range(numbers):
+    words.extend(rng.choice(_PROSE) for _ in range(rng.randint(1, 5)))
+    words.append(format_value(rng, make_value(rng, distribution)))
+
+  lines = []
+  line = []
+  for word in words:
+    if len(line) > 0 and sum(len(w) + 1 for w in line) + len(word) > 95:
+      lines.append(" ".join(line))
+      line = []
+    line.append(word)
+  if len(line) > 0:
+    lines.append(" ".join(line))
+
+  #
+  # shrink the font so every line fits on the page
+  #
+  leading = min(12.0, (PAGE_HEIGHT - 2 * MARGIN) / max(1, len(lines)))
+  size = leading * 0.8
+
+  out = ["BT", "/F1 %.2f Tf" % size, "%.2f TL" % leading,
+         "%d %d Td" % (MARGIN, PAGE_HEIGHT - MARGIN)]
+  for text in lines:
+    out.append("(" + _escape(text) + ") Tj T*")
+  out.append("ET")
+
+  return "\n".join(out)
+
+
+def table_page(rng, numbers, distribution):
+  """
+  Content stream for a page holding a table of numbers, each
+  cell positioned in its own text object as spreadsheets and
+  word processors do.
+  """
+
+  columns = 6
+  rows = max(1, math.ceil(numbers / columns))
+  row_height = min(14.0, (PAGE_HEIGHT - 2 * MARGIN) / (rows + 1))
+  size = row_height * 0.7
+  column_width = (PAGE_WIDTH - 2 * MARGIN) / (columns + 1)
+
+  out = ["BT /F1 %.2f Tf %d %d Td (Line item) Tj ET" % (size, MARGIN, PAGE_HEIGHT - MARGIN)]
+
+  for i in range(numbers):
+    (row, column) = divmod(i, columns)
+    x = MARGIN + (column + 1) * column_width
+    y = PAGE_HEIGHT - MARGIN - (row + 1) * row_height
+    if column == 0:
+      out.append("BT /F1 %.2f Tf 1 0 0 1 %d %.2f Tm (%s) Tj ET" %
+                 (size, MARGIN, y, rng.choice(_PROSE)))
+    text = format_value(rng, make_value(rng, distribution))
+    out.append("BT /F1 %.2f Tf 1 0 0 1 %.2f %.2f Tm (%s) Tj ET" %
+               (size, x, y, _escape(text)))
+
+  return "\n".join(out)
+
+
+###################################################################
+#
+# make_pdf:
+#
+# Builds a synthetic PDF in memory.
+#
+def make_pdf(pages, numbers_per_page, layout='prose', distribution='benford', seed=0):
+  """
+  Generates a synthetic PDF document.
+
+  Parameters
+  ----------
+  pages : int
+    The number of pages.
+  numbers_per_page : int
+    The number of numeric values on each page.
+  layout : str
+    One of LAYOUTS.
+  distribution : str
+    One of DISTRIBUTIONS; how the first digits are drawn.
+  seed : int
+    Seed for the random generator, so documents are
+    reproducible.
+
+  Returns
+  -------
+  bytes
+    The PDF.
+  """
+
+  if layout not in LAYOUTS:
+    raise ValueError("unknown layout: " + str(layout))
+  if distribution not in DISTRIBUTIONS:
+    raise ValueError("unknown distribution: " + str(distribution))
+
+  rng = random.Random(seed)
+  make_page = prose_page if layout == 'prose' else table_page
+
+  #
+  # objects 1-3 are the catalog, page tree and font; then a page
+  # object and a content stream per page
+  #
+  objects = [None, None,
+             b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+  kids = []
+
+  for _ in range(pages):
+    content = zlib.compress(make_page(rng, numbers_per_page, distribution).encode('latin-1'))
+    page_id = len(objects) + 1
+    objects.append(("<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+                    "/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+                    % (PAGE_WIDTH, PAGE_HEIGHT, page_id + 1)).encode('latin-1'))
+    objects.append(b"<< /Length " + str(len(content)).encode('latin-1') +
+                   b" /Filter /FlateDecode >>\nstream\n" + content + b"\nendstream")
+    kids.append("%d 0 R" % page_id)
+
+  objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+  objects[1] = ("<< /Type /Pages /Kids [%s] /Count %d >>" % (" ".join(kids), pages)).encode('latin-1')
+
+  out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+  offsets = []
+  for (i, body) in enumerate(objects):
+    offsets.append(len(out))
+    out += str(i + 1).encode('latin-1') + b" 0 obj\n" + body + b"\nendobj\n"
+
+  xref = len(out)
+  out += ("xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)).encode('latin-1')
+  for offset in offsets:
+    out += ("%010d 00000 n \n" % offset).encode('latin-1')
+  out += ("trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+          % (len(objects) + 1, xref)).encode('latin-1')
+
+  return bytes(out)
+
+
+def main():
+  if len(sys.argv) < 2:
+    print("usage: synthpdf.py out.pdf [pages] [numbers_per_page] [prose|table] [benford|uniform]")
+    sys.exit(1)
+
+  pages = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+  numbers = int(sys.argv[3]) if len(sys.argv) > 3 else 100
+  layout = sys.argv[4] if len(sys.argv) > 4 else 'prose'
+  distribution = sys.argv[5] if len(sys.argv) > 5 else 'benford'
+
+  with open(sys.argv[1], "wb") as outfile:
+    outfile.write(make_pdf(pages, numbers, layout, distribution))
+
+
+if __name__ == "__main__":
+  main()
@@ -2,6 +2,8 @@ CREATE DATABASE IF NOT EXISTS benfordapp;
 
 USE benfordapp;
 
+DROP TABLE IF EXISTS cachestats;
+DROP TABLE IF EXISTS resultcache;
 DROP TABLE IF EXISTS jobs;
 DROP TABLE IF EXISTS users;
 
@@ -20,16 +22,48 @@ CREATE TABLE jobs
 (
     jobid             int not null AUTO_INCREMENT,
     userid            int not null,
-    status            varchar(256) not null,  -- pending, completed, error msg
+    status            varchar(256) not null,  -- pending, processing, completed, error
     originaldatafile  varchar(256) not null,  -- original name from user
     datafilekey       varchar(256) not null,  -- filename in the bucket
     resultsfilekey    varchar(256) not null,  -- results filename in bucket
+    options           varchar(1024) not null default '',  -- analysis options as JSON, see joboptions.py
+    claimedat         datetime null,          -- when a compute invocation took the job, see jobclaim.py
+    computedinline    boolean not null default false,  -- computed by proj04_upload, see inline.py
     PRIMARY KEY (jobid),
     FOREIGN KEY (userid) REFERENCES users(userid)
 );
 
 ALTER TABLE jobs AUTO_INCREMENT = 1001;  -- starting value
 
+--
+-- results cache: a PDF already analyzed (same SHA-256 digest)
+-- reuses the results file of the earlier job
+--
+CREATE TABLE resultcache
+(
+    digest            char(64) not null,      -- SHA-256 of the PDF bytes (hex)
+    variant           varchar(64) not null,   -- results format / analysis settings
+    resultsfilekey    varchar(256) not null,  -- cached results filename in bucket
+    datafilekey       varchar(256) not null default '',  -- file the results came from: its number store and page matrix
+    hits              int not null,
+    created           datetime not null,
+    lastused          datetime not null,      -- stale entries are evicted
+    PRIMARY KEY (digest, variant),
+    INDEX (lastused)
+);
+
+CREATE TABLE cachestats
+(
+    name              varchar(64) not null,   -- hits, misses, evictions, duplicates
+    value             bigint not null,
+    PRIMARY KEY (name)
+);
+
+INSERT INTO cachestats(name, value) values('hits', 0);
+INSERT INTO cachestats(name, value) values('misses', 0);
+INSERT INTO cachestats(name, value) values('evictions', 0);
+INSERT INTO cachestats(name, value) values('duplicates', 0);  -- duplicate S3 events skipped
+
 --
 -- Insert some users to start with:
 -- 
@@ -8,10 +8,14 @@
 #   Northwestern University
 #
 
-import bcrypt
-import jwt
 import datetime
 
+#
+# bcrypt and jwt are imported by the functions that use them, so
+# a request that fails before it needs them doesn't pay for the
+# import
+#
+
 def hash_password(password, salt_rounds=12):
   """
   Hashes a password.
@@ -32,6 +36,8 @@ def hash_password(password, salt_rounds=12):
   if len(password) > 72:
     raise ValueError("Password must be less than 72 characters.")
 
+  import bcrypt
+
   salt = bcrypt.gensalt(salt_rounds)
   hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
 
@@ -54,6 +60,8 @@ def check_password(password, hashed):
     True if the password is correct, False otherwise.
   """
 
+  import bcrypt
+
   return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
 def generate_token(user_id, secret, exp_minutes=60):
@@ -75,6 +83,8 @@ def generate_token(user_id, secret, exp_minutes=60):
     The access token.
   """
 
+  import jwt
+
   return jwt.encode(
     {
       'user_id': user_id,
@@ -128,4 +138,6 @@ def get_user_from_token(token, secret):
     The user's unique ID.
   """
 
+  import jwt
+
   return jwt.decode(token, secret, algorithms=['HS256'])['user_id']
@@ -0,0 +1,220 @@
+#
+# benford.py
+#
+# Benford's Law conformity statistics for the digit histograms
+# produced by tally.py: the expected digit proportions for each
+# test, the chi-square statistic and the mean absolute deviation
+# (MAD), plus the formatting of the results file.
+#
+# MAD conformity ranges are from Nigrini, "Benford's Law:
+# Applications for Forensic Accounting, Auditing, and Fraud
+# Detection" (2012). The last-two digits test has no published
+# MAD ranges; it is compared against a uniform distribution.
+#
+# https://en.wikipedia.org/wiki/Benford%27s_law
+#
+
+import math
+
+
+###################################################################
+#
+# expected proportions, indexed like the histograms in tally.py;
+# slots outside a test's support (e.g. 0 for the first digit) are 0
+#
+EXPECTED = {
+  'first': [0.0] + [math.log10(1 + 1 / d) for d in range(1, 10)],
+  'second': [sum(math.log10(1 + 1 / (10 * k + d)) for k in range(1, 10)) for d in range(0, 10)],
+  'first_two': [0.0] * 10 + [math.log10(1 + 1 / dd) for dd in range(10, 100)],
+  'last_two': [0.01] * 100,
+}
+
+#
+# (upper MAD bound, label), checked in order
+#
+CONFORMITY = {
+  'first': [(0.006, "close"), (0.012, "acceptable"), (0.015, "marginal")],
+  'second': [(0.008, "close"), (0.010, "acceptable"), (0.012, "marginal")],
+  'first_two': [(0.0012, "close"), (0.0018, "acceptable"), (0.0022, "marginal")],
+  'last_two': [],
+}
+
+TITLES = {
+  'first': "FIRST DIGIT",
+  'second': "SECOND DIGIT",
+  'first_two': "FIRST TWO DIGITS",
+  'last_two': "LAST TWO DIGITS",
+}
+
+
+###################################################################
+#
+# mean_absolute_deviation:
+#
+# MAD of a histogram from its expected proportions.
+#
+def mean_absolute_deviation(name, counts):
+  """
+  Computes the MAD of one digit test, or None if the histogram
+  is empty.
+  """
+
+  expected = EXPECTED[name]
+  support = [i for i in range(0, len(expected)) if expected[i] > 0]
+
+  n = sum(counts[i] for i in support)
+
+  if n == 0:
+    return None
+
+  return sum(abs(counts[i] / n - expected[i]) for i in support) / len(support)
+
+
+###################################################################
+#
+# conformity:
+#
+# Nigrini's conformity label for a MAD.
+#
+def conformity(name, mad):
+  """
+  Classifies the MAD of a digit test as "close", "acceptable",
+  "marginal" or "nonconformity"; None if the test has no
+  published ranges.
+  """
+
+  if len(CONFORMITY[name]) == 0:
+    return None
+
+  for (bound, label) in CONFORMITY[name]:
+    if mad <= bound:
+      return label
+
+  return "nonconformity"
+
+
+###################################################################
+#
+# analyze_test:
+#
+# Chi-square and MAD of one histogram against its expected
+# proportions.
+#
+def analyze_test(name, counts):
+  """
+  Computes the conformity statistics of one digit test.
+
+  Parameters
+  ----------
+  name : str
+    The test name, see tally.TESTS.
+  counts : list
+    The histogram for the test.
+
+  Returns
+  -------
+  dict
+    n (numbers counted), chi_square, mad and conformity
+    ("close", "acceptable", "marginal", "nonconformity", or
+    None when there is no data or no published ranges).
+  """
+
+  expected = EXPECTED[name]
+  support = [i for i in range(0, len(expected)) if expected[i] > 0]
+
+  n = sum(counts[i] for i in support)
+
+  if n == 0:
+    return {'n': 0, 'chi_square': None, 'mad': None, 'conformity': None}
+
+  chi_square = sum((counts[i] - n * expected[i]) ** 2 / (n * expected[i]) for i in support)
+  mad = mean_absolute_deviation(name, counts)
+
+  return {
+    'n': n,
+    'chi_square': round(chi_square, 4),
+    'mad': round(mad, 6),
+    'conformity': conformity(name, mad),
+  }
+
+
+###################################################################
+#
+# analyze:
+#
+# Statistics for every test, computed once at the end of the job.
+#
+def analyze(histograms):
+  """
+  Computes the conformity statistics of every digit test.
+
+  Parameters
+  ----------
+  histograms : dict
+    The histograms, see tally.new_histograms().
+
+  Returns
+  -------
+  dict
+    Test name -> statistics, see analyze_test().
+  """
+
+  return {name: analyze_test(name, counts) for (name, counts) in histograms.items()}
+
+
+###################################################################
+#
+# format_results:
+#
+# Builds the contents of the results file.
+#
+def format_results(number_of_pages, histograms, tests=None, unit="pages"):
+  """
+  Formats the histograms and statistics as the text of the
+  results file. The first block (page count and first-digit
+  counts) is unchanged from the original format; a section per
+  digit test follows.
+
+  Parameters
+  ----------
+  number_of_pages : int
+    The number of pages analyzed.
+  histograms : dict
+    The histograms, see tally.new_histograms().
+  tests : list
+    The digit tests to report a section for; None for all.
+  unit : str
+    What number_of_pages counts: "pages", or "rows" for a
+    table, see tabular.py.
+
+  Returns
+  -------
+  str
+    The results file contents.
+  """
+
+  first = histograms['first']
+
+  lines = ["**RESULTS**", str(number_of_pages) + " " + unit]
+
+  for i in range(0, 10):
+    lines.append(str(i) + " " + str(first[i]))
+
+  stats = analyze(histograms)
+
+  for (name, counts) in histograms.items():
+    if tests is not None and name not in tests:
+      continue
+
+    s = stats[name]
+    lines.append("**" + TITLES[name] + "** n=" + str(s['n']) +
+                 " chi2=" + str(s['chi_square']) +
+                 " mad=" + str(s['mad']) +
+                 " conformity=" + str(s['conformity']))
+
+    width = 2 if len(counts) == 100 else 1
+    for i in range(0, len(counts)):
+      if EXPECTED[name][i] > 0:
+        lines.append(str(i).zfill(width) + " " + str(counts[i]))
+
+  return "\n".join(lines) + "\n"
@@ -0,0 +1,553 @@
+#
+# datatier.py
+#
+# Executes SQL queries against a MySQL database.
+#
+# Original author:
+#   Prof. Joe Hummel
+#   Northwestern University
+#
+
+import contextlib
+import threading
+import time
+
+#
+# pymysql is imported when the first connection is opened, so a
+# request that fails before it needs the database doesn't pay for
+# the import
+#
+
+
+###################################################################
+#
+# get_dbConn:
+#
+# Opens and returns a connection object for interacting with a
+# MySQL database.
+#
+def get_dbConn(endpoint, portnum, username, pwd, dbname):
+  """
+  Opens and returns a connection object for interacting 
+  with a MySQL database
+
+  Parameters
+  ----------
+  endpoint : machine name or IP address of server (string),
+  portnum : server port # (integer),
+  username : user name for login (string),
+  pwd : user password for login (string),
+  dbname : database name (string)
+
+  Returns
+  -------
+  a connection object
+  """
+  import pymysql
+
+  try:
+    dbConn = pymysql.connect(host=endpoint,
+                             port=portnum,
+                             user=username,
+                             passwd=pwd,
+                             database=dbname)
+
+    return dbConn
+
+  except Exception as err:
+    print("datatier.get_dbConn() failed:")
+    print(str(err))
+    raise
+
+
+###################################################################
+#
+# ConnectionPool:
+#
+# A small per-process pool of database connections, reused across
+# queries and (in Lambda) across warm invocations rather than
+# paying the TCP, TLS and MySQL handshake every time.
+#
+class ConnectionPool:
+  """
+  Hands out open connections to one database, opening new ones
+  only when no idle connection is usable. An idle connection is
+  pinged before it is handed out again, and closed instead if it
+  has been idle longer than idle_timeout, is older than
+  max_lifetime, or does not answer the ping (e.g. the server
+  dropped it after its wait_timeout). Thread-safe.
+
+  pymysql connections do not autocommit, so a connection given
+  back is rolled back first: otherwise the transaction its last
+  SELECT began would stay open, and under InnoDB's REPEATABLE
+  READ the next user would keep reading that old snapshot, e.g.
+  a job still pending after it has completed. Commit any
+  changes before giving a connection back.
+
+  endpoint, portnum, username, pwd, dbname - see get_dbConn()
+  size - how many idle connections to keep
+  idle_timeout - seconds a connection may sit idle; 0 for no limit
+  max_lifetime - seconds a connection may live; 0 for no limit
+  """
+
+  def __init__(self, endpoint, portnum, username, pwd, dbname,
+               size=2, idle_timeout=300, max_lifetime=3600):
+    self._args = (endpoint, portnum, username, pwd, dbname)
+    self.size = size
+    self.idle_timeout = idle_timeout
+    self.max_lifetime = max_lifetime
+
+    self._lock = threading.Lock()
+    self._idle = []    # (connection, opened at, released at), most recent last
+    self._opened = {}  # id(connection) -> opened at, for those handed out
+
+    self.connects = 0
+    self.reuses = 0
+    self.expired = 0
+    self.dropped = 0
+
+  def _expired(self, opened, released, now):
+    return ((self.idle_timeout > 0 and now - released > self.idle_timeout) or
+            (self.max_lifetime > 0 and now - opened > self.max_lifetime))
+
+  def acquire(self):
+    """
+    Returns an open connection: the most recently released idle
+    one that is still usable, or else a new one. Give it back
+    with release().
+    """
+
+    while True:
+      with self._lock:
+        if len(self._idle) == 0:
+          break
+        (dbConn, opened, released) = self._idle.pop()
+
+      now = time.monotonic()
+
+      if self._expired(opened, released, now):
+        _close_quietly(dbConn)
+        with self._lock:
+          self.expired += 1
+        continue
+
+      try:
+        dbConn.ping(reconnect=False)
+      except Exception as err:
+        print("**datatier: dropping dead connection:", str(err), "**")
+        _close_quietly(dbConn)
+        with self._lock:
+          self.dropped += 1
+        continue
+
+      with self._lock:
+        self._opened[id(dbConn)] = opened
+        self.reuses += 1
+
+      return dbConn
+
+    dbConn = get_dbConn(*self._args)
+
+    with self._lock:
+      self._opened[id(dbConn)] = time.monotonic()
+      self.connects += 1
+
+    return dbConn
+
+  def release(self, dbConn, last_used=None):
+    """
+    Gives a connection back to the pool, to be reused, ending
+    its open transaction (uncommitted changes are rolled back);
+    it is closed instead if the pool is full, it is past its
+    lifetime, or the rollback fails. last_used is when
+    (time.monotonic()) it was last used, if earlier than now;
+    its idle time counts from then.
+    """
+
+    try:
+      dbConn.rollback()
+    except Exception as err:
+      print("**datatier: dropping connection that failed to roll back:", str(err), "**")
+      self.discard(dbConn)
+      return
+
+    now = time.monotonic()
+    released = now if last_used is None else last_used
+
+    with self._lock:
+      opened = self._opened.pop(id(dbConn), now)
+
+      if len(self._idle) < self.size and not self._expired(opened, released, now):
+        self._idle.append((dbConn, opened, released))
+        return
+
+      self.expired += 1
+
+    _close_quietly(dbConn)
+
+  def discard(self, dbConn):
+    """
+    Closes a connection handed out by acquire() rather than
+    giving it back, e.g. after an error left it unusable.
+    """
+
+    with self._lock:
+      self._opened.pop(id(dbConn), None)
+      self.dropped += 1
+
+    _close_quietly(dbConn)
+
+  def close(self):
+    """
+    Closes the idle connections.
+    """
+
+    with self._lock:
+      idle = self._idle
+      self._idle = []
+
+    for (dbConn, _, _) in idle:
+      _close_quietly(dbConn)
+
+  def stats(self):
+    """
+    Returns
+    -------
+    dict
+      connects (connections opened), reuses (idle connections
+      handed out again), expired (closed for idle_timeout,
+      max_lifetime or a full pool), dropped (closed as dead or
+      discarded) and idle (connections in the pool now).
+    """
+
+    with self._lock:
+      return {
+        'connects': self.connects,
+        'reuses': self.reuses,
+        'expired': self.expired,
+        'dropped': self.dropped,
+        'idle': len(self._idle),
+      }
+
+
+def _close_quietly(dbConn):
+  with contextlib.suppress(Exception):
+    dbConn.close()
+
+
+##################################################################
+#
+# retrieve_one_row:
+#
+# Given a database connection and an SQL Select query,
+# executes this query against the database and returns
+# the first row (tuple) retrieved by the query (the tuple
+# can be empty if the SELECT retrieved no data). The query
+# can be parameterized using %s, in which case pass the
+# values as a list [value1, value2, ...]
+#
+def retrieve_one_row(dbConn, sql, parameters=None):
+  """
+  Executes an sql SELECT query against the database connection
+  and returns the first row as a tuple
+
+  Parameters
+  __________
+  dbConn : the database connection, 
+  sql : the SQL SELECT query (can be parameterized with %s),
+  parameters: optional list of values if parameterized
+
+  Returns
+  _______
+  First row as a tuple, or () if SELECT retrieves no data
+  """
+
+  dbCursor = dbConn.cursor()
+
+  try:
+    dbCursor.execute(sql, parameters)
+    row = dbCursor.fetchone()
+    if row is None:  # executed successfully, but no data was retrieved
+      return ()
+    else:
+      return row
+
+  except Exception as err:
+    print("datatier.retrieve_one_row() failed:")
+    print(str(err))
+    raise
+
+  finally:
+    dbCursor.close()
+
+
+##################################################################
+#
+# retrieve_all_rows:
+#
+# Given a database connection and an SQL Select query,
+# executes this query against the database and returns
+# a list of rows (tuples) retrieved by the query. If the
+# query retrieves no data, the empty list [] is returned.
+# The query can be parameterized using %s, in which case
+# pass the values as a list [value1, value2, ...]
+#
+def retrieve_all_rows(dbConn, sql, parameters=None):
+  """
+  Executes an sql SELECT query against the database connection
+  and returns all rows as a list of tuples
+
+  Parameters
+  __________
+  dbConn : the database connection, 
+  sql : the SQL SELECT query (can be parameterized with %s),
+  parameters: optional list of values if parameterized
+
+  Returns
+  _______
+  All rows as a list of tuples, or [] if SELECT retrieves no
+  data
+  """
+
+  dbCursor = dbConn.cursor()
+
+  try:
+    dbCursor.execute(sql, parameters)
+    rows = dbCursor.fetchall()
+    if rows is None:  # executed successfully, but no data was retrieved
+      return []
+    else:
+      return rows
+
+  except Exception as err:
+    print("datatier.retrieve_all_rows() failed:")
+    print(str(err))
+    raise
+
+  finally:
+    dbCursor.close()
+
+
+##################################################################
+#
+# iter_rows:
+#
+# Given a database connection and an SQL Select query,
+# executes this query against the database and yields the
+# rows (tuples) one at a time, as they are read from the
+# server in batches of batch_size, rather than reading the
+# whole result into memory first. The query can be
+# parameterized using %s, in which case pass the values as a
+# list [value1, value2, ...]
+#
+# NOTE: the connection cannot run other queries until every
+# row has been read, or the generator is closed.
+#
+def iter_rows(dbConn, sql, parameters=None, batch_size=1000):
+  """
+  Executes an sql SELECT query against the database connection
+  with an unbuffered (server-side) cursor and yields the rows
+  as tuples
+
+  Parameters
+  __________
+  dbConn : the database connection,
+  sql : the SQL SELECT query (can be parameterized with %s),
+  parameters: optional list of values if parameterized,
+  batch_size: number of rows to read from the server at a time
+
+  Yields
+  ______
+  Each row as a tuple; nothing if SELECT retrieves no data
+  """
+  import pymysql
+
+  dbCursor = dbConn.cursor(pymysql.cursors.SSCursor)
+
+  try:
+    dbCursor.execute(sql, parameters)
+
+    while True:
+      rows = dbCursor.fetchmany(batch_size)
+      if not rows:  # all rows read
+        break
+
+      for row in rows:
+        yield row
+
+  except Exception as err:
+    print("datatier.iter_rows() failed:")
+    print(str(err))
+    raise
+
+  finally:
+    # closing an unbuffered cursor reads and discards any rows
+    # left, freeing the connection:
+    dbCursor.close()
+
+
+###############################################################
+#
+# perform_action:
+#
+# Given a database connection and an SQL action query,
+# executes an ACTION query and returns the number of rows
+# modified; a return value of 0 means no rows were
+# modified. Action queries are typically "insert",
+# "update", "delete". The query can be parameterized
+# using %s, in which case pass the values as a list
+# [value1, value2, ...]
+#
+def perform_action(dbConn, sql, parameters=None):
+  """
+  Executes an sql ACTION query against the database connection
+  and returns number of rows modified
+
+  Parameters
+  __________
+  dbConn : the database connection, 
+  sql : the SQL SELECT query (can be parameterized with %s),
+  parameters: optional list of values if parameterized
+
+  Returns
+  _______
+  number of rows modified (0 is not an error but implies
+  the query made no modifications)
+  """
+
+  dbCursor = dbConn.cursor()
+
+  try:
+    # try to execute, and if successful commit the changes
+    # and return the # of rows modified by the query:
+    dbCursor.execute(sql, parameters)
+    dbConn.commit()
+    return dbCursor.rowcount
+
+  except Exception as err:
+    # failed, rollback any possible changes and log error:
+    dbConn.rollback()
+    print("datatier.perform_action() failed:")
+    print(str(err))
+    raise
+
+  finally:
+    dbCursor.close()
+
+
+###############################################################
+#
+# perform_bulk_action:
+#
+# Given a database connection, an SQL action query and a list
+# of rows of parameters, executes the query once per row in a
+# single call (executemany) and a single commit, and returns
+# the total number of rows modified, and the seconds it took.
+# For an INSERT ... VALUES query, pymysql sends all the rows in
+# one multi-row INSERT, i.e. one round trip rather than one per
+# row.
+#
+def perform_bulk_action(dbConn, sql, rows):
+  """
+  Executes an sql ACTION query against the database connection
+  for each row of parameters, commits once, and returns number
+  of rows modified
+
+  Parameters
+  __________
+  dbConn : the database connection,
+  sql : the SQL ACTION query (parameterized with %s),
+  rows: list of lists of values, one per execution
+
+  Returns
+  _______
+  (rowcount, elapsed): total number of rows modified (0 is not
+  an error but implies the query made no modifications), and
+  the seconds taken, commit included
+  """
+
+  t0 = time.perf_counter()
+
+  dbCursor = dbConn.cursor()
+
+  try:
+    # all or nothing: commit once all the rows have executed
+    dbCursor.executemany(sql, rows)
+    dbConn.commit()
+    return (dbCursor.rowcount, time.perf_counter() - t0)
+
+  except Exception as err:
+    dbConn.rollback()
+    print("datatier.perform_bulk_action() failed:")
+    print(str(err))
+    raise
+
+  finally:
+    dbCursor.close()
+
+
+###############################################################
+#
+# perform_batch:
+#
+# Given a database connection and a list of SQL action
+# queries, executes them in order with a single commit at the
+# end, rather than a commit per query. Each query is either an
+# SQL string or a pair (sql, [value1, value2, ...]). Returns
+# the number of rows each query modified, and the seconds the
+# batch took.
+#
+# NOTE: the batch is one transaction only if every query is
+# DML (INSERT, UPDATE, DELETE). MySQL commits implicitly
+# around DDL statements (TRUNCATE, ALTER TABLE, ...), so when a
+# query fails, only the queries since the last DDL statement
+# are rolled back. Session settings (SET ...) are not rolled
+# back at all.
+#
+def perform_batch(dbConn, statements):
+  """
+  Executes a list of sql ACTION queries against the database
+  connection, committing once at the end, and returns the
+  number of rows each modified
+
+  Parameters
+  __________
+  dbConn : the database connection,
+  statements : list of SQL ACTION queries, each a string or a
+               pair (sql, list of values if parameterized)
+
+  Returns
+  _______
+  (rowcounts, elapsed): list of the number of rows each query
+  modified, and the total seconds taken, commit included
+  """
+
+  t0 = time.perf_counter()
+
+  dbCursor = dbConn.cursor()
+
+  try:
+    rowcounts = []
+
+    for statement in statements:
+      if isinstance(statement, str):
+        (sql, parameters) = (statement, [])
+      else:
+        (sql, parameters) = statement
+
+      dbCursor.execute(sql, parameters)
+      rowcounts.append(dbCursor.rowcount)
+
+    dbConn.commit()
+
+    return (rowcounts, time.perf_counter() - t0)
+
+  except Exception as err:
+    dbConn.rollback()
+    print("datatier.perform_batch() failed after", len(rowcounts), "of",
+          len(statements), "statements:")
+    print(str(err))
+    raise
+
+  finally:
+    dbCursor.close()
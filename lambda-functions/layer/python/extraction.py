@@ -0,0 +1,582 @@
+#
+# extraction.py
+#
+# Page-parallel text extraction engine for proj04_compute. The
+# pages of a PDF are split into contiguous ranges, and each range
+# is extracted and tallied in its own worker process. The digit
+# histograms from each worker are then summed, giving the same
+# results as walking the pages one at a time.
+#
+# NOTE: AWS Lambda does not provide /dev/shm, so the usual
+# multiprocessing.Pool / ProcessPoolExecutor cannot be used there
+# (they need POSIX semaphores). Instead we start plain Process
+# objects and send each worker's histograms back over a Pipe.
+#
+# Two text extractors are provided:
+#
+#   "layout" - the default; pypdf's page.extract_text()
+#   "raw"    - the string operands of the text-showing operators,
+#              straight from the content stream, see rawtext.py
+#
+
+import os
+import time
+import multiprocessing
+import numstore
+import rawtext
+import tally
+
+#
+# pypdf is imported by the functions that open a PDF, so CSV and
+# text jobs, and re-analysis, don't pay for the import
+#
+
+
+EXTRACTORS = ('layout', 'raw')
+DEFAULT_EXTRACTOR = 'layout'
+
+
+###################################################################
+#
+# page_text:
+#
+# The text of one page, with the given extractor.
+#
+def page_text(page, extractor=DEFAULT_EXTRACTOR):
+  """
+  Extracts the text of a page.
+
+  Parameters
+  ----------
+  page : pypdf.PageObject
+    The page.
+  extractor : str
+    One of EXTRACTORS. Defaults to "layout".
+
+  Returns
+  -------
+  str
+    The text of the page.
+  """
+
+  if extractor == 'layout':
+    return page.extract_text()
+  elif extractor == 'raw':
+    return rawtext.extract_page(page)
+  else:
+    raise ValueError("unknown text extractor: " + str(extractor))
+
+
+###################################################################
+#
+# count_pages:
+#
+# Extracts and tallies the given pages of an open reader.
+#
+def count_pages(reader, pages, backend=tally.DEFAULT_BACKEND, numbers=None,
+                extractor=DEFAULT_EXTRACTOR, timings=None, memory=None, page_counts=None,
+                filters=None):
+  """
+  Extracts the text of some pages and tallies the significant
+  digits of each numeric word.
+
+  Parameters
+  ----------
+  reader : PdfReader
+    The open PDF.
+  pages : iterable
+    The numbers of the pages to process, in increasing order,
+    e.g. range(start, end).
+  backend : str
+    The tally backend, see tally.BACKENDS.
+  numbers : numstore.Numbers
+    If given, the numbers found on each page are added to it.
+  extractor : str
+    The text extractor, see EXTRACTORS.
+  timings : dict
+    If given, the seconds spent extracting text and tallying
+    are added to its "extract" and "tally" entries.
+  memory : memguard.MemoryGuard
+    If given, called after each page to keep memory bounded.
+  page_counts : list
+    If given, (page number, first-digit counts) is appended to
+    it for each page.
+  filters : dict
+    The job's tally filters, see tally.tally_text().
+
+  Returns
+  -------
+  dict
+    The digit histograms for the pages, see tally.TESTS.
+  """
+
+  histograms = tally.new_histograms()
+  extract_secs = 0.0
+  tally_secs = 0.0
+
+  for i in pages:
+    t0 = time.perf_counter()
+    page = reader.pages[i]
+    text = page_text(page, extractor)
+    t1 = time.perf_counter()
+    page_numbers = [] if numbers is not None else None
+    before = histograms['first'][:] if page_counts is not None else None
+    num_values = tally.tally_text(text, histograms, backend, page_numbers, filters)
+    if numbers is not None:
+      numbers.add(i, page_numbers)
+    if page_counts is not None:
+      counts = [after - b for (after, b) in zip(histograms['first'], before, strict=True)]
+      page_counts.append((i, counts))
+    t2 = time.perf_counter()
+    extract_secs += t1 - t0
+    tally_secs += t2 - t1
+    print("** Page", i, ", text length", len(text), ", num values", num_values)
+
+    if memory is not None:
+      page = None
+      memory.after_page(reader, i)
+
+  if timings is not None:
+    add_timings(timings, {'extract': extract_secs, 'tally': tally_secs})
+
+  return histograms
+
+
+###################################################################
+#
+# split_pages:
+#
+# Splits number_of_pages pages, beginning at page start, into at
+# most num_ranges contiguous (start, end) ranges of nearly equal
+# size.
+#
+def split_pages(number_of_pages, num_ranges, start=0):
+  """
+  Splits the pages of a document into contiguous ranges.
+
+  Parameters
+  ----------
+  number_of_pages : int
+    The number of pages to split.
+  num_ranges : int
+    The maximum number of ranges to produce.
+  start : int
+    The first page of the first range. Defaults to 0.
+
+  Returns
+  -------
+  list
+    A list of (start, end) tuples, end exclusive.
+  """
+
+  num_ranges = max(1, min(num_ranges, number_of_pages))
+  size, extra = divmod(number_of_pages, num_ranges)
+
+  ranges = []
+
+  for r in range(num_ranges):
+    end = start + size + (1 if r < extra else 0)
+    if end > start:
+      ranges.append((start, end))
+    start = end
+
+  return ranges
+
+
+###################################################################
+#
+# resolve_workers:
+#
+# A worker count of 0 (or less) means one per available CPU.
+#
+def resolve_workers(workers):
+  """
+  Determines the number of worker processes to use.
+
+  Parameters
+  ----------
+  workers : int
+    The configured number of workers; 0 means one per CPU.
+
+  Returns
+  -------
+  int
+    The number of workers, at least 1.
+  """
+
+  if workers is None or workers <= 0:
+    workers = os.cpu_count() or 1
+
+  return max(1, workers)
+
+
+###################################################################
+#
+# add_timings:
+#
+# Adds one set of stage timings into another.
+#
+def add_timings(into, other):
+  """
+  Adds the seconds in other to the same-named entries of into.
+
+  Parameters
+  ----------
+  into : dict
+    Stage name -> seconds; modified in place.
+  other : dict
+    Stage name -> seconds to add.
+  """
+
+  for (name, secs) in other.items():
+    into[name] = into.get(name, 0.0) + secs
+
+
+def _worker(source, pages, backend, collect, extractor, memory, per_page, filters, conn):
+  """
+  Entry point of a worker process: tallies its pages and sends
+  ('ok', (histograms, numbers, timings, page_counts)) or
+  ('error', message) back to the parent; numbers is None unless
+  collect is True, and page_counts None unless per_page is True.
+  """
+
+  from pypdf import PdfReader
+
+  try:
+    reader = PdfReader(source)
+    numbers = numstore.Numbers() if collect else None
+    page_counts = [] if per_page else None
+    timings = {}
+    histograms = count_pages(reader, pages, backend, numbers, extractor, timings, memory,
+                             page_counts, filters)
+    conn.send(('ok', (histograms, numbers, timings, page_counts)))
+  except Exception as err:
+    conn.send(('error', str(err)))
+  finally:
+    conn.close()
+
+
+###################################################################
+#
+# page_count:
+#
+# The number of pages in a PDF.
+#
+def page_count(source):
+  """
+  Returns the number of pages in a PDF.
+
+  Parameters
+  ----------
+  source : str or file-like
+    The PDF filename, or a binary stream of the PDF.
+
+  Returns
+  -------
+  int
+    The number of pages.
+  """
+
+  from pypdf import PdfReader
+
+  return len(PdfReader(source).pages)
+
+
+###################################################################
+#
+# extract_pages:
+#
+# Tallies the given pages, in parallel across worker processes
+# unless there are few of them.
+#
+def extract_pages(source, reader, pages, workers=0, serial_threshold=16,
+                  backend=tally.DEFAULT_BACKEND, numbers=None,
+                  extractor=DEFAULT_EXTRACTOR, timings=None, memory=None, page_counts=None,
+                  filters=None):
+  """
+  Extracts and tallies some pages of a PDF, e.g. a range.
+
+  Fewer than serial_threshold pages, or when only one worker is
+  available, are processed serially with the given reader; the
+  histograms are identical either way.
+
+  Parameters
+  ----------
+  source : str or io.BytesIO
+    The PDF filename, or the PDF in memory. Not an open file:
+    the forked workers would share its offset.
+  reader : PdfReader
+    A reader already open on source.
+  pages : range or list
+    The numbers of the pages to process, in increasing order.
+  workers : int
+    The number of worker processes; 0 means one per CPU.
+  serial_threshold : int
+    Fewer pages than this are processed serially.
+  backend : str
+    The tally backend, see tally.BACKENDS.
+  numbers : numstore.Numbers
+    If given, the numbers found on each page are added to it,
+    in page order.
+  extractor : str
+    The text extractor, see EXTRACTORS.
+  timings : dict
+    If given, the seconds spent extracting text and tallying
+    are added to it, summed across the workers.
+  memory : memguard.MemoryGuard
+    If given, keeps memory bounded; each worker gets an equal
+    share of its ceiling.
+  page_counts : list
+    If given, (page number, first-digit counts) is appended to
+    it for each page, in page order.
+  filters : dict
+    The job's tally filters, see tally.tally_text().
+
+  Returns
+  -------
+  dict
+    The digit histograms for the pages, see tally.TESTS.
+  """
+
+  if len(pages) == 0:
+    return tally.new_histograms()
+
+  workers = resolve_workers(workers)
+
+  if workers == 1 or len(pages) < serial_threshold:
+    print("**Extracting", len(pages), "pages from", pages[0], "to", pages[-1], "serially**")
+    return count_pages(reader, pages, backend, numbers, extractor, timings, memory,
+                       page_counts, filters)
+
+  #
+  # each worker takes a contiguous run of the pages
+  #
+  ranges = split_pages(len(pages), workers)
+
+  print("**Extracting", len(pages), "pages from", pages[0], "to", pages[-1], "across",
+        len(ranges), "workers**")
+
+  #
+  # fork so that in-memory streams are inherited by the workers
+  # without pickling; each worker opens its own reader
+  #
+  ctx = multiprocessing.get_context('fork')
+
+  worker_memory = memory.share(len(ranges)) if memory is not None else None
+
+  procs = []
+  for (first, last) in ranges:
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    p = ctx.Process(target=_worker, args=(source, pages[first:last], backend,
+                                          numbers is not None, extractor,
+                                          worker_memory, page_counts is not None,
+                                          filters, child_conn))
+    p.start()
+    child_conn.close()
+    procs.append((p, parent_conn))
+
+  histograms = tally.new_histograms()
+  errors = []
+
+  for (p, conn) in procs:
+    try:
+      status, result = conn.recv()
+    except EOFError:
+      p.join()
+      status, result = 'error', "worker exited with code " + str(p.exitcode)
+    conn.close()
+    p.join()
+
+    if status == 'ok':
+      tally.merge_histograms(histograms, result[0])
+      if numbers is not None:
+        numbers.extend(result[1])
+      if timings is not None:
+        add_timings(timings, result[2])
+      if page_counts is not None:
+        page_counts.extend(result[3])
+    else:
+      errors.append(result)
+
+  if len(errors) > 0:
+    raise Exception("page extraction failed: " + errors[0])
+
+  return histograms
+
+
+###################################################################
+#
+# extract_counts_until:
+#
+# Tallies pages from start_page onwards in batches, stopping early
+# when the time left runs low so the caller can checkpoint.
+#
+def extract_counts_until(source, start_page, histograms, time_left=None, reserve_secs=0,
+                         batch_pages=64, workers=0, serial_threshold=16,
+                         backend=tally.DEFAULT_BACKEND, numbers=None,
+                         extractor=DEFAULT_EXTRACTOR, timings=None, memory=None,
+                         select=None, filters=None, page_counts=None):
+  """
+  Extracts and tallies the pages of a PDF from start_page on,
+  a batch at a time, until either every page is done or the
+  next batch might not finish before the time runs out.
+
+  When only some pages are selected, start_page and the pages
+  returned count the selected pages alone: page 0 is the first
+  selected page, and so on.
+
+  Parameters
+  ----------
+  source : str or file-like
+    The PDF filename, or a binary stream of the PDF.
+  start_page : int
+    The first page to process.
+  histograms : dict
+    The digit histograms so far; modified in place.
+  time_left : function
+    Returns the number of seconds left to work, or None to
+    process every page without stopping. Defaults to None.
+  reserve_secs : float
+    Stop while at least this many seconds remain, to leave
+    time to save a checkpoint.
+  batch_pages : int
+    The largest number of pages to process between time checks.
+  workers : int
+    The number of worker processes; 0 means one per CPU.
+  serial_threshold : int
+    Batches with fewer pages than this are processed serially.
+  backend : str
+    The tally backend, see tally.BACKENDS.
+  numbers : numstore.Numbers
+    If given, the numbers found on each page are added to it.
+  extractor : str
+    The text extractor, see EXTRACTORS.
+  timings : dict
+    If given, the seconds spent extracting text and tallying
+    are added to it.
+  memory : memguard.MemoryGuard
+    If given, keeps memory bounded; near its ceiling, the
+    remaining batches are processed by a single worker.
+  select : function
+    If given, maps the number of pages in the document to the
+    pages to process, see joboptions.select_pages(); otherwise
+    every page is processed.
+  filters : dict
+    The job's tally filters, see tally.tally_text().
+  page_counts : list
+    If given, (page number, first-digit counts) is appended to
+    it for each page processed, see count_pages().
+
+  Returns
+  -------
+  tuple
+    (number of pages, next page to process); the two are
+    equal when the whole document has been tallied.
+  """
+
+  from pypdf import PdfReader
+
+  reader = PdfReader(source)
+
+  selected = range(0, len(reader.pages))
+  if select is not None:
+    selected = select(len(reader.pages))
+
+  number_of_pages = len(selected)
+
+  if time_left is None:
+    batch_pages = number_of_pages
+
+  page = start_page
+  secs_per_page = None
+
+  while page < number_of_pages:
+    batch = min(batch_pages, number_of_pages - page)
+
+    if time_left is not None:
+      budget = time_left() - reserve_secs
+      if secs_per_page is not None:
+        #
+        # size the batch so it should finish within the budget,
+        # with some slack for slower pages
+        #
+        batch = min(batch, int(0.8 * budget / secs_per_page))
+      if budget <= 0 or batch <= 0:
+        break
+
+    #
+    # every worker holds its own reader, so near the memory
+    # ceiling carry on in this process alone
+    #
+    if memory is not None and workers != 1 and memory.over_ceiling():
+      print("**Memory ceiling reached at page", page, ", continuing with one worker**")
+      workers = 1
+      memory.bounded = True
+      if memory.degraded_at is None:
+        memory.degraded_at = page
+
+    t0 = time.perf_counter()
+
+    batch_histograms = extract_pages(source, reader, selected[page:page + batch],
+                                     workers=workers,
+                                     serial_threshold=serial_threshold,
+                                     backend=backend,
+                                     numbers=numbers,
+                                     extractor=extractor,
+                                     timings=timings,
+                                     memory=memory,
+                                     page_counts=page_counts,
+                                     filters=filters)
+
+    secs_per_page = (time.perf_counter() - t0) / batch
+
+    tally.merge_histograms(histograms, batch_histograms)
+
+    page += batch
+
+  return number_of_pages, page
+
+
+###################################################################
+#
+# extract_counts:
+#
+# Opens the PDF and tallies every page, in parallel across worker
+# processes unless the document is small.
+#
+def extract_counts(source, workers=0, serial_threshold=16,
+                   backend=tally.DEFAULT_BACKEND, extractor=DEFAULT_EXTRACTOR):
+  """
+  Extracts the text of every page of a PDF and tallies the
+  significant digits of each numeric word.
+
+  Parameters
+  ----------
+  source : str or file-like
+    The PDF filename, or a binary stream of the PDF.
+  workers : int
+    The number of worker processes; 0 means one per CPU.
+    Defaults to 0.
+  serial_threshold : int
+    Documents with fewer pages than this are processed
+    serially. Defaults to 16.
+  backend : str
+    The tally backend, see tally.BACKENDS. Defaults to "regex".
+  extractor : str
+    The text extractor, see EXTRACTORS. Defaults to "layout".
+
+  Returns
+  -------
+  tuple
+    (number of pages, digit histograms)
+  """
+
+  histograms = tally.new_histograms()
+
+  (number_of_pages, _) = extract_counts_until(source, 0, histograms,
+                                              workers=workers,
+                                              serial_threshold=serial_threshold,
+                                              backend=backend,
+                                              extractor=extractor)
+
+  return number_of_pages, histograms
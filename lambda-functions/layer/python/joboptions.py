@@ -0,0 +1,405 @@
+#
+# joboptions.py
+#
+# Analysis options of a job. A client may send options along with
+# its PDF to /upload; they are checked there, stored as JSON in the
+# options column of the job's row (see benfordapp-database.sql),
+# and read back by proj04_compute. A job without options analyzes
+# every page of its document with every digit test.
+#
+#   pages             : page ranges to analyze, 1-based and
+#                       inclusive, e.g. "3-40,52,60-" -- skips
+#                       cover pages and appendices
+#   tests             : the digit tests to report, e.g. ["first",
+#                       "second"], see tally.TESTS
+#   min_digits        : only count numbers with at least this many
+#                       significant digits, e.g. 2 to skip 1-9
+#   skip_page_numbers : don't count page numbers in headers and
+#                       footers (true / false)
+#   skip_dates        : don't count dates such as 12/31/2023 or
+#                       March 5, 2024 (true / false)
+#   sample            : {"pages": n} or {"percent": p}, optionally
+#                       with "confidence" (default 0.95) -- analyze
+#                       a stratified random sample of the pages, and
+#                       report confidence intervals on the digit
+#                       frequencies and conformity
+#   columns           : for a CSV or TSV file, the columns to tally,
+#                       by header name or 1-based position, e.g.
+#                       ["Amount", 7]
+#
+# pages and sample apply to PDFs only, and columns to tables only,
+# see check_file_options().
+#
+# This file is shared by proj04_upload and proj04_compute.
+#
+
+import re
+import json
+import hashlib
+import datatier
+
+
+DEFAULT_CONFIDENCE = 0.95
+
+#
+# the digit tests of tally.TESTS, in the order they are reported
+#
+TESTS = ('first', 'second', 'first_two', 'last_two')
+
+#
+# the options that change which numbers are tallied, see
+# tally_filters()
+#
+FILTERS = ('min_digits', 'skip_page_numbers', 'skip_dates')
+
+#
+# the size of the options column of the jobs table
+#
+MAX_ENCODED_LENGTH = 1024
+
+_RANGE = re.compile(r'^\s*([0-9]+)\s*(?:(-)\s*([0-9]*)\s*)?$')
+
+
+def _number(value, name):
+  if isinstance(value, bool) or not isinstance(value, (int, float)):
+    raise ValueError("option '" + name + "' must be a number")
+  return value
+
+
+###################################################################
+#
+# validate:
+#
+# Checks the options sent by a client.
+#
+def validate(options):
+  """
+  Checks job options and fills in their defaults.
+
+  Parameters
+  ----------
+  options : dict
+    The options, or None.
+
+  Returns
+  -------
+  dict
+    The options, with defaults filled in.
+
+  Raises
+  ------
+  ValueError
+    If an option is unknown or out of range, or the options
+    are too long to store.
+  """
+
+  if options is None:
+    return {}
+
+  if not isinstance(options, dict):
+    raise ValueError("options must be an object")
+
+  for name in options:
+    if name not in ('pages', 'tests', 'sample', 'columns') + FILTERS:
+      raise ValueError("unknown option '" + name + "'")
+
+  result = {}
+
+  if 'pages' in options:
+    result['pages'] = page_ranges(options['pages'])
+
+  if 'tests' in options:
+    tests = options['tests']
+    if not isinstance(tests, list) or len(tests) == 0:
+      raise ValueError("option 'tests' must be a non-empty list")
+    for name in tests:
+      if name not in TESTS:
+        raise ValueError("unknown digit test '" + str(name) + "'")
+    result['tests'] = [name for name in TESTS if name in tests]
+
+  if 'columns' in options:
+    columns = options['columns']
+    if not isinstance(columns, list) or len(columns) == 0:
+      raise ValueError("option 'columns' must be a non-empty list")
+    for column in columns:
+      if isinstance(column, bool) or not isinstance(column, (int, str)):
+        raise ValueError("columns must be header names or 1-based positions")
+      if isinstance(column, int) and column < 1:
+        raise ValueError("column positions start at 1")
+    result['columns'] = columns
+
+  if 'min_digits' in options:
+    min_digits = _number(options['min_digits'], 'min_digits')
+    if min_digits != int(min_digits) or min_digits < 1:
+      raise ValueError("option 'min_digits' must be a positive integer")
+    if min_digits > 1:
+      result['min_digits'] = int(min_digits)
+
+  for name in ('skip_page_numbers', 'skip_dates'):
+    if name in options:
+      if not isinstance(options[name], bool):
+        raise ValueError("option '" + name + "' must be true or false")
+      if options[name]:
+        result[name] = True
+
+  if 'sample' in options:
+    sample = options['sample']
+    if not isinstance(sample, dict):
+      raise ValueError("option 'sample' must be an object")
+    for name in sample:
+      if name not in ('pages', 'percent', 'confidence'):
+        raise ValueError("unknown sample option '" + name + "'")
+
+    if ('pages' in sample) == ('percent' in sample):
+      raise ValueError("option 'sample' needs one of 'pages' or 'percent'")
+
+    if 'pages' in sample:
+      pages = _number(sample['pages'], 'pages')
+      if pages != int(pages) or pages < 1:
+        raise ValueError("sample 'pages' must be a positive integer")
+      result_sample = {'pages': int(pages)}
+    else:
+      percent = _number(sample['percent'], 'percent')
+      if percent <= 0 or percent > 100:
+        raise ValueError("sample 'percent' must be in (0, 100]")
+      result_sample = {'percent': percent}
+
+    confidence = _number(sample.get('confidence', DEFAULT_CONFIDENCE), 'confidence')
+    if confidence <= 0 or confidence >= 1:
+      raise ValueError("sample 'confidence' must be in (0, 1)")
+    result_sample['confidence'] = confidence
+
+    result['sample'] = result_sample
+
+  #
+  # e.g. a long list of page ranges or columns: the options must
+  # fit the jobs table
+  #
+  if len(encode(result)) > MAX_ENCODED_LENGTH:
+    raise ValueError("options are too long: at most " + str(MAX_ENCODED_LENGTH) +
+                     " characters once encoded")
+
+  return result
+
+
+###################################################################
+#
+# check_file_options:
+#
+# Checks that options apply to the kind of file uploaded.
+#
+def check_file_options(options, extension):
+  """
+  Checks validated options against the extension of the
+  uploaded file: ".pdf", ".csv", ".tsv" or ".txt".
+
+  Raises
+  ------
+  ValueError
+    If an option does not apply to the file.
+  """
+
+  if extension != ".pdf":
+    for name in ('pages', 'sample'):
+      if name in options:
+        raise ValueError("option '" + name + "' applies to PDFs only")
+
+  if extension not in (".csv", ".tsv") and 'columns' in options:
+    raise ValueError("option 'columns' applies to CSV and TSV files only")
+
+
+###################################################################
+#
+# page_ranges:
+#
+# Parses the pages option.
+#
+def page_ranges(spec):
+  """
+  Parses page ranges such as "3-40,52,60-": 1-based and
+  inclusive, with an open end meaning the last page. A list of
+  [first, last] pairs (last None for an open end), as stored, is
+  accepted too.
+
+  Parameters
+  ----------
+  spec : str or list
+    The page ranges.
+
+  Returns
+  -------
+  list
+    [first, last] pairs, in the given order.
+
+  Raises
+  ------
+  ValueError
+    If the ranges are malformed.
+  """
+
+  if isinstance(spec, list):
+    parts = []
+    for pair in spec:
+      if not isinstance(pair, list) or len(pair) != 2:
+        raise ValueError("page ranges must be [first, last] pairs")
+      parts.append(str(pair[0]) + "-" + ("" if pair[1] is None else str(pair[1])))
+  elif isinstance(spec, str):
+    parts = spec.split(",")
+  else:
+    raise ValueError("option 'pages' must be a string such as \"3-40,52,60-\"")
+
+  ranges = []
+
+  for part in parts:
+    m = _RANGE.match(part)
+    if m is None:
+      raise ValueError("malformed page range '" + part.strip() + "'")
+
+    first = int(m.group(1))
+    if m.group(2) is None:
+      last = first
+    elif m.group(3) == "":
+      last = None
+    else:
+      last = int(m.group(3))
+
+    if first < 1 or (last is not None and last < first):
+      raise ValueError("malformed page range '" + part.strip() + "'")
+
+    ranges.append([first, last])
+
+  return ranges
+
+
+###################################################################
+#
+# select_pages:
+#
+# The pages of a document to analyze.
+#
+def select_pages(options, number_of_pages):
+  """
+  Resolves the pages option against a document.
+
+  Parameters
+  ----------
+  options : dict
+    The job's options.
+  number_of_pages : int
+    The number of pages in the document.
+
+  Returns
+  -------
+  range or list
+    The 0-based numbers of the pages to analyze, in increasing
+    order; ranges past the end of the document are ignored, but
+    an exception is raised if no page is left.
+  """
+
+  if 'pages' not in options:
+    return range(0, number_of_pages)
+
+  selected = set()
+
+  for (first, last) in options['pages']:
+    end = number_of_pages if last is None else min(last, number_of_pages)
+    selected.update(range(first - 1, end))
+
+  if len(selected) == 0:
+    raise Exception("no page of the " + str(number_of_pages) + "-page document is in the selected page ranges")
+
+  return sorted(selected)
+
+
+###################################################################
+#
+# tally_filters:
+#
+# The options that change which numbers are tallied.
+#
+def tally_filters(options):
+  """
+  Picks the options of tally.tally_text() out of a job's
+  options.
+
+  Returns
+  -------
+  dict
+    The filters, or None if the job has none.
+  """
+
+  filters = {name: options[name] for name in FILTERS if name in options}
+
+  return filters if len(filters) > 0 else None
+
+
+###################################################################
+#
+# cache_suffix:
+#
+# Keeps the cached results of jobs with different options apart.
+#
+def cache_suffix(options):
+  """
+  A suffix for the results cache variant of a job, '' unless
+  its options change the results. A sample is left out: the
+  exact results answer a sampled job too.
+  """
+
+  analysis = {name: value for (name, value) in options.items() if name != 'sample'}
+
+  if len(analysis) == 0:
+    return ''
+
+  return "-" + hashlib.sha256(encode(analysis).encode()).hexdigest()[0:12]
+
+
+###################################################################
+#
+# encode:
+#
+# The options as stored in the jobs table.
+#
+def encode(options):
+  """
+  Serializes validated options for the jobs table; no options
+  are stored as ''.
+  """
+
+  if len(options) == 0:
+    return ''
+
+  return json.dumps(options, sort_keys=True)
+
+
+###################################################################
+#
+# read:
+#
+# Looks up the options of a job.
+#
+def read(dbConn, datafilekey):
+  """
+  Reads the options of the job of an uploaded file.
+
+  Parameters
+  ----------
+  dbConn : the database connection
+  datafilekey : str
+    The bucket key of the uploaded file.
+
+  Returns
+  -------
+  dict
+    The job's options, with defaults filled in; empty if it has
+    none (or no jobs row).
+  """
+
+  sql = "SELECT options FROM jobs WHERE datafilekey = %s;"
+
+  row = datatier.retrieve_one_row(dbConn, sql, [datafilekey])
+
+  if row == () or row[0] is None or row[0] == '':
+    return {}
+
+  return validate(json.loads(row[0]))
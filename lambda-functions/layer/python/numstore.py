@@ -0,0 +1,346 @@
+#
+# numstore.py
+#
+# Persisted store of the numbers extracted from a PDF, so that new
+# digit tests can be run later without re-parsing the PDF.
+#
+# Each number is kept as its significant digits (punctuation and
+# leading zeros removed, exactly what tally.py counts), together
+# with the page it came from. The store is columnar: a page column
+# (array of uint32), a length column (array of uint8) and a digits
+# column (all the digits, concatenated), compressed with zlib.
+#
+# A store is written in parts, one per page range processed by an
+# invocation (a whole document, a checkpoint segment, or a fan-out
+# shard), as S3 objects next to the results file:
+#
+#   <base>.numbers/<start>-<end>.bin
+#
+# and read back by concatenating the parts in page order.
+#
+
+import struct
+import zlib
+
+from array import array
+
+
+MAGIC = b"BFN1"
+
+#
+# magic, number of pages in the document, first page, one past the
+# last page, count of numbers in this part
+#
+_HEADER = struct.Struct("<4sIIII")
+
+#
+# numbers with more significant digits than this are truncated
+# (keeping the leading digits) so their length fits the uint8
+# length column
+#
+MAX_DIGITS = 255
+
+
+class Numbers:
+  """
+  The numbers extracted from a range of pages: parallel page and
+  digits columns.
+  """
+
+  def __init__(self):
+    self.pages = array('I')
+    self.digits = []
+
+  def add(self, page, digits):
+    self.pages.extend([page] * len(digits))
+    self.digits.extend(digits)
+
+  def extend(self, other):
+    self.pages.extend(other.pages)
+    self.digits.extend(other.digits)
+
+  def __len__(self):
+    return len(self.digits)
+
+
+###################################################################
+#
+# encode:
+#
+# Serializes numbers into the compressed columnar format.
+#
+def encode(numbers, number_of_pages, start, end):
+  """
+  Encodes the numbers of a page range.
+
+  Parameters
+  ----------
+  numbers : Numbers
+    The numbers extracted from pages [start, end).
+  number_of_pages : int
+    The number of pages in the whole document.
+  start : int
+    The first page of the range.
+  end : int
+    One past the last page of the range.
+
+  Returns
+  -------
+  bytes
+    The encoded part.
+  """
+
+  digits = [d[0:MAX_DIGITS] for d in numbers.digits]
+  lengths = array('B', [len(d) for d in digits])
+
+  payload = (numbers.pages.tobytes() +
+             lengths.tobytes() +
+             "".join(digits).encode('ascii'))
+
+  header = _HEADER.pack(MAGIC, number_of_pages, start, end, len(digits))
+
+  return header + zlib.compress(payload, 6)
+
+
+###################################################################
+#
+# decode:
+#
+# Deserializes a part written by encode().
+#
+def decode(data):
+  """
+  Decodes a part.
+
+  Parameters
+  ----------
+  data : bytes
+    The encoded part.
+
+  Returns
+  -------
+  tuple
+    (Numbers, number of pages, start, end)
+  """
+
+  (magic, number_of_pages, start, end, count) = _HEADER.unpack_from(data)
+
+  if magic != MAGIC:
+    raise ValueError("not a number store part")
+
+  payload = zlib.decompress(data[_HEADER.size:])
+
+  pages = array('I')
+  pages.frombytes(payload[0:4 * count])
+
+  lengths = array('B')
+  lengths.frombytes(payload[4 * count:5 * count])
+
+  text = payload[5 * count:].decode('ascii')
+
+  numbers = Numbers()
+  numbers.pages = pages
+
+  pos = 0
+  for n in lengths:
+    numbers.digits.append(text[pos:pos + n])
+    pos += n
+
+  return numbers, number_of_pages, start, end
+
+
+###################################################################
+#
+# store_prefix:
+#
+# The bucket prefix of the store for a job, from the bucket key of
+# its PDF or of its results file.
+#
+def store_prefix(bucketkey):
+  """
+  Returns the bucket prefix under which the parts of a job's
+  number store are kept.
+
+  Parameters
+  ----------
+  bucketkey : str
+    The bucket key of the data file (not of its results file:
+    for a text file x.txt, that is x.results.txt).
+
+  Returns
+  -------
+  str
+    The prefix, ending in "/".
+  """
+
+  return bucketkey[0:-4] + ".numbers/"
+
+
+###################################################################
+#
+# write_part:
+#
+# Uploads the numbers of one page range.
+#
+def write_part(bucket, bucketkey, numbers, number_of_pages, start, end):
+  """
+  Writes the numbers of a page range to S3.
+
+  Parameters
+  ----------
+  bucket : s3.Bucket
+    The bucket to write to.
+  bucketkey : str
+    The bucket key of the PDF.
+  numbers : Numbers
+    The numbers extracted from pages [start, end).
+  number_of_pages : int
+    The number of pages in the whole document.
+  start : int
+    The first page of the range.
+  end : int
+    One past the last page of the range.
+
+  Returns
+  -------
+  int
+    The size of the part in bytes.
+  """
+
+  key = store_prefix(bucketkey) + str(start).zfill(6) + "-" + str(end).zfill(6) + ".bin"
+  data = encode(numbers, number_of_pages, start, end)
+
+  bucket.put_object(Key=key,
+                    Body=data,
+                    ContentType='application/octet-stream')
+
+  return len(data)
+
+
+###################################################################
+#
+# read_store:
+#
+# Downloads and concatenates every part of a job's store.
+#
+def read_store(bucket, bucketkey):
+  """
+  Reads a job's number store back from S3.
+
+  Parameters
+  ----------
+  bucket : s3.Bucket
+    The bucket holding the store.
+  bucketkey : str
+    The bucket key of the PDF.
+
+  Returns
+  -------
+  tuple
+    (Numbers, number of pages); raises an exception if the
+    store is missing or its parts do not cover the document.
+  """
+
+  prefix = store_prefix(bucketkey)
+
+  keys = sorted(obj.key for obj in bucket.objects.filter(Prefix=prefix))
+
+  if len(keys) == 0:
+    raise Exception("no number store for '" + bucketkey + "'")
+
+  numbers = Numbers()
+  number_of_pages = 0
+  covered = 0
+
+  for key in keys:
+    body = bucket.Object(key).get()['Body']
+    (part, number_of_pages, start, end) = decode(body.read())
+    body.close()
+
+    if start != covered:
+      raise Exception("number store for '" + bucketkey + "' is missing pages " +
+                      str(covered) + " to " + str(start - 1))
+
+    numbers.extend(part)
+    covered = end
+
+  if covered != number_of_pages:
+    raise Exception("number store for '" + bucketkey + "' is incomplete")
+
+  return numbers, number_of_pages
+
+
+###################################################################
+#
+# clear_store:
+#
+# Deletes every part of a job's store.
+#
+def clear_store(bucket, bucketkey):
+  """
+  Deletes a job's number store, e.g. the parts left by an
+  invocation whose job has been taken over.
+
+  Parameters
+  ----------
+  bucket : s3.Bucket
+    The bucket holding the store.
+  bucketkey : str
+    The bucket key of the data file.
+
+  Returns
+  -------
+  int
+    The number of parts deleted.
+  """
+
+  deleted = 0
+
+  for obj in bucket.objects.filter(Prefix=store_prefix(bucketkey)):
+    obj.delete()
+    deleted += 1
+
+  return deleted
+
+
+###################################################################
+#
+# copy_store:
+#
+# Copies every part of one job's store to another job.
+#
+def copy_store(bucket, from_bucketkey, to_bucketkey):
+  """
+  Copies a number store, e.g. for a results cache hit.
+
+  Parameters
+  ----------
+  bucket : s3.Bucket
+    The bucket holding the store.
+  from_bucketkey : str
+    The bucket key of the data file of the source job.
+  to_bucketkey : str
+    The bucket key of the data file of the target job.
+
+  Returns
+  -------
+  int
+    The number of parts copied; raises an exception if the
+    source job has no store.
+  """
+
+  from_prefix = store_prefix(from_bucketkey)
+  to_prefix = store_prefix(to_bucketkey)
+
+  copied = 0
+
+  for obj in bucket.objects.filter(Prefix=from_prefix):
+    bucket.Object(to_prefix + obj.key[len(from_prefix):]).copy_from(
+      CopySource={'Bucket': bucket.name, 'Key': obj.key}
+    )
+    copied += 1
+
+  if copied == 0:
+    raise Exception("no number store under '" + from_prefix + "'")
+
+  return copied
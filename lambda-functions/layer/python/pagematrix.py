@@ -0,0 +1,414 @@
+#
+# pagematrix.py
+#
+# Per-page first-digit counts of a job, so that when a document
+# fails Benford's Law the pages behind the anomaly can be found
+# without re-parsing it (see proj04_pages).
+#
+# The counts form a matrix with one row of 10 slots per page,
+# indexed like tally.py's 'first' histogram (slot 0 is unused).
+# Pages without numbers are left out, so each row carries its page
+# number: a page column (array of uint32) and the counts, row after
+# row (array of uint32), compressed with zlib. For a table the
+# "page" is the first row of a block of rows, see tabular.py; for a
+# sampled job only the sampled pages have rows.
+#
+# Like the number store, the matrix is written in parts, one per
+# page range processed by an invocation, next to the results file:
+#
+#   <base>.pages/<start>-<end>.bin
+#
+# and read back by concatenating the parts in page order.
+#
+
+import struct
+import zlib
+
+from array import array
+
+import benford
+
+
+MAGIC = b"BFP1"
+
+SLOTS = 10
+
+#
+# magic, number of pages in the document, first page, one past the
+# last page, count of rows in this part
+#
+_HEADER = struct.Struct("<4sIIII")
+
+
+###################################################################
+#
+# encode:
+#
+# Serializes per-page counts into the compressed matrix format.
+#
+def encode(page_counts, number_of_pages, start, end):
+  """
+  Encodes the per-page counts of a page range.
+
+  Parameters
+  ----------
+  page_counts : list
+    (page number, first-digit counts) for each page, see
+    extraction.count_pages().
+  number_of_pages : int
+    The number of pages in the whole document.
+  start : int
+    The first page of the range.
+  end : int
+    One past the last page of the range.
+
+  Returns
+  -------
+  bytes
+    The encoded part.
+  """
+
+  rows = [(page, counts) for (page, counts) in page_counts if sum(counts) > 0]
+
+  pages = array('I', [page for (page, _) in rows])
+
+  matrix = array('I')
+  for (_, counts) in rows:
+    matrix.extend(counts)
+
+  header = _HEADER.pack(MAGIC, number_of_pages, start, end, len(rows))
+
+  return header + zlib.compress(pages.tobytes() + matrix.tobytes(), 6)
+
+
+###################################################################
+#
+# decode:
+#
+# Deserializes a part written by encode().
+#
+def decode(data):
+  """
+  Decodes a part.
+
+  Parameters
+  ----------
+  data : bytes
+    The encoded part.
+
+  Returns
+  -------
+  tuple
+    (pages, matrix, number of pages, start, end); pages and
+    matrix are arrays, the counts of pages[i] being
+    matrix[SLOTS * i:SLOTS * (i + 1)].
+  """
+
+  (magic, number_of_pages, start, end, count) = _HEADER.unpack_from(data)
+
+  if magic != MAGIC:
+    raise ValueError("not a page matrix part")
+
+  payload = zlib.decompress(data[_HEADER.size:])
+
+  pages = array('I')
+  pages.frombytes(payload[0:4 * count])
+
+  matrix = array('I')
+  matrix.frombytes(payload[4 * count:])
+
+  return pages, matrix, number_of_pages, start, end
+
+
+###################################################################
+#
+# matrix_prefix:
+#
+# The bucket prefix of the matrix of a job, from the bucket key of
+# its PDF or of its results file.
+#
+def matrix_prefix(bucketkey):
+  """
+  Returns the bucket prefix under which the parts of a job's
+  page matrix are kept.
+
+  Parameters
+  ----------
+  bucketkey : str
+    The bucket key of the data file (not of its results file:
+    for a text file x.txt, that is x.results.txt).
+
+  Returns
+  -------
+  str
+    The prefix, ending in "/".
+  """
+
+  return bucketkey[0:-4] + ".pages/"
+
+
+###################################################################
+#
+# write_part:
+#
+# Uploads the counts of one page range.
+#
+def write_part(bucket, bucketkey, page_counts, number_of_pages, start, end):
+  """
+  Writes the per-page counts of a page range to S3.
+
+  Parameters
+  ----------
+  bucket : s3.Bucket
+    The bucket to write to.
+  bucketkey : str
+    The bucket key of the PDF.
+  page_counts : list
+    (page number, first-digit counts) for each page processed.
+  number_of_pages : int
+    The number of pages in the whole document.
+  start : int
+    The first page of the range.
+  end : int
+    One past the last page of the range.
+
+  Returns
+  -------
+  int
+    The size of the part in bytes.
+  """
+
+  key = matrix_prefix(bucketkey) + str(start).zfill(6) + "-" + str(end).zfill(6) + ".bin"
+  data = encode(page_counts, number_of_pages, start, end)
+
+  bucket.put_object(Key=key,
+                    Body=data,
+                    ContentType='application/octet-stream')
+
+  return len(data)
+
+
+class MatrixNotFound(Exception):
+  """
+  The job has no page matrix, or a part of it has gone missing
+  from the bucket (S3's NoSuchKey).
+  """
+
+
+def _is_no_such_key(err):
+  #
+  # botocore's ClientError, without importing botocore
+  #
+  response = getattr(err, 'response', None)
+  return isinstance(response, dict) and response.get('Error', {}).get('Code') in ('NoSuchKey', '404')
+
+
+###################################################################
+#
+# read_matrix:
+#
+# Downloads and concatenates every part of a job's matrix.
+#
+def read_matrix(bucket, bucketkey):
+  """
+  Reads a job's page matrix back from S3.
+
+  Parameters
+  ----------
+  bucket : s3.Bucket
+    The bucket holding the matrix.
+  bucketkey : str
+    The bucket key of the data file.
+
+  Returns
+  -------
+  tuple
+    (pages, matrix, number of pages), see decode(); raises
+    MatrixNotFound if the matrix is missing, and an exception
+    if its parts do not cover the document.
+  """
+
+  prefix = matrix_prefix(bucketkey)
+
+  keys = sorted(obj.key for obj in bucket.objects.filter(Prefix=prefix))
+
+  if len(keys) == 0:
+    raise MatrixNotFound("no page matrix for '" + bucketkey + "'")
+
+  pages = array('I')
+  matrix = array('I')
+  number_of_pages = 0
+  covered = 0
+
+  for key in keys:
+    try:
+      body = bucket.Object(key).get()['Body']
+    except Exception as err:
+      if _is_no_such_key(err):
+        raise MatrixNotFound("page matrix part '" + key + "' has gone missing") from err
+      raise
+    (part_pages, part_matrix, number_of_pages, start, end) = decode(body.read())
+    body.close()
+
+    if start != covered:
+      raise Exception("page matrix for '" + bucketkey + "' is missing pages " +
+                      str(covered) + " to " + str(start - 1))
+
+    pages.extend(part_pages)
+    matrix.extend(part_matrix)
+    covered = end
+
+  if covered != number_of_pages:
+    raise Exception("page matrix for '" + bucketkey + "' is incomplete")
+
+  return pages, matrix, number_of_pages
+
+
+###################################################################
+#
+# clear_matrix:
+#
+# Deletes every part of a job's matrix.
+#
+def clear_matrix(bucket, bucketkey):
+  """
+  Deletes a job's page matrix, e.g. the parts left by an
+  invocation whose job has been taken over, which may not line
+  up with the page ranges of the invocation taking it over.
+
+  Parameters
+  ----------
+  bucket : s3.Bucket
+    The bucket holding the matrix.
+  bucketkey : str
+    The bucket key of the data file.
+
+  Returns
+  -------
+  int
+    The number of parts deleted.
+  """
+
+  deleted = 0
+
+  for obj in bucket.objects.filter(Prefix=matrix_prefix(bucketkey)):
+    obj.delete()
+    deleted += 1
+
+  return deleted
+
+
+###################################################################
+#
+# copy_matrix:
+#
+# Copies every part of one job's matrix to another job.
+#
+def copy_matrix(bucket, from_bucketkey, to_bucketkey):
+  """
+  Copies a page matrix, e.g. for a results cache hit.
+
+  Parameters
+  ----------
+  bucket : s3.Bucket
+    The bucket holding the matrix.
+  from_bucketkey : str
+    The bucket key of the data file of the source job.
+  to_bucketkey : str
+    The bucket key of the data file of the target job.
+
+  Returns
+  -------
+  int
+    The number of parts copied; raises MatrixNotFound if the
+    source job has no matrix.
+  """
+
+  from_prefix = matrix_prefix(from_bucketkey)
+  to_prefix = matrix_prefix(to_bucketkey)
+
+  copied = 0
+
+  for obj in bucket.objects.filter(Prefix=from_prefix):
+    bucket.Object(to_prefix + obj.key[len(from_prefix):]).copy_from(
+      CopySource={'Bucket': bucket.name, 'Key': obj.key}
+    )
+    copied += 1
+
+  if copied == 0:
+    raise MatrixNotFound("no page matrix under '" + from_prefix + "'")
+
+  return copied
+
+
+###################################################################
+#
+# score_pages:
+#
+# Per-page deviation from Benford's Law, worst first.
+#
+def score_pages(pages, matrix, min_numbers=1):
+  """
+  Scores each page of a matrix against the expected first-digit
+  proportions. The statistics are computed a digit column at a
+  time over the whole matrix, rather than page by page; numpy
+  is not in the layer, so each column is a list comprehension.
+
+  The pages are ranked by their chi-square statistic, which
+  grows with both the deviation and the number of numbers on
+  the page, so a page with a few odd numbers does not outrank
+  a long page that deviates as much.
+
+  Parameters
+  ----------
+  pages : array
+    The page column, see decode().
+  matrix : array
+    The counts, SLOTS per page.
+  min_numbers : int
+    Pages with fewer numbers than this are not scored.
+
+  Returns
+  -------
+  list
+    A dict per page scored, worst first: page (1-based), n,
+    chi_square, mad, conformity and counts (digits 1..9).
+  """
+
+  expected = benford.EXPECTED['first']
+
+  #
+  # one column per digit: column[d][i] is the count of digit d
+  # on pages[i]
+  #
+  columns = [matrix[d::SLOTS] for d in range(0, SLOTS)]
+
+  totals = [sum(row) for row in zip(*columns[1:SLOTS], strict=True)]
+
+  chi_squares = [0.0] * len(totals)
+  deviations = [0.0] * len(totals)
+
+  for d in range(1, SLOTS):
+    e = expected[d]
+    chi_squares = [x + ((c - n * e) ** 2 / (n * e) if n > 0 else 0.0)
+                   for (x, c, n) in zip(chi_squares, columns[d], totals, strict=True)]
+    deviations = [x + (abs(c / n - e) if n > 0 else 0.0)
+                  for (x, c, n) in zip(deviations, columns[d], totals, strict=True)]
+
+  ranked = sorted((i for i in range(0, len(totals)) if totals[i] >= max(1, min_numbers)),
+                  key=lambda i: (-chi_squares[i], pages[i]))
+
+  scores = []
+
+  for i in ranked:
+    mad = deviations[i] / (SLOTS - 1)
+    scores.append({
+      'page': pages[i] + 1,
+      'n': totals[i],
+      'chi_square': round(chi_squares[i], 4),
+      'mad': round(mad, 6),
+      'conformity': benford.conformity('first', mad),
+      'counts': [columns[d][i] for d in range(1, SLOTS)],
+    })
+
+  return scores
@@ -0,0 +1,534 @@
+#
+# rawtext.py
+#
+# Fast text extraction for proj04_compute. pypdf's extract_text()
+# rebuilds the layout of each page (decoding every glyph through
+# the font's encoding and cmaps, and tracking the full text state
+# to order the output), but the tally only needs the digit runs.
+# This module decodes a page's content stream and pulls the string
+# operands of the text-showing operators directly:
+#
+#   (string) Tj     [(str) kern (ing)] TJ     (string) '     aw ac (string) "
+#
+# Word processors often emit every run of text in its own text
+# object, so to keep "COVID-19" or "1,234" in one piece the text
+# position is followed through the text and graphics matrices:
+# runs that continue on the same baseline are joined, other runs
+# are separated by a space or a newline. Run widths come from the
+# font's /Widths array when it has one, or an average of 0.5 em.
+# Form XObjects are followed, and pages with no BT operator (e.g.
+# scanned images) are skipped without being tokenized.
+#
+# The bytes of each string are decoded as Latin-1 rather than
+# through the font's encoding, so documents whose fonts use
+# composite (Type0 / CID) encodings yield little usable text in
+# this mode. Use it where it agrees with the default extractor,
+# see benchmarks/bench_extract.py.
+#
+# Even with simple fonts the two extractors can disagree, since
+# they join and split runs differently, and so can a job's
+# histograms. On update09.pdf (28 pages of prose and tables) this
+# module reads 2246 numbers to extract_text()'s 2264, the same
+# numbers on 21 of the pages; most of the difference is
+# extract_text() splitting runs that this module keeps whole,
+# e.g. "COVID -19" for "COVID-19" and "5 5%" for "55%". See
+# tests/test_rawtext.py.
+#
+
+import re
+
+
+#
+# one token of a content stream; literal strings and inline image
+# data need more than a regex, so '(' and 'BI' are handled by the
+# scanner
+#
+_TOKEN = re.compile(rb"""
+    [\x00\t\n\x0c\r ]*
+    (?:
+      (%[^\r\n]*)                                          # 1 comment
+    | (\()                                                 # 2 literal string
+    | (<<|>>|\{|\})                                        # 3 dictionary, procedure
+    | <([0-9A-Fa-f\x00\t\n\x0c\r ]*)>                      # 4 hex string
+    | (\[)                                                 # 5 array start
+    | (\])                                                 # 6 array end
+    | (/[^\x00\t\n\x0c\r ()<>\[\]{}/%]*)                   # 7 name
+    | ([+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+))                  # 8 number
+    | ([^\x00\t\n\x0c\r ()<>\[\]{}/%]+)                    # 9 operator
+    )
+""", re.VERBOSE)
+
+#
+# the characters that end or escape a literal string
+#
+_LITERAL_SPECIAL = re.compile(rb"[()\\]")
+
+_ESCAPES = {
+  ord('n'): b"\n", ord('r'): b"\r", ord('t'): b"\t",
+  ord('b'): b"\b", ord('f'): b"\f",
+  ord('('): b"(", ord(')'): b")", ord('\\'): b"\\",
+}
+
+_OCTAL = re.compile(rb"[0-7]{1,3}")
+
+#
+# end of inline image data: whitespace, EI, then whitespace or
+# the end of the stream
+#
+_END_INLINE_IMAGE = re.compile(rb"\sEI(?:[\x00\t\n\x0c\r ]|$)")
+
+_SHOW_OPERATORS = {b"Tj", b"TJ", b"'", b'"'}
+
+_IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+#
+# a TJ adjustment more negative than this (in thousandths of a
+# text space unit) is taken as a word gap
+#
+KERN_SPACE = -200
+
+#
+# runs on the same baseline further apart than this fraction of
+# the font size are separate words; runs whose baselines differ
+# by more than NEWLINE_GAP of the font size are on separate lines
+#
+SPACE_GAP = 0.15
+NEWLINE_GAP = 0.5
+
+#
+# glyph width, in thousandths of an em, for fonts without /Widths
+#
+DEFAULT_WIDTH = 500
+
+#
+# how deeply nested Form XObjects are followed
+#
+MAX_FORM_DEPTH = 8
+
+
+def _literal(data, pos):
+  """
+  Parses the literal string beginning just after the '(' at
+  data[pos - 1]; returns (the string's bytes, the position just
+  after its closing ')').
+  """
+
+  out = []
+  depth = 1
+  size = len(data)
+
+  while pos < size:
+    m = _LITERAL_SPECIAL.search(data, pos)
+    if m is None:
+      out.append(data[pos:])
+      pos = size
+      break
+
+    at = m.start()
+    out.append(data[pos:at])
+    c = data[at]
+
+    if c == 0x5c:    # backslash
+      if at + 1 >= size:
+        pos = size
+        break
+      e = data[at + 1]
+      if e in _ESCAPES:
+        out.append(_ESCAPES[e])
+        pos = at + 2
+      elif 0x30 <= e <= 0x37:
+        o = _OCTAL.match(data, at + 1)
+        out.append(bytes([int(o.group(), 8) & 0xff]))
+        pos = o.end()
+      elif e == 0x0d:  # line continuation, \r or \r\n
+        pos = at + 3 if data[at + 2:at + 3] == b"\n" else at + 2
+      elif e == 0x0a:
+        pos = at + 2
+      else:
+        out.append(bytes([e]))
+        pos = at + 2
+    elif c == 0x28:  # (
+      depth += 1
+      out.append(b"(")
+      pos = at + 1
+    else:            # )
+      depth -= 1
+      pos = at + 1
+      if depth == 0:
+        break
+      out.append(b")")
+
+  return b"".join(out), pos
+
+
+def _hex(digits):
+  """
+  Decodes the digits of a hex string; an odd final digit is
+  padded with 0.
+  """
+
+  digits = bytes(c for c in digits if c not in b"\x00\t\n\x0c\r ")
+  if len(digits) % 2 == 1:
+    digits += b"0"
+
+  return bytes.fromhex(digits.decode('ascii'))
+
+
+def _multiply(m, n):
+  """
+  The product m x n of two PDF matrices [a b c d e f].
+  """
+
+  return (m[0] * n[0] + m[1] * n[2],
+          m[0] * n[1] + m[1] * n[3],
+          m[2] * n[0] + m[3] * n[2],
+          m[2] * n[1] + m[3] * n[3],
+          m[4] * n[0] + m[5] * n[2] + n[4],
+          m[4] * n[1] + m[5] * n[3] + n[5])
+
+
+def _numbers(operands, count):
+  """
+  The last count operands as floats, or None if there are too
+  few or they are not all numbers.
+  """
+
+  if len(operands) < count:
+    return None
+
+  values = operands[len(operands) - count:]
+  for v in values:
+    if not isinstance(v, float):
+      return None
+
+  return values
+
+
+class _Resources:
+  """
+  The fonts and Form XObjects of a page or form, looked up
+  lazily by name and cached.
+  """
+
+  def __init__(self, resources):
+    self.resources = resources.get_object() if resources is not None else None
+    self.font_cache = {}
+
+  def _lookup(self, category, name):
+    if self.resources is None or not isinstance(name, bytes):
+      return None
+    entries = self.resources.get(category)
+    if entries is None:
+      return None
+    entry = entries.get_object().get(name.decode('latin-1'))
+    return entry.get_object() if entry is not None else None
+
+  def widths(self, name):
+    """
+    (first char, widths, missing width) of a font, in
+    thousandths of an em.
+    """
+
+    if name in self.font_cache:
+      return self.font_cache[name]
+
+    widths = (0, [], DEFAULT_WIDTH)
+    try:
+      font = self._lookup("/Font", name)
+      if font is not None and "/Widths" in font:
+        missing = DEFAULT_WIDTH
+        descriptor = font.get("/FontDescriptor")
+        if descriptor is not None:
+          missing = float(descriptor.get_object().get("/MissingWidth", DEFAULT_WIDTH))
+        widths = (int(font.get("/FirstChar", 0)),
+                  [float(w) for w in font["/Widths"].get_object()],
+                  missing)
+    except Exception:
+      pass
+
+    self.font_cache[name] = widths
+    return widths
+
+  def form(self, name):
+    """
+    (decoded stream, resources, matrix) of a Form XObject, or
+    None.
+    """
+
+    xobject = self._lookup("/XObject", name)
+    if xobject is None or xobject.get("/Subtype") != "/Form":
+      return None
+
+    matrix = tuple(float(v) for v in xobject.get("/Matrix", _IDENTITY))
+
+    return (xobject.get_data(),
+            _Resources(xobject.get("/Resources", self.resources)),
+            matrix)
+
+
+###################################################################
+#
+# extract_stream:
+#
+# Pulls the shown text out of one decoded content stream.
+#
+def extract_stream(data, resources=None, ctm=_IDENTITY, depth=0, parts=None, last=None):
+  """
+  Extracts the text shown by a content stream.
+
+  Parameters
+  ----------
+  data : bytes
+    The decoded content stream.
+  resources : _Resources
+    The fonts and forms the stream refers to. Defaults to None,
+    which estimates every glyph's width and ignores XObjects.
+  ctm : tuple
+    The initial current transformation matrix.
+  depth : int
+    The current Form XObject nesting depth.
+  parts : list
+    The text so far, appended to; used for Form XObjects.
+  last : list
+    [x, y, font size] in device space at the end of the text
+    shown so far, or [None] * 3; used for Form XObjects.
+
+  Returns
+  -------
+  str
+    The text, with spaces and newlines approximating the
+    positions of the strings shown.
+  """
+
+  if parts is None:
+    parts = []
+  if last is None:
+    last = [None, None, None]
+
+  #
+  # no text object, no text: skip image-only pages untokenized,
+  # unless a form XObject might hold the text
+  #
+  if b"BT" not in data and (resources is None or b"Do" not in data):
+    return "".join(parts)
+
+  stack = []
+  tm = tlm = _IDENTITY
+  font = None
+  font_size = 0.0
+  leading = 0.0
+  char_spacing = 0.0
+  word_spacing = 0.0
+  hscale = 1.0
+
+  operands = []
+  arrays = []
+  pos = 0
+  size = len(data)
+
+  while pos < size:
+    m = _TOKEN.match(data, pos)
+    if m is None:
+      #
+      # trailing whitespace, or a stray delimiter: skip a byte
+      #
+      pos += 1
+      continue
+    pos = m.end()
+
+    kind = m.lastindex
+    if kind == 1 or kind == 3:
+      continue
+
+    if kind == 2:
+      (value, pos) = _literal(data, pos)
+    elif kind == 4:
+      value = _hex(m.group(4))
+    elif kind == 5:
+      arrays.append([])
+      continue
+    elif kind == 6:
+      if len(arrays) == 0:
+        continue
+      value = arrays.pop()
+    elif kind == 7:
+      value = m.group(7)
+    elif kind == 8:
+      value = float(m.group(8))
+    else:
+      op = m.group(9)
+
+      if op in _SHOW_OPERATORS:
+        if op == b"'" or op == b'"':
+          if op == b'"':
+            spacing = _numbers(operands[0:-1], 2)
+            if spacing is not None:
+              (word_spacing, char_spacing) = spacing
+          tlm = _multiply((1.0, 0.0, 0.0, 1.0, 0.0, -leading), tlm)
+          tm = tlm
+
+        shown = operands[-1] if len(operands) > 0 else b""
+        if isinstance(shown, bytes):
+          shown = [shown]
+        elif not isinstance(shown, list):
+          shown = []
+
+        (first_char, widths, missing) = resources.widths(font) if resources is not None else (0, [], DEFAULT_WIDTH)
+
+        for item in shown:
+          if isinstance(item, float):
+            if item < KERN_SPACE and last[0] is not None:
+              parts.append(" ")
+            tm = _multiply((1.0, 0.0, 0.0, 1.0, -item / 1000.0 * font_size * hscale, 0.0), tm)
+            continue
+          if not isinstance(item, bytes) or len(item) == 0:
+            continue
+
+          #
+          # where does this run start, in device space, relative
+          # to where the last one ended?
+          #
+          trm = _multiply(tm, ctm)
+          (x, y) = (trm[4], trm[5])
+          em = font_size * ((trm[2] * trm[2] + trm[3] * trm[3]) ** 0.5 or 1.0)
+
+          if last[0] is not None:
+            #
+            # measure the gap along and across the baseline, so
+            # rotated text (e.g. chart labels) is joined too
+            #
+            scale = (trm[0] * trm[0] + trm[1] * trm[1]) ** 0.5 or 1.0
+            (ux, uy) = (trm[0] / scale, trm[1] / scale)
+            (dx, dy) = (x - last[0], y - last[1])
+            gap = max(em, last[2])
+            if abs(dy * ux - dx * uy) > NEWLINE_GAP * gap:
+              parts.append("\n")
+            elif abs(dx * ux + dy * uy) > SPACE_GAP * gap:
+              parts.append(" ")
+
+          parts.append(item.decode('latin-1'))
+
+          advance = 0.0
+          for c in item:
+            i = c - first_char
+            w = widths[i] if 0 <= i < len(widths) else missing
+            advance += w / 1000.0 * font_size + char_spacing
+            if c == 32:
+              advance += word_spacing
+          tm = _multiply((1.0, 0.0, 0.0, 1.0, advance * hscale, 0.0), tm)
+
+          trm = _multiply(tm, ctm)
+          last[0] = trm[4]
+          last[1] = trm[5]
+          last[2] = em
+      elif op == b"Tf":
+        if len(operands) >= 2 and isinstance(operands[-1], float):
+          font = operands[-2]
+          font_size = operands[-1]
+      elif op == b"Td" or op == b"TD":
+        move = _numbers(operands, 2)
+        if move is not None:
+          if op == b"TD":
+            leading = -move[1]
+          tlm = _multiply((1.0, 0.0, 0.0, 1.0, move[0], move[1]), tlm)
+          tm = tlm
+      elif op == b"Tm":
+        matrix = _numbers(operands, 6)
+        if matrix is not None:
+          tm = tlm = tuple(matrix)
+      elif op == b"T*":
+        tlm = _multiply((1.0, 0.0, 0.0, 1.0, 0.0, -leading), tlm)
+        tm = tlm
+      elif op == b"BT":
+        tm = tlm = _IDENTITY
+      elif op == b"TL":
+        value = _numbers(operands, 1)
+        if value is not None:
+          leading = value[0]
+      elif op == b"Tc":
+        value = _numbers(operands, 1)
+        if value is not None:
+          char_spacing = value[0]
+      elif op == b"Tw":
+        value = _numbers(operands, 1)
+        if value is not None:
+          word_spacing = value[0]
+      elif op == b"Tz":
+        value = _numbers(operands, 1)
+        if value is not None:
+          hscale = value[0] / 100.0
+      elif op == b"q":
+        #
+        # the text state parameters are part of the graphics
+        # state, so are saved and restored with the CTM
+        #
+        stack.append((ctm, font, font_size, leading, char_spacing, word_spacing, hscale))
+      elif op == b"Q":
+        if len(stack) > 0:
+          (ctm, font, font_size, leading, char_spacing, word_spacing, hscale) = stack.pop()
+      elif op == b"cm":
+        matrix = _numbers(operands, 6)
+        if matrix is not None:
+          ctm = _multiply(tuple(matrix), ctm)
+      elif op == b"Do":
+        if resources is not None and depth < MAX_FORM_DEPTH and len(operands) > 0:
+          form = resources.form(operands[-1])
+          if form is not None:
+            (form_data, form_resources, matrix) = form
+            extract_stream(form_data, form_resources, _multiply(matrix, ctm),
+                           depth + 1, parts, last)
+      elif op == b"BI":
+        #
+        # inline image: skip its dictionary and binary data
+        #
+        start = data.find(b"ID", pos)
+        if start < 0:
+          break
+        end = _END_INLINE_IMAGE.search(data, start + 3)
+        pos = size if end is None else end.end()
+
+      operands = []
+      arrays = []
+      continue
+
+    if len(arrays) > 0:
+      arrays[-1].append(value)
+    else:
+      operands.append(value)
+
+  return "".join(parts)
+
+
+###################################################################
+#
+# extract_page:
+#
+# Fast replacement for page.extract_text().
+#
+def extract_page(page):
+  """
+  Extracts the text of a PDF page straight from its content
+  stream, without layout reconstruction.
+
+  Parameters
+  ----------
+  page : pypdf.PageObject
+    The page.
+
+  Returns
+  -------
+  str
+    The text shown on the page; empty for pages without text
+    operators.
+  """
+
+  contents = page.get_contents()
+  if contents is None:
+    return ""
+
+  data = contents.get_data()
+
+  if b"BT" not in data and b"Do" not in data:
+    return ""
+
+  return extract_stream(data, _Resources(page.get("/Resources")))
@@ -0,0 +1,275 @@
+#
+# resultcache.py
+#
+# Content-addressed cache of compute results. Each PDF is keyed
+# by the SHA-256 digest of its bytes; when the same document is
+# uploaded again, the cached results file is copied to the new
+# job's results key instead of re-parsing the PDF.
+#
+# The cache lives in the resultcache table, with hit / miss /
+# eviction counters in the cachestats table (see
+# benfordapp-database.sql). Entries that have not been used for
+# max_age_days are evicted.
+#
+# Used by proj04_compute, and by proj04_upload for the uploads it
+# computes inline.
+#
+
+import hashlib
+import datatier
+
+
+#
+# bump this whenever the contents of the results file change, so
+# results in the old format are never served from the cache
+#
+RESULTS_VERSION = "v2"
+
+CHUNK_SIZE = 1024 * 1024
+
+
+###################################################################
+#
+# digest_of:
+#
+# SHA-256 hex digest of a PDF, given as a filename or an in-memory
+# buffer.
+#
+def digest_of(source):
+  """
+  Computes the SHA-256 digest of a document.
+
+  Parameters
+  ----------
+  source : str or BytesIO
+    The filename of the document, or a buffer holding it.
+
+  Returns
+  -------
+  str
+    The hex digest (64 characters).
+  """
+
+  h = hashlib.sha256()
+
+  if isinstance(source, str):
+    with open(source, "rb") as infile:
+      for chunk in iter(lambda: infile.read(CHUNK_SIZE), b""):
+        h.update(chunk)
+  else:
+    h.update(source.getbuffer())
+
+  return h.hexdigest()
+
+
+###################################################################
+#
+# variant_of:
+#
+# The cache variant of results computed with the given engine.
+#
+def variant_of(extractor, backend):
+  """
+  Names how results were computed. The extractors (and
+  tokenizers) can disagree, so results from one are never
+  served to a job configured for another.
+
+  Parameters
+  ----------
+  extractor : str
+    The text extractor, 'layout' or 'raw'.
+  backend : str
+    The tally backend, see tally.py.
+
+  Returns
+  -------
+  str
+    The variant; a job's options add a suffix, see
+    joboptions.cache_suffix().
+  """
+
+  variant = RESULTS_VERSION
+
+  if extractor != 'layout':
+    variant += "-" + extractor
+  if backend.startswith('tokens'):
+    variant += "-" + backend
+
+  return variant
+
+
+def _count(dbConn, name):
+  sql = "UPDATE cachestats SET value = value + 1 WHERE name = %s;"
+  datatier.perform_action(dbConn, sql, [name])
+
+
+###################################################################
+#
+# lookup:
+#
+# Returns the cached results key for a digest, and the key of the
+# file they were computed from, or None on a miss. Hits refresh
+# the entry so it is not evicted.
+#
+def lookup(dbConn, digest, variant=RESULTS_VERSION, max_age_days=30):
+  """
+  Looks up the cached results for a document digest.
+
+  Parameters
+  ----------
+  dbConn : the database connection
+  digest : str
+    The SHA-256 hex digest of the document.
+  variant : str
+    Identifies how the results were computed; only entries
+    with the same variant are returned.
+  max_age_days : int
+    Entries not used for this many days are ignored.
+
+  Returns
+  -------
+  tuple
+    (resultsfilekey, datafilekey): the bucket key of the cached
+    results file, and that of the file they were computed from,
+    whose number store and page matrix can be copied ('' for
+    entries that predate it); None on a miss.
+  """
+
+  sql = """
+    SELECT resultsfilekey, datafilekey FROM resultcache
+    WHERE digest = %s AND variant = %s
+      AND lastused > NOW() - INTERVAL %s DAY;
+  """
+
+  row = datatier.retrieve_one_row(dbConn, sql, [digest, variant, max_age_days])
+
+  if row == ():
+    _count(dbConn, 'misses')
+    return None
+
+  sql = """
+    UPDATE resultcache SET hits = hits + 1, lastused = NOW()
+    WHERE digest = %s AND variant = %s;
+  """
+
+  datatier.perform_action(dbConn, sql, [digest, variant])
+  _count(dbConn, 'hits')
+
+  return (row[0], row[1])
+
+
+###################################################################
+#
+# store:
+#
+# Records the results key for a digest, then evicts stale entries.
+#
+def store(dbConn, digest, resultsfilekey, datafilekey, variant=RESULTS_VERSION, max_age_days=30):
+  """
+  Adds (or replaces) the cached results for a document digest,
+  and evicts entries that have not been used for max_age_days.
+
+  Parameters
+  ----------
+  dbConn : the database connection
+  digest : str
+    The SHA-256 hex digest of the document.
+  resultsfilekey : str
+    The bucket key of the results file.
+  datafilekey : str
+    The bucket key of the file the results were computed from.
+  variant : str
+    Identifies how the results were computed.
+  max_age_days : int
+    Entries not used for this many days are evicted.
+  """
+
+  sql = """
+    REPLACE INTO resultcache(digest, variant, resultsfilekey, datafilekey, hits, created, lastused)
+                 VALUES(%s, %s, %s, %s, 0, NOW(), NOW());
+  """
+
+  datatier.perform_action(dbConn, sql, [digest, variant, resultsfilekey, datafilekey])
+
+  evicted = evict(dbConn, max_age_days)
+
+  if evicted > 0:
+    print("**Evicted", evicted, "stale cache entries**")
+
+
+###################################################################
+#
+# forget:
+#
+# Removes the entry for a digest, e.g. when its results file has
+# gone missing from S3.
+#
+def forget(dbConn, digest, variant=RESULTS_VERSION):
+  """
+  Removes the cached results for a document digest.
+  """
+
+  sql = "DELETE FROM resultcache WHERE digest = %s AND variant = %s;"
+
+  datatier.perform_action(dbConn, sql, [digest, variant])
+
+
+###################################################################
+#
+# evict:
+#
+# Deletes entries not used for max_age_days.
+#
+def evict(dbConn, max_age_days=30):
+  """
+  Evicts cache entries that have not been used recently.
+
+  Parameters
+  ----------
+  dbConn : the database connection
+  max_age_days : int
+    Entries not used for this many days are deleted.
+
+  Returns
+  -------
+  int
+    The number of entries evicted.
+  """
+
+  sql = "DELETE FROM resultcache WHERE lastused < NOW() - INTERVAL %s DAY;"
+
+  evicted = datatier.perform_action(dbConn, sql, [max_age_days])
+
+  if evicted > 0:
+    sql = "UPDATE cachestats SET value = value + %s WHERE name = 'evictions';"
+    datatier.perform_action(dbConn, sql, [evicted])
+
+  return evicted
+
+
+###################################################################
+#
+# copy_results:
+#
+# Copies a cached results file to a new job's results key.
+#
+def copy_results(bucket, cached_key, resultsfilekey):
+  """
+  Copies a cached results file within the bucket.
+
+  Parameters
+  ----------
+  bucket : s3.Bucket
+    The bucket holding the results.
+  cached_key : str
+    The key of the cached results file.
+  resultsfilekey : str
+    The key to copy it to.
+  """
+
+  bucket.Object(resultsfilekey).copy_from(
+    CopySource={'Bucket': bucket.name, 'Key': cached_key},
+    ACL='public-read',
+    ContentType='text/plain',
+    MetadataDirective='REPLACE'
+  )
@@ -0,0 +1,358 @@
+#
+# runtime.py
+#
+# What a proj04_* handler sets up once per container rather than
+# once per invocation. Lambda keeps a container, and the modules it
+# has imported, alive between invocations, so config.ini, the boto3
+# session and S3 resource, and the database connection are set up
+# once, and reused by every warm invocation after.
+#
+# config.ini is read when the handler is imported (the cold start).
+# The S3 resource and the database connection are opened on first
+# use, so a request that fails early, e.g. with a 400, doesn't pay
+# for importing boto3 or pymysql; a function that always needs
+# them opens them at import instead (eager). Anything that fails at
+# import is retried on first use, inside the handler, so the error
+# reaches the client as usual.
+#
+# Database connections come from a small pool (see
+# datatier.ConnectionPool, and the pool settings of config.ini's
+# [rds] section): one is handed out per invocation, pinged first,
+# and given back for the next; a connection the server has dropped,
+# e.g. after MySQL's wait_timeout, or one past its idle timeout or
+# lifetime, is replaced by a new one.
+#
+# This file is shared by all the proj04_* functions, see
+# lambda-functions/layer.
+#
+
+import os
+import time
+import datatier
+
+from configparser import ConfigParser
+
+
+CONFIG_FILE = 'config.ini'
+
+_configur = None
+_s3_profile = None
+_s3 = None
+_bucket = None
+_slot_buckets = {}
+_pool = None
+_dbConn = None
+_db_last_used = None
+
+#
+# the seconds spent setting up each part of the container (config,
+# s3, db) in the current invocation -- for the first, including
+# the import -- and counters across the container's life
+#
+_init_secs = {}
+_invocations = 0
+_check_secs = 0.0
+
+
+def _timed(name, fn):
+  t0 = time.perf_counter()
+  result = fn()
+  _init_secs[name] = _init_secs.get(name, 0.0) + time.perf_counter() - t0
+  return result
+
+
+###################################################################
+#
+# init:
+#
+# Sets up a container, when the handler is imported.
+#
+def init(s3_profile=None, eager=False):
+  """
+  Reads config.ini and, if eager, opens the S3 resource (under
+  the given credentials profile) and the database connection, so
+  the first invocation finds them ready. Failures are logged,
+  not raised: config(), bucket() and db_conn() try again.
+
+  Parameters
+  ----------
+  s3_profile : str
+    The credentials profile of config.ini to access S3 with,
+    e.g. 's3readonly'; None if the function does not use S3.
+  eager : bool
+    Open S3 and the database now rather than on first use, for
+    a function that needs them for every request.
+  """
+
+  global _s3_profile
+
+  _s3_profile = s3_profile
+
+  try:
+    config()
+
+    if eager:
+      if s3_profile is not None:
+        bucket()
+
+      db_conn()
+
+  except Exception as err:
+    print("**runtime.init() failed, retrying on first use:", str(err), "**")
+
+
+###################################################################
+#
+# config:
+#
+# The parsed config.ini.
+#
+def config():
+  """
+  Returns the parsed config.ini, reading it on first use. The
+  file also holds the AWS credentials profiles, see init().
+  """
+
+  global _configur
+
+  if _configur is None:
+    def read():
+      os.environ['AWS_SHARED_CREDENTIALS_FILE'] = CONFIG_FILE
+      configur = ConfigParser()
+      configur.read(CONFIG_FILE)
+      return configur
+
+    _configur = _timed('config', read)
+
+  return _configur
+
+
+###################################################################
+#
+# bucket:
+#
+# The bucket named in config.ini.
+#
+def bucket(slot=0):
+  """
+  Returns the bucket of config.ini's [s3] section, opening the
+  boto3 session and S3 resource on first use. boto3 resources
+  are not thread-safe, so work running on threads of its own
+  asks for a slot of its own: each slot past 0 gets its own
+  session and resource, opened once and reused by warm
+  invocations.
+
+  Parameters
+  ----------
+  slot : int
+    0 for the handler's own bucket; 1, 2, ... for the other
+    records of a batch.
+  """
+
+  global _bucket
+
+  if slot == 0:
+    if _bucket is None:
+      _bucket = s3().Bucket(config().get('s3', 'bucket_name'))
+
+    return _bucket
+
+  if slot not in _slot_buckets:
+    s3()  # the default session, under the profile given to init()
+
+    def open_bucket():
+      import boto3
+
+      session = boto3.session.Session(profile_name=_s3_profile)
+      return session.resource('s3').Bucket(config().get('s3', 'bucket_name'))
+
+    _slot_buckets[slot] = _timed('s3', open_bucket)
+
+  return _slot_buckets[slot]
+
+
+###################################################################
+#
+# s3:
+#
+# The S3 resource.
+#
+def s3():
+  """
+  Returns the S3 resource, opened under the profile given to
+  init().
+  """
+
+  global _s3
+
+  if _s3 is None:
+    config()  # points boto3 at the credentials in config.ini
+
+    def open_resource():
+      import boto3
+
+      boto3.setup_default_session(profile_name=_s3_profile)
+      return boto3.resource('s3')
+
+    _s3 = _timed('s3', open_resource)
+
+  return _s3
+
+
+###################################################################
+#
+# pool:
+#
+# The database connection pool.
+#
+def pool():
+  """
+  Returns the container's connection pool to the database of
+  config.ini's [rds] section, created on first use.
+
+  Returns
+  -------
+  datatier.ConnectionPool
+  """
+
+  global _pool
+
+  if _pool is None:
+    configur = config()
+
+    _pool = datatier.ConnectionPool(configur.get('rds', 'endpoint'),
+                                    int(configur.get('rds', 'port_number')),
+                                    configur.get('rds', 'user_name'),
+                                    configur.get('rds', 'user_pwd'),
+                                    configur.get('rds', 'db_name'),
+                                    size=configur.getint('rds', 'pool_size', fallback=2),
+                                    idle_timeout=configur.getint('rds', 'idle_timeout', fallback=300),
+                                    max_lifetime=configur.getint('rds', 'max_lifetime', fallback=3600))
+
+  return _pool
+
+
+###################################################################
+#
+# db_conn:
+#
+# The invocation's database connection, checked before use.
+#
+def db_conn():
+  """
+  Returns a database connection from the pool: opened on first
+  use, and on later uses pinged, and replaced if it has been
+  dropped or has expired. A connection handed out earlier is
+  given back first, so there is one per invocation; giving it
+  back rolls back its open transaction, so commit first.
+
+  Returns
+  -------
+  a connection object, see datatier.get_dbConn()
+  """
+
+  global _dbConn, _db_last_used, _check_secs
+
+  connections = pool()
+
+  if _dbConn is not None:
+    connections.release(_dbConn)
+    _dbConn = None
+
+  if connections.connects == 0:
+    _dbConn = _timed('db', connections.acquire)
+  else:
+    t0 = time.perf_counter()
+    _dbConn = connections.acquire()
+    _check_secs += time.perf_counter() - t0
+
+  _db_last_used = time.monotonic()
+
+  return _dbConn
+
+
+###################################################################
+#
+# start_invocation:
+#
+# Marks the start of an invocation, and reports how the container
+# was set up.
+#
+def start_invocation():
+  """
+  Counts an invocation and prints whether it is the container's
+  first (cold) or a later (warm) one, with the seconds spent
+  setting up the container.
+
+  Returns
+  -------
+  dict
+    See stats().
+  """
+
+  global _invocations, _check_secs, _dbConn
+
+  if _invocations > 0:
+    _init_secs.clear()
+
+  #
+  # the last invocation's connection goes back to the pool, idle
+  # since it was last handed out; giving it back ends its
+  # transaction, so this invocation reads what other functions
+  # have committed since, rather than the last one's snapshot
+  #
+  if _dbConn is not None:
+    _pool.release(_dbConn, last_used=_db_last_used)
+    _dbConn = None
+
+  _invocations += 1
+  _check_secs = 0.0
+
+  s = stats()
+
+  if s['cold']:
+    print("**runtime: cold start, init so far", round(s['init_secs'], 4), "secs:",
+          {name: round(secs, 4) for (name, secs) in _init_secs.items()}, "**")
+  else:
+    print("**runtime: warm start, invocation", s['invocation'], ", db connects",
+          s['connects'], "reuses", s['reuses'], "**")
+
+  return s
+
+
+###################################################################
+#
+# stats:
+#
+# Timings and counters of the container.
+#
+def stats():
+  """
+  Returns
+  -------
+  dict
+    cold (the first invocation of the container), invocation
+    (its number), init_secs (seconds spent setting up config,
+    S3 and the database in this invocation, and at import for
+    the first; 0 when warm and all set up already),
+    db_check_secs (seconds spent checking the connection in this
+    invocation), and the counters of the connection pool over
+    the container's life: connects, reuses, expired and dropped
+    (see datatier.ConnectionPool.stats()).
+  """
+
+  cold = _invocations <= 1
+
+  s = {
+    'cold': cold,
+    'invocation': _invocations,
+    'init_secs': sum(_init_secs.values()),
+    'db_check_secs': _check_secs,
+  }
+
+  if _pool is not None:
+    s.update(_pool.stats())
+  else:
+    s.update({'connects': 0, 'reuses': 0, 'expired': 0, 'dropped': 0, 'idle': 0})
+
+  return s
@@ -0,0 +1,342 @@
+#
+# tabular.py
+#
+# Fast path for data that is already text: CSV and TSV exports and
+# plain-text files are tallied directly, without pypdf. The file is
+# parsed as a stream, a block of rows (or a page of text) at a
+# time, so only one block is ever held as text:
+#
+#   .csv, .tsv - every cell, or just the cells of the columns
+#                selected by the job's columns option (header names
+#                or 1-based positions; names need a header row).
+#                A header row is not tallied, nor counted as a row:
+#                with names, the first row is the header; otherwise
+#                the first row is taken for one when csv.Sniffer
+#                finds it to be one, i.e. when its cells differ in
+#                type or length from those of the rows below. A
+#                header of numbers only (e.g. years: "2023,2024")
+#                can't be told from data and is tallied
+#   .txt       - pages separated by form feeds, as pdftotext writes
+#                them, or blocks of lines when the file has none
+#
+# A block is tallied like the text of a PDF page, with the job's
+# tally backend and filters, so the results are the same as for the
+# same numbers in a PDF. Page numbers are only looked for on form
+# feed pages. In the number store the page column holds, for a
+# table, the first row of the block each number was found in.
+#
+# The S3 trigger of proj04_compute must include these suffixes as
+# well as .pdf; results files, which are .txt files too, are then
+# recognized and skipped, see jobclaim.is_results_file().
+#
+
+import io
+import csv
+import time
+
+import tally
+
+
+#
+# extension -> kind
+#
+EXTENSIONS = {
+  '.csv': 'csv',
+  '.tsv': 'tsv',
+  '.txt': 'text',
+}
+
+BLOCK_ROWS = 1000
+BLOCK_LINES = 1000
+
+_DELIMITERS = {
+  'csv': ',',
+  'tsv': '\t',
+}
+
+#
+# how much of a table is looked at to find a header row
+#
+SNIFF_CHARS = 64 * 1024
+
+
+def kind_of(bucketkey):
+  """
+  The kind of a data file, see EXTENSIONS; None for a PDF.
+  """
+
+  for (extension, kind) in EXTENSIONS.items():
+    if bucketkey.lower().endswith(extension):
+      return kind
+
+  return None
+
+
+def unit_of(bucketkey):
+  """
+  What the results of a data file count: "rows" for a table,
+  "pages" otherwise.
+  """
+
+  return "rows" if kind_of(bucketkey) in _DELIMITERS else "pages"
+
+
+def results_key(bucketkey):
+  """
+  Names the results file of an uploaded file: x.txt for x.pdf,
+  x.csv or x.tsv, and x.results.txt for a text file x.txt, see
+  jobclaim.is_results_file().
+  """
+
+  if kind_of(bucketkey) == 'text':
+    return bucketkey[0:-4] + ".results.txt"
+
+  return bucketkey[0:-4] + ".txt"
+
+
+def _open_text(source):
+  #
+  # a byte-order mark is dropped, and undecodable bytes become
+  # U+FFFD rather than failing the job
+  #
+  if isinstance(source, str):
+    return open(source, "r", encoding="utf-8-sig", errors="replace", newline="")
+
+  source.seek(0)
+  return io.TextIOWrapper(source, encoding="utf-8-sig", errors="replace", newline="")
+
+
+def _close_text(source, infile):
+  #
+  # leave an in-memory buffer open, to be released by the caller
+  #
+  if isinstance(source, str):
+    infile.close()
+  else:
+    infile.detach()
+
+
+def _column_indexes(columns, header):
+  indexes = []
+
+  for column in columns:
+    if isinstance(column, int):
+      indexes.append(column - 1)
+    else:
+      names = [name.strip() for name in header]
+      if column not in names:
+        raise Exception("no column '" + column + "' in the header row")
+      indexes.append(names.index(column))
+
+  return indexes
+
+
+class _Sniffer(csv.Sniffer):
+  """
+  A csv.Sniffer for a table whose delimiter is known, from its
+  extension: sniffing it is unreliable, e.g. for a single column.
+  """
+
+  def __init__(self, delimiter):
+    super().__init__()
+    self.dialect = csv.excel_tab if delimiter == '\t' else csv.excel
+
+  def sniff(self, _sample, _delimiters=None):
+    return self.dialect
+
+
+def _has_header(infile, kind):
+  """
+  Whether the first row of a table looks like a header, from the
+  first SNIFF_CHARS characters; the file is rewound.
+  """
+
+  sample = infile.read(SNIFF_CHARS)
+  infile.seek(0)
+
+  #
+  # whole rows only
+  #
+  if len(sample) == SNIFF_CHARS and "\n" in sample:
+    sample = sample[0:sample.rindex("\n") + 1]
+
+  if sample.strip() == "":
+    return False
+
+  try:
+    return _Sniffer(_DELIMITERS[kind]).has_header(sample)
+  except csv.Error:
+    return False
+
+
+def _table_blocks(infile, kind, columns):
+  """
+  Yields (first row, one past the last row, text, False) for
+  each block of data rows of a table, the selected cells one per
+  line; the header row, if any, is skipped.
+  """
+
+  if columns is not None and any(isinstance(column, str) for column in columns):
+    has_header = True
+  else:
+    has_header = _has_header(infile, kind)
+
+  reader = csv.reader(infile, delimiter=_DELIMITERS[kind])
+
+  header = next(reader, []) if has_header else None
+
+  indexes = None
+
+  if columns is not None:
+    indexes = _column_indexes(columns, header)
+
+  block = []
+  first = 0
+  row_number = 0
+
+  for row in reader:
+    if indexes is None:
+      block.extend(row)
+    else:
+      block.extend(row[i] for i in indexes if i < len(row))
+
+    row_number += 1
+
+    if row_number - first == BLOCK_ROWS:
+      yield (first, row_number, "\n".join(block), False)
+      block = []
+      first = row_number
+
+  if row_number > first:
+    yield (first, row_number, "\n".join(block), False)
+
+
+def _text_pages(infile):
+  """
+  Yields (page, page + 1, text, is a form feed page) for each
+  page of a text file. Whether the file is paged is decided by
+  its first page: if BLOCK_LINES lines go by without a form
+  feed, the file is cut into blocks of that many lines instead.
+  """
+
+  page = []
+  paged = None
+  number = 0
+
+  for line in infile:
+    parts = line.split("\f")
+
+    for part in parts[0:-1]:
+      page.append(part)
+      paged = True
+      yield (number, number + 1, "".join(page), True)
+      page = []
+      number += 1
+
+    page.append(parts[-1])
+
+    if paged is not True and len(page) >= BLOCK_LINES:
+      paged = False
+      yield (number, number + 1, "".join(page), False)
+      page = []
+      number += 1
+
+  #
+  # the text after the last form feed is a page only if it
+  # holds something
+  #
+  text = "".join(page)
+  if text.strip() != "" or number == 0:
+    yield (number, number + 1, text, paged is True)
+
+
+###################################################################
+#
+# count_document:
+#
+# Tallies a CSV, TSV or text file.
+#
+def count_document(source, kind, columns=None, backend=tally.DEFAULT_BACKEND, numbers=None,
+                   filters=None, timings=None, page_counts=None):
+  """
+  Parses a data file a block at a time and tallies the
+  significant digits of its numbers.
+
+  Parameters
+  ----------
+  source : str or BytesIO
+    The filename of the file, or a buffer holding it.
+  kind : str
+    "csv", "tsv" or "text", see kind_of().
+  columns : list
+    For a table, the columns to tally: header names, or 1-based
+    positions; None for every column.
+  backend : str
+    The tally backend, see tally.BACKENDS.
+  numbers : numstore.Numbers
+    If given, the numbers found in each block are added to it.
+  filters : dict
+    The job's tally filters, see tally.tally_text().
+  timings : dict
+    If given, the seconds spent parsing and tallying are added
+    to it, as 'extract' and 'tally'.
+  page_counts : list
+    If given, (first row or page, first-digit counts) is
+    appended to it for each block.
+
+  Returns
+  -------
+  tuple
+    (data rows for a table or pages for a text file,
+    histograms)
+  """
+
+  histograms = tally.new_histograms()
+
+  #
+  # page numbers only make sense on the pages of a text file
+  #
+  block_filters = filters
+  if filters is not None and 'skip_page_numbers' in filters:
+    block_filters = {name: value for (name, value) in filters.items() if name != 'skip_page_numbers'}
+    if len(block_filters) == 0:
+      block_filters = None
+
+  infile = _open_text(source)
+
+  extract_secs = 0.0
+  tally_secs = 0.0
+  size = 0
+
+  try:
+    if kind == 'text':
+      blocks = _text_pages(infile)
+    else:
+      blocks = _table_blocks(infile, kind, columns)
+
+    t0 = time.perf_counter()
+
+    for (first, end, text, is_page) in blocks:
+      t1 = time.perf_counter()
+      found = [] if numbers is not None else None
+      before = histograms['first'][:] if page_counts is not None else None
+      tally.tally_text(text, histograms, backend, found, filters if is_page else block_filters)
+      if numbers is not None:
+        numbers.add(first, found)
+      if page_counts is not None:
+        page_counts.append((first, [after - b for (after, b) in zip(histograms['first'], before, strict=True)]))
+      t2 = time.perf_counter()
+
+      extract_secs += t1 - t0
+      tally_secs += t2 - t1
+      t0 = t2
+      size = end
+
+  finally:
+    _close_text(source, infile)
+
+  if timings is not None:
+    timings['extract'] = timings.get('extract', 0.0) + extract_secs
+    timings['tally'] = timings.get('tally', 0.0) + tally_secs
+
+  return size, histograms
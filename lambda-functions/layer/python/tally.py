@@ -0,0 +1,388 @@
+#
+# tally.py
+#
+# Tallies the significant digits of the numeric words in a page of
+# text. A single pass over the words fills every digit test at
+# once, so deeper Benford analysis never needs a second extraction:
+#
+#   "first"     - first significant (non-zero) digit, slots 0-9
+#   "second"    - second significant digit, slots 0-9
+#   "first_two" - first two significant digits, slots 10-99
+#   "last_two"  - last two digits, slots 0-99
+#
+# The second, first-two and last-two tests only count numbers with
+# at least two significant digits. Three backends are provided:
+#
+#   "regex"  - the default; strips punctuation from the whole page
+#              with one translate() call and pulls the significant
+#              digits of each numeric word with a precompiled regex
+#   "python" - the original word-at-a-time loop, kept as the
+#              reference implementation for equivalence checks
+#   "tokens" - the locale-aware tokenizer of tokenizer.py, which
+#              reads "1,234.56", "-0.045" and "4.5e3" as numbers
+#              and respects digit grouping; "tokens-de" etc. select
+#              a locale other than English
+#
+# The regex and python backends produce the same histograms for
+# text whose numeric words are made of ASCII digits, which is what
+# pypdf produces. The reference loop also accepts other Unicode
+# numerics (e.g. '²'), and crashes on most of them in int(); the
+# regex backend ignores them. The tokens backend counts a
+# different (stricter) set of words, so its results differ.
+#
+# A job's options (see joboptions.py) can filter what is tallied:
+# page numbers and dates are removed from the text first, see
+# textfilter.py, and numbers with fewer than min_digits
+# significant digits are not counted.
+#
+
+import string
+import re
+import textfilter
+import tokenizer
+
+from collections import Counter
+
+
+#
+# translation table deleting ASCII punctuation, built once rather
+# than once per word
+#
+_PUNCTUATION = str.maketrans('', '', string.punctuation)
+
+#
+# a whitespace-delimited word made only of digits, capturing its
+# significant digits (leading zeros dropped); all-zero words do
+# not match
+#
+_SIGNIFICANT = re.compile(r'(?<!\S)0*([1-9][0-9]*)(?!\S)')
+
+#
+# the digit tests, and the number of slots in each histogram
+#
+TESTS = {
+  'first': 10,
+  'second': 10,
+  'first_two': 100,
+  'last_two': 100,
+}
+
+BACKENDS = ('regex', 'python', 'tokens')
+DEFAULT_BACKEND = 'regex'
+
+
+###################################################################
+#
+# new_histograms:
+#
+# Empty histograms for every digit test.
+#
+def new_histograms():
+  """
+  Returns a set of empty histograms, one per digit test.
+
+  Returns
+  -------
+  dict
+    Test name -> list of counts, see TESTS.
+  """
+
+  return {name: [0] * size for (name, size) in TESTS.items()}
+
+
+###################################################################
+#
+# merge_histograms:
+#
+# Adds one set of histograms into another.
+#
+def merge_histograms(into, other):
+  """
+  Adds the counts of other into into, slot by slot.
+
+  Parameters
+  ----------
+  into : dict
+    The histograms to add to; modified in place.
+  other : dict
+    The histograms to add.
+
+  Returns
+  -------
+  dict
+    into
+  """
+
+  for (name, counts) in other.items():
+    target = into[name]
+    for i in range(0, len(counts)):
+      target[i] += counts[i]
+
+  return into
+
+
+###################################################################
+#
+# tally_python:
+#
+# Reference backend: the original per-word loop.
+#
+def tally_python(text, histograms, numbers=None, min_digits=1):
+  """
+  Tallies significant digits one word at a time.
+
+  Parameters
+  ----------
+  text : str
+    The text of one page.
+  histograms : dict
+    The histograms to add to; modified in place.
+  numbers : list
+    If given, the significant digits of each number are
+    appended to it.
+  min_digits : int
+    Numbers with fewer significant digits are skipped.
+
+  Returns
+  -------
+  int
+    The number of numeric words tallied.
+  """
+
+  tallied = 0
+
+  for word in text.split():
+    word = word.translate(str.maketrans('', '', string.punctuation))
+    if word.isnumeric():
+      #
+      # skip the leading zeros, and count the significant digits
+      #
+      digits = word.lstrip('0')
+      if digits == '' or len(digits) < min_digits:
+        continue
+
+      histograms['first'][int(digits[0])] += 1
+      tallied += 1
+
+      if numbers is not None:
+        numbers.append(digits)
+
+      if len(digits) > 1:
+        histograms['second'][int(digits[1])] += 1
+        histograms['first_two'][int(digits[0:2])] += 1
+        histograms['last_two'][int(digits[-2:])] += 1
+
+  return tallied
+
+
+###################################################################
+#
+# tally_regex:
+#
+# Fast backend: one translate() and one regex scan per page.
+#
+def tally_regex(text, histograms, numbers=None, min_digits=1):
+  """
+  Tallies significant digits for a whole page at once.
+
+  Parameters
+  ----------
+  text : str
+    The text of one page.
+  histograms : dict
+    The histograms to add to; modified in place.
+  numbers : list
+    If given, the significant digits of each number are
+    appended to it.
+  min_digits : int
+    Numbers with fewer significant digits are skipped.
+
+  Returns
+  -------
+  int
+    The number of numeric words tallied.
+  """
+
+  #
+  # deleting punctuation never touches whitespace, so the words
+  # of the translated page are exactly the translated words
+  #
+  found = _SIGNIFICANT.findall(text.translate(_PUNCTUATION))
+
+  if min_digits > 1:
+    found = [digits for digits in found if len(digits) >= min_digits]
+
+  if numbers is not None:
+    numbers.extend(found)
+
+  return tally_digits(found, histograms)
+
+
+###################################################################
+#
+# tally_digits:
+#
+# Tallies numbers that have already been reduced to their
+# significant digits, e.g. from a number store.
+#
+def tally_digits(numbers, histograms):
+  """
+  Tallies a list of significant-digit strings into every
+  digit test.
+
+  Parameters
+  ----------
+  numbers : list
+    Strings of ASCII digits with no leading zeros.
+  histograms : dict
+    The histograms to add to; modified in place.
+
+  Returns
+  -------
+  int
+    The number of numbers tallied.
+  """
+
+  #
+  # the first two digits ('7' for one-digit numbers) determine
+  # the first, second and first-two tests
+  #
+  leading = Counter([digits[0:2] for digits in numbers])
+  trailing = Counter([digits[-2:] for digits in numbers if len(digits) > 1])
+
+  first = histograms['first']
+  second = histograms['second']
+  first_two = histograms['first_two']
+
+  for (digits, n) in leading.items():
+    first[ord(digits[0]) - 48] += n
+    if len(digits) > 1:
+      second[ord(digits[1]) - 48] += n
+      first_two[int(digits)] += n
+
+  last_two = histograms['last_two']
+
+  for (digits, n) in trailing.items():
+    last_two[int(digits)] += n
+
+  return len(numbers)
+
+
+###################################################################
+#
+# tally_tokens:
+#
+# Locale-aware backend: numbers from the streaming tokenizer.
+#
+def tally_tokens(text, histograms, numbers=None, locale=tokenizer.DEFAULT_LOCALE, min_digits=1):
+  """
+  Tallies the significant digits of each numeric token.
+
+  Parameters
+  ----------
+  text : str
+    The text of one page.
+  histograms : dict
+    The histograms to add to; modified in place.
+  numbers : list
+    If given, the significant digits of each number are
+    appended to it.
+  locale : str
+    The number locale, see tokenizer.LOCALES.
+  min_digits : int
+    Numbers with fewer significant digits are skipped.
+
+  Returns
+  -------
+  int
+    The number of numeric tokens tallied.
+  """
+
+  found = tokenizer.iter_numbers(text, locale)
+
+  if min_digits > 1:
+    found = (digits for digits in found if len(digits) >= min_digits)
+
+  if numbers is not None:
+    found = list(found)
+    numbers.extend(found)
+    return tally_digits(found, histograms)
+
+  #
+  # nothing to keep: count the tokens as they are read, holding
+  # only the distinct numbers of the page
+  #
+  counted = Counter(found)
+
+  first = histograms['first']
+  second = histograms['second']
+  first_two = histograms['first_two']
+  last_two = histograms['last_two']
+
+  for (digits, n) in counted.items():
+    first[ord(digits[0]) - 48] += n
+    if len(digits) > 1:
+      second[ord(digits[1]) - 48] += n
+      first_two[int(digits[0:2])] += n
+      last_two[int(digits[-2:])] += n
+
+  return sum(counted.values())
+
+
+_TALLY_FUNCTIONS = {
+  'regex': tally_regex,
+  'python': tally_python,
+  'tokens': tally_tokens,
+}
+
+
+###################################################################
+#
+# tally_text:
+#
+# Tallies a page of text with the given backend.
+#
+def tally_text(text, histograms, backend=DEFAULT_BACKEND, numbers=None, filters=None):
+  """
+  Tallies the significant digits of each numeric word in the
+  text into every digit test.
+
+  Parameters
+  ----------
+  text : str
+    The text of one page.
+  histograms : dict
+    The histograms to add to, from new_histograms(); modified
+    in place.
+  backend : str
+    One of BACKENDS, or "tokens-<locale>" for the tokens
+    backend in a locale of tokenizer.LOCALES. Defaults to
+    "regex".
+  numbers : list
+    If given, the significant digits of each number are
+    appended to it, see numstore.py.
+  filters : dict
+    If given, the job's filters: min_digits, skip_page_numbers
+    and skip_dates, see joboptions.tally_filters().
+
+  Returns
+  -------
+  int
+    The number of numeric words tallied.
+  """
+
+  min_digits = 1
+
+  if filters is not None:
+    text = textfilter.apply(text, filters)
+    min_digits = filters.get('min_digits', 1)
+
+  if backend in _TALLY_FUNCTIONS:
+    return _TALLY_FUNCTIONS[backend](text, histograms, numbers, min_digits=min_digits)
+
+  (name, _, locale) = str(backend).partition('-')
+
+  if name != 'tokens' or locale not in tokenizer.LOCALES:
+    raise ValueError("unknown tally backend: " + str(backend))
+
+  return tally_tokens(text, histograms, numbers, locale, min_digits)
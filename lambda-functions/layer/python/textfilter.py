@@ -0,0 +1,158 @@
+#
+# textfilter.py
+#
+# Removes numbers that are not amounts from the text of a page
+# before it is tallied, for the skip_page_numbers and skip_dates
+# job options (see joboptions.py):
+#
+#   page numbers - the first or last non-blank line of a page when
+#                  it is just a page number, marked as one:
+#                  "Page 12", "p. 12", "Page 12 of 40", "12 of 40",
+#                  "12/40" or "- 12 -". A bare "12" is kept: from
+#                  one page, it can't be told apart from a figure
+#                  on a line of its own
+#   dates        - numeric dates such as 12/31/2023, 2023-12-31 or
+#                  31.12.23, and dates with an English month name
+#                  such as "March 5, 2024", "5 Mar 2024" or
+#                  "March 2024". A numeric date needs a month of
+#                  1-12 and a day of 1-31 in the order its
+#                  separator is written in (year-month-day, day.
+#                  month.year, or month/day/year and day/month/
+#                  year with / or -) and a two- or four-digit
+#                  year, so 3.14.15 or 12-10-5 are kept
+#
+# Matches are replaced by a space, so the words on either side are
+# never joined.
+#
+
+import re
+
+
+_PAGE_NUMBER = re.compile(
+  r'^\s*(?:'
+  r'(?:page|pg\.?|p\.)\s*[0-9]{1,5}(?:\s*(?:of|/)\s*[0-9]{1,5})?'  # Page 12, Page 12 of 40
+  r'|[0-9]{1,5}\s*(?:of|/)\s*[0-9]{1,5}'                            # 12 of 40, 12/40
+  r'|[\-–—]+\s*[0-9]{1,5}\s*[\-–—]+'                                # - 12 -
+  r')\s*$',
+  re.IGNORECASE)
+
+_MONTH = (r'(?:january|february|march|april|may|june|july|august|september|october|november|december|'
+          r'jan|feb|mar|apr|jun|jul|aug|sept|sep|oct|nov|dec)\b\.?')
+
+_DATES = re.compile(
+  r'(?<![0-9])(?P<a>[0-9]{1,4})(?P<sep>[/.\-])(?P<b>[0-9]{1,2})(?P=sep)(?P<c>[0-9]{1,4})(?![0-9])'  # 12/31/2023
+  r'|\b' + _MONTH + r'\s+(?P<day>[0-9]{1,2})(?:st|nd|rd|th)?(?:,?\s+[0-9]{4})?(?![0-9])'         # March 5, 2024
+  r'|(?<![0-9])(?P<day2>[0-9]{1,2})(?:st|nd|rd|th)?\s+' + _MONTH + r'(?:,?\s+[0-9]{4})?(?![0-9])'  # 5 March 2024
+  r'|\b' + _MONTH + r',?\s+[0-9]{4}(?![0-9])',                                                    # March 2024
+  re.IGNORECASE)
+
+
+def _is_date(match):
+  if match.group('sep') is None:
+    day = match.group('day') or match.group('day2')
+    return day is None or 1 <= int(day) <= 31
+
+  (a, b, c) = match.group('a', 'b', 'c')
+
+  if len(a) == 4:  # year-month-day
+    return len(c) <= 2 and 1 <= int(b) <= 12 and 1 <= int(c) <= 31
+
+  if len(a) > 2 or len(c) not in (2, 4):
+    return False
+
+  day_month = 1 <= int(a) <= 31 and 1 <= int(b) <= 12
+  month_day = 1 <= int(a) <= 12 and 1 <= int(b) <= 31
+
+  if match.group('sep') == '.':
+    return day_month
+
+  return day_month or month_day
+
+
+###################################################################
+#
+# strip_page_numbers:
+#
+# Drops a page number heading or footing a page.
+#
+def strip_page_numbers(text):
+  """
+  Removes the first and last non-blank lines of a page's text
+  when they hold nothing but a page number, marked as one.
+
+  Parameters
+  ----------
+  text : str
+    The text of one page.
+
+  Returns
+  -------
+  str
+    The text without its page numbers.
+  """
+
+  lines = text.split("\n")
+
+  content = [i for i in range(0, len(lines)) if lines[i].strip() != ""]
+
+  for i in content[0:1] + content[-1:]:
+    if _PAGE_NUMBER.match(lines[i]):
+      lines[i] = ""
+
+  return "\n".join(lines)
+
+
+###################################################################
+#
+# strip_dates:
+#
+# Drops the dates in a page of text.
+#
+def strip_dates(text):
+  """
+  Removes dates from a page's text.
+
+  Parameters
+  ----------
+  text : str
+    The text of one page.
+
+  Returns
+  -------
+  str
+    The text with each date replaced by a space.
+  """
+
+  return _DATES.sub(lambda match: " " if _is_date(match) else match.group(0), text)
+
+
+###################################################################
+#
+# apply:
+#
+# Applies the text filters of a job.
+#
+def apply(text, filters):
+  """
+  Removes what the filters ask for from a page's text.
+
+  Parameters
+  ----------
+  text : str
+    The text of one page.
+  filters : dict
+    The job's tally filters, see joboptions.tally_filters().
+
+  Returns
+  -------
+  str
+    The filtered text.
+  """
+
+  if filters.get('skip_page_numbers', False):
+    text = strip_page_numbers(text)
+
+  if filters.get('skip_dates', False):
+    text = strip_dates(text)
+
+  return text
@@ -0,0 +1,108 @@
+#
+# tokenizer.py
+#
+# Streaming, locale-aware numeric tokenizer for the tally. Numbers
+# are found with a single regex scan of the page text, yielded one
+# at a time, so no per-page word list is built. A numeric token is
+# a whitespace-delimited word of the form
+#
+#   [brackets, quotes] [sign] [currency] body [exponent] [%, brackets, punctuation]
+#
+# e.g. "1,234.56", "-0.045", "4.5e3", "($1,234)", "12.5%", "€3,50"
+# (in a decimal-comma locale). The body must group its digits the
+# way the locale does, so "1,2,3" is not read as 123 in English.
+# Only ASCII digits are accepted: '½' and '²' are not numbers.
+#
+# Each token is reduced to its significant digits: separators,
+# sign and exponent dropped, and leading zeros removed, so
+# "-0.045" gives "45" and "4.5e3" gives "45". Zero is skipped.
+#
+
+import re
+
+
+#
+# locale -> (thousands separators, decimal separator); French
+# groups with no-break spaces, as ordinary spaces also separate
+# numbers
+#
+LOCALES = {
+  'en': (",", "."),
+  'de': (".", ","),
+  'fr': ("\u00a0\u202f", ","),
+  'ch': ("'\u2019", "."),
+}
+
+DEFAULT_LOCALE = 'en'
+
+_OPENERS = r"""[(\[{"'“‘]*"""
+_CLOSERS = r"""[)\]}"'”’%‰.,;:!?*]*"""
+_CURRENCY = r"[$€£¥₹]?"
+_EXPONENT = r"(?:[eE][+-]?[0-9]+)?"
+
+
+def _pattern(locale):
+  """
+  Compiles the token regex for a locale.
+  """
+
+  (groups, decimal) = LOCALES[locale]
+  group = "[" + re.escape(groups) + "]"
+  decimal = re.escape(decimal)
+
+  body = (r"(?:[0-9]{1,3}(?:" + group + r"[0-9]{3})+|[0-9]+)(?:" + decimal + r"[0-9]+)?" +
+          r"|" + decimal + r"[0-9]+")
+
+  return re.compile(r"(?<!\S)" + _OPENERS + r"[-+−]?" + _CURRENCY +
+                    r"(" + body + r")" + _EXPONENT + _CLOSERS + r"(?!\S)")
+
+
+_PATTERNS = {}
+
+#
+# deletes everything but the digits from a token body
+#
+_SEPARATORS = {ord(c): None for c in "".join(g + d for (g, d) in LOCALES.values())}
+
+
+def pattern_for(locale=DEFAULT_LOCALE):
+  """
+  The compiled token regex for a locale, see LOCALES.
+  """
+
+  if locale not in _PATTERNS:
+    if locale not in LOCALES:
+      raise ValueError("unknown number locale: " + str(locale))
+    _PATTERNS[locale] = _pattern(locale)
+
+  return _PATTERNS[locale]
+
+
+###################################################################
+#
+# iter_numbers:
+#
+# Lazily yields the significant digits of each numeric token.
+#
+def iter_numbers(text, locale=DEFAULT_LOCALE):
+  """
+  Scans text for numeric tokens.
+
+  Parameters
+  ----------
+  text : str
+    The text of one page.
+  locale : str
+    How digits are grouped and decimals marked, see LOCALES.
+    Defaults to "en".
+
+  Yields
+  ------
+  str
+    The significant digits of each non-zero number, in order.
+  """
+
+  for m in pattern_for(locale).finditer(text):
+    digits = m.group(1).translate(_SEPARATORS).lstrip('0')
+    if digits != '':
+      yield digits
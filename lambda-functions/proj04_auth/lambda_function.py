@@ -1,33 +1,22 @@
 import json
-import os
 import datatier
+import runtime
 import auth
 import api_utils
 
-from configparser import ConfigParser
+#
+# config.ini and the database connection are set up once per
+# container, on first use, and reused by warm invocations, see
+# runtime.py
+#
+runtime.init()
 
 def lambda_handler(event, context):
   try:
     print("**STARTING**")
     print("**lambda: proj04_auth**")
 
-    #
-    # setup AWS based on config file
-    #
-    config_file = 'config.ini'
-    os.environ['AWS_SHARED_CREDENTIALS_FILE'] = config_file
-    
-    configur = ConfigParser()
-    configur.read(config_file)
-    
-    #
-    # configure for RDS access
-    #
-    rds_endpoint = configur.get('rds', 'endpoint')
-    rds_portnum = int(configur.get('rds', 'port_number'))
-    rds_username = configur.get('rds', 'user_name')
-    rds_pwd = configur.get('rds', 'user_pwd')
-    rds_dbname = configur.get('rds', 'db_name')
+    runtime.start_invocation()
 
     #
     # read the username and password from the event body
@@ -50,7 +39,7 @@ def lambda_handler(event, context):
     #
     print("**Opening connection**")
     
-    dbConn = datatier.get_dbConn(rds_endpoint, rds_portnum, rds_username, rds_pwd, rds_dbname)
+    dbConn = runtime.db_conn()
 
     #
     # TODO: YOUR CODE HERE
@@ -0,0 +1,190 @@
+#
+# batch.py
+#
+# Batched S3 events for proj04_compute. S3 (or a batching trigger
+# such as SQS) can deliver several uploaded objects in one event;
+# each record is processed as a job of its own, several at a time
+# on a small thread pool, and the outcome of each is reported.
+#
+# The records share one database connection. A pymysql connection
+# is not thread-safe, so it is wrapped such that only one thread
+# at a time holds an open cursor on it: datatier opens a cursor
+# per query, and closes it once the query has been committed or
+# rolled back.
+#
+
+import json
+import threading
+import urllib.parse
+import concurrent.futures
+
+
+class _SharedCursor:
+  """
+  A cursor holding its connection's lock until closed.
+  """
+
+  def __init__(self, cursor, lock):
+    self._cursor = cursor
+    self._lock = lock
+
+  def __getattr__(self, name):
+    return getattr(self._cursor, name)
+
+  def __iter__(self):
+    return iter(self._cursor)
+
+  def close(self):
+    try:
+      self._cursor.close()
+    finally:
+      self._lock.release()
+
+
+class SharedConnection:
+  """
+  A database connection that can be shared across threads; each
+  cursor has the connection to itself until it is closed.
+
+  dbConn - the connection, or a Future of one still being opened
+           (see pipeline.start), waited for on first use
+  """
+
+  def __init__(self, dbConn):
+    self._dbConn = dbConn
+    self._lock = threading.RLock()
+
+  def _connection(self):
+    if isinstance(self._dbConn, concurrent.futures.Future):
+      self._dbConn = self._dbConn.result()
+    return self._dbConn
+
+  def __getattr__(self, name):
+    return getattr(self._connection(), name)
+
+  def cursor(self, *args, **kwargs):
+    self._lock.acquire()
+    try:
+      return _SharedCursor(self._connection().cursor(*args, **kwargs), self._lock)
+    except Exception:
+      self._lock.release()
+      raise
+
+
+###################################################################
+#
+# record_events:
+#
+# Splits a batched S3 event into one event per record.
+#
+def record_events(event):
+  """
+  Splits an S3 event into single-record events, each carrying
+  the other entries of the event (e.g. a checkpoint to resume
+  from).
+
+  Parameters
+  ----------
+  event : dict
+    The S3 event.
+
+  Returns
+  -------
+  list
+    One event per record, in order.
+  """
+
+  if len(event.get('Records', [])) == 0:
+    raise Exception("event has no S3 records")
+
+  return [dict(event, Records=[record]) for record in event['Records']]
+
+
+def bucketkey_of(event):
+  """
+  The (unquoted) bucket key of a single-record event.
+  """
+
+  return urllib.parse.unquote_plus(event['Records'][0]['s3']['object']['key'], encoding='utf-8')
+
+
+###################################################################
+#
+# run_records:
+#
+# Runs a handler over each record event, up to max_concurrency at
+# a time.
+#
+def run_records(handler, events, max_concurrency):
+  """
+  Runs handler(event, slot) for each event, where slot is the
+  index of the event, on a thread pool.
+
+  Parameters
+  ----------
+  handler : function
+    Processes one single-record event and returns its response;
+    it should catch its own errors.
+  events : list
+    The single-record events, see record_events().
+  max_concurrency : int
+    The most records to process at the same time.
+
+  Returns
+  -------
+  list
+    The responses, in the order of the events.
+  """
+
+  if len(events) == 1 or max_concurrency <= 1:
+    return [handler(event, slot) for (slot, event) in enumerate(events)]
+
+  with concurrent.futures.ThreadPoolExecutor(max_workers=min(max_concurrency, len(events))) as pool:
+    return list(pool.map(handler, events, range(len(events))))
+
+
+###################################################################
+#
+# summarize:
+#
+# Combines the responses of a batch into one response.
+#
+def summarize(events, responses):
+  """
+  Combines per-record responses: the batch succeeds (status
+  code 200) if every record completed or was checkpointed, and
+  fails (500) otherwise. The body lists the outcome of each
+  record.
+
+  Parameters
+  ----------
+  events : list
+    The single-record events.
+  responses : list
+    Their responses, in the same order.
+
+  Returns
+  -------
+  dict
+    The response for the whole event.
+  """
+
+  outcomes = []
+
+  for (event, response) in zip(events, responses, strict=True):
+    outcomes.append({
+      'bucketkey': bucketkey_of(event),
+      'statusCode': response['statusCode'],
+      'body': json.loads(response['body'])
+    })
+
+  failed = [outcome for outcome in outcomes if outcome['statusCode'] not in (200, 202)]
+
+  print("**BATCH DONE,", len(outcomes) - len(failed), "of", len(outcomes), "records succeeded**")
+  for outcome in failed:
+    print("  failed:", outcome['bucketkey'], "-", outcome['body'])
+
+  return {
+    'statusCode': 500 if len(failed) > 0 else 200,
+    'body': json.dumps(outcomes)
+  }
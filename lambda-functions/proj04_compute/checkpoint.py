@@ -0,0 +1,209 @@
+#
+# checkpoint.py
+#
+# Checkpoints for resumable extraction of very large PDFs. When
+# proj04_compute runs low on time, it saves the histograms so far
+# and the next page to process as a small JSON object next to the
+# PDF in S3, then re-invokes itself asynchronously with the same
+# event plus the checkpoint's key. The next invocation loads the
+# checkpoint and carries on from that page.
+#
+
+import json
+import time
+import tally
+
+
+###################################################################
+#
+# checkpoint_key:
+#
+# The bucket key of the checkpoint for a PDF.
+#
+def checkpoint_key(bucketkey):
+  """
+  Returns the bucket key of the checkpoint for a PDF.
+
+  Parameters
+  ----------
+  bucketkey : str
+    The bucket key of the PDF.
+
+  Returns
+  -------
+  str
+    The bucket key of its checkpoint.
+  """
+
+  return bucketkey[0:-4] + ".checkpoint.json"
+
+
+###################################################################
+#
+# new_state:
+#
+# The state of an extraction that has not started yet.
+#
+def new_state():
+  """
+  Returns the checkpoint state for a fresh extraction.
+
+  Returns
+  -------
+  dict
+    next_page, histograms, invocations, and the time spent
+    saving and loading checkpoints so far.
+  """
+
+  return {
+    'next_page': 0,
+    'histograms': tally.new_histograms(),
+    'invocations': 1,
+    'checkpoints': 0,
+    'checkpoint_secs': 0.0,
+  }
+
+
+###################################################################
+#
+# load:
+#
+# Reads a checkpoint from S3.
+#
+def load(bucket, key):
+  """
+  Loads a checkpoint saved by save().
+
+  Parameters
+  ----------
+  bucket : s3.Bucket
+    The bucket holding the checkpoint.
+  key : str
+    The bucket key of the checkpoint.
+
+  Returns
+  -------
+  dict
+    The checkpoint state, with invocations incremented.
+  """
+
+  t0 = time.perf_counter()
+
+  body = bucket.Object(key).get()['Body']
+  state = json.loads(body.read())
+  body.close()
+
+  state['invocations'] += 1
+  state['checkpoint_secs'] += time.perf_counter() - t0
+
+  print("**Resuming from checkpoint at page", state['next_page'], "**")
+
+  return state
+
+
+###################################################################
+#
+# save:
+#
+# Writes a checkpoint to S3.
+#
+def save(bucket, key, state):
+  """
+  Saves a checkpoint.
+
+  Parameters
+  ----------
+  bucket : s3.Bucket
+    The bucket to write to.
+  key : str
+    The bucket key of the checkpoint.
+  state : dict
+    The checkpoint state; its overhead counters are updated.
+  """
+
+  t0 = time.perf_counter()
+
+  state['checkpoints'] += 1
+
+  bucket.put_object(Key=key,
+                    Body=json.dumps(state).encode('utf-8'),
+                    ContentType='application/json')
+
+  state['checkpoint_secs'] += time.perf_counter() - t0
+
+  print("**Saved checkpoint at page", state['next_page'], "**")
+
+
+###################################################################
+#
+# clear:
+#
+# Deletes a checkpoint once the extraction has finished.
+#
+def clear(bucket, key):
+  """
+  Deletes a checkpoint.
+
+  Parameters
+  ----------
+  bucket : s3.Bucket
+    The bucket holding the checkpoint.
+  key : str
+    The bucket key of the checkpoint.
+  """
+
+  bucket.Object(key).delete()
+
+
+###################################################################
+#
+# requeue:
+#
+# Re-invokes this lambda function asynchronously to resume from a
+# checkpoint.
+#
+def requeue(context, event, key):
+  """
+  Asynchronously invokes the running function again with the
+  same event, plus the key of the checkpoint to resume from.
+
+  Parameters
+  ----------
+  context : LambdaContext
+    The context of the current invocation.
+  event : dict
+    The event of the current invocation.
+  key : str
+    The bucket key of the checkpoint.
+  """
+
+  resume_event = dict(event)
+  resume_event['checkpoint'] = key
+
+  import boto3
+
+  client = boto3.client('lambda')
+
+  client.invoke(FunctionName=context.invoked_function_arn,
+                InvocationType='Event',
+                Payload=json.dumps(resume_event).encode('utf-8'))
+
+  print("**Requeued", context.function_name, "to resume from", key, "**")
+
+
+###################################################################
+#
+# time_left_fn:
+#
+# Adapts the lambda context into a function returning seconds left.
+#
+def time_left_fn(context):
+  """
+  Returns a function giving the seconds left in this
+  invocation, or None when not running inside Lambda.
+  """
+
+  if context is None or not hasattr(context, 'get_remaining_time_in_millis'):
+    return None
+
+  return lambda: context.get_remaining_time_in_millis() / 1000.0
@@ -0,0 +1,298 @@
+#
+# fanout.py
+#
+# Map-reduce fan-out of one large PDF across several invocations
+# of proj04_compute. The coordinating invocation splits the page
+# range into shards and dispatches each shard to a worker
+# invocation through an executor; each worker tallies its pages
+# and returns its digit histograms, and the coordinator reduces
+# (sums) them into the histograms for the whole document.
+#
+# Two executors are provided:
+#
+#   LambdaExecutor - invokes this function synchronously, once per
+#                    shard, from a small thread pool
+#   LocalExecutor  - an in-process stand-in that runs the shards
+#                    in a local process pool, for benchmarking
+#
+
+import json
+import concurrent.futures
+
+import extraction
+import joboptions
+import tally
+
+
+###################################################################
+#
+# plan_shards:
+#
+# Splits a document into shards of about shard_pages pages, using
+# at most max_shards shards.
+#
+def plan_shards(number_of_pages, shard_pages, max_shards):
+  """
+  Splits the pages of a document into shards.
+
+  Parameters
+  ----------
+  number_of_pages : int
+    The number of pages in the document.
+  shard_pages : int
+    The target number of pages per shard.
+  max_shards : int
+    The largest number of shards to produce.
+
+  Returns
+  -------
+  list
+    A list of (start, end) tuples, end exclusive.
+  """
+
+  num_shards = -(-number_of_pages // max(1, shard_pages))  # ceiling
+  num_shards = max(1, min(num_shards, max_shards))
+
+  return extraction.split_pages(number_of_pages, num_shards)
+
+
+###################################################################
+#
+# shard_event:
+#
+# The event sent to a worker invocation for one shard.
+#
+def shard_event(bucketkey, number_of_pages, start, end, backend=tally.DEFAULT_BACKEND,
+                numbers=False, extractor=extraction.DEFAULT_EXTRACTOR, options=None,
+                page_matrix=False):
+  """
+  Builds the event for a shard worker invocation.
+
+  Parameters
+  ----------
+  bucketkey : str
+    The bucket key of the PDF.
+  number_of_pages : int
+    The number of pages in the whole document, or of the pages
+    selected by the job's options.
+  start : int
+    The first page of the shard, counting selected pages only.
+  end : int
+    One past the last page of the shard.
+  backend : str
+    The tally backend, see tally.BACKENDS.
+  numbers : bool
+    Whether the shard should write its part of the number
+    store, see numstore.py.
+  extractor : str
+    The text extractor, see extraction.EXTRACTORS.
+  options : dict
+    The job's options: its page selection and tally filters,
+    see joboptions.py.
+  page_matrix : bool
+    Whether the shard should write its part of the page matrix,
+    see pagematrix.py.
+
+  Returns
+  -------
+  dict
+    The event.
+  """
+
+  return {
+    'shard': {
+      'bucketkey': bucketkey,
+      'number_of_pages': number_of_pages,
+      'start': start,
+      'end': end,
+      'backend': backend,
+      'numbers': numbers,
+      'extractor': extractor,
+      'options': options if options is not None else {},
+      'page_matrix': page_matrix,
+    }
+  }
+
+
+###################################################################
+#
+# run_shard:
+#
+# Worker side: tallies the pages of one shard.
+#
+def run_shard(source, shard, workers=0, serial_threshold=16, numbers=None, memory=None,
+              page_counts=None):
+  """
+  Extracts and tallies the pages of one shard.
+
+  Parameters
+  ----------
+  source : str or file-like
+    The PDF filename, or a binary stream of the PDF.
+  shard : dict
+    The 'shard' entry of a shard event.
+  workers : int
+    The number of worker processes within this invocation.
+  serial_threshold : int
+    Shards with fewer pages than this are processed serially.
+  numbers : numstore.Numbers
+    If given, the numbers found on each page are added to it.
+  memory : memguard.MemoryGuard
+    If given, keeps memory bounded.
+  page_counts : list
+    If given, (page number, first-digit counts) is appended to
+    it for each page.
+
+  Returns
+  -------
+  dict
+    The digit histograms for the shard.
+  """
+
+  from pypdf import PdfReader
+
+  reader = PdfReader(source)
+
+  options = shard.get('options', {})
+  selected = joboptions.select_pages(options, len(reader.pages))
+
+  return extraction.extract_pages(source, reader, selected[shard['start']:shard['end']],
+                                  workers=workers,
+                                  serial_threshold=serial_threshold,
+                                  backend=shard['backend'],
+                                  numbers=numbers,
+                                  extractor=shard.get('extractor', extraction.DEFAULT_EXTRACTOR),
+                                  memory=memory,
+                                  page_counts=page_counts,
+                                  filters=joboptions.tally_filters(options))
+
+
+###################################################################
+#
+# reduce_histograms:
+#
+# Sums the histograms returned by the shards.
+#
+def reduce_histograms(results):
+  """
+  Merges shard histograms.
+
+  Parameters
+  ----------
+  results : list
+    A list of digit histograms.
+
+  Returns
+  -------
+  dict
+    The summed digit histograms.
+  """
+
+  histograms = tally.new_histograms()
+
+  for result in results:
+    tally.merge_histograms(histograms, result)
+
+  return histograms
+
+
+class LambdaExecutor:
+  """
+  Runs shard events by synchronously invoking a lambda function,
+  up to max_concurrency at a time.
+  """
+
+  def __init__(self, function_name, max_concurrency=10):
+    self.function_name = function_name
+    self.max_concurrency = max_concurrency
+    import boto3
+
+    self.client = boto3.client('lambda')
+
+  def _invoke(self, event):
+    response = self.client.invoke(FunctionName=self.function_name,
+                                  InvocationType='RequestResponse',
+                                  Payload=json.dumps(event).encode('utf-8'))
+
+    payload = json.loads(response['Payload'].read())
+
+    if 'FunctionError' in response or payload.get('statusCode') != 200:
+      raise Exception("shard " + str(event['shard']['start']) + "-" +
+                      str(event['shard']['end'] - 1) + " failed: " + str(payload))
+
+    return json.loads(payload['body'])['histograms']
+
+  def map(self, events):
+    with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+      return list(pool.map(self._invoke, events))
+
+
+class LocalExecutor:
+  """
+  In-process stand-in for LambdaExecutor: runs shard events
+  against a local copy of the PDF in a process pool.
+  """
+
+  def __init__(self, source, max_concurrency=None):
+    self.source = source
+    self.max_concurrency = max_concurrency
+
+  def map(self, events):
+    shards = [event['shard'] for event in events]
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=self.max_concurrency) as pool:
+      return list(pool.map(run_shard, [self.source] * len(shards), shards, [1] * len(shards)))
+
+
+###################################################################
+#
+# fan_out:
+#
+# Coordinator side: dispatches the shards and reduces the results.
+#
+def fan_out(executor, bucketkey, number_of_pages, shard_pages, max_shards,
+            backend=tally.DEFAULT_BACKEND, numbers=False,
+            extractor=extraction.DEFAULT_EXTRACTOR, options=None, page_matrix=False):
+  """
+  Tallies a document by fanning its shards out to an executor.
+
+  Parameters
+  ----------
+  executor : LambdaExecutor or LocalExecutor
+    Runs the shard events.
+  bucketkey : str
+    The bucket key of the PDF.
+  number_of_pages : int
+    The number of pages in the document, or of the pages
+    selected by the job's options.
+  shard_pages : int
+    The target number of pages per shard.
+  max_shards : int
+    The largest number of shards to dispatch.
+  backend : str
+    The tally backend, see tally.BACKENDS.
+  numbers : bool
+    Whether each shard should write its part of the number
+    store.
+  extractor : str
+    The text extractor, see extraction.EXTRACTORS.
+  options : dict
+    The job's options, see shard_event().
+  page_matrix : bool
+    Whether each shard should write its part of the page matrix.
+
+  Returns
+  -------
+  dict
+    The digit histograms for the whole document.
+  """
+
+  shards = plan_shards(number_of_pages, shard_pages, max_shards)
+
+  print("**Fanning out", number_of_pages, "pages as", len(shards), "shards**")
+
+  events = [shard_event(bucketkey, number_of_pages, start, end, backend, numbers, extractor, options,
+                        page_matrix)
+            for (start, end) in shards]
+
+  return reduce_histograms(executor.map(events))
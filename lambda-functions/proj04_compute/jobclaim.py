@@ -0,0 +1,204 @@
+#
+# jobclaim.py
+#
+# Guards proj04_compute against duplicate S3 notifications. S3
+# delivers events at least once, so the same upload can trigger
+# the function more than once. Before doing any work, an
+# invocation claims the job by moving its jobs row from pending
+# to processing with a conditional UPDATE; the database applies
+# it to at most one invocation, and every other invocation for
+# that upload (concurrent, or after the job has completed or
+# failed) skips it.
+#
+# A claim is a lease: the time it was taken is kept in the jobs
+# row, and a job still processing once its lease has expired is
+# taken over by the next invocation for it. An invocation that
+# timed out or crashed after claiming never marks its job failed,
+# so without the lease Lambda's retries of the event would be
+# skipped as duplicates and the job would never finish. The lease
+# must outlast an invocation; a job checkpointed across several
+# invocations renews it with each.
+#
+# Skipped events are counted in the cachestats table under
+# 'duplicates' (see benfordapp-database.sql), except the event of
+# an upload that proj04_upload has already computed inline (see
+# proj04_upload/inline.py), which is expected rather than a
+# duplicate.
+#
+
+import datatier
+
+#
+# what claim() returns when it took over an expired lease: true,
+# like a plain claim, but the invocation that died may have left
+# output behind (parts of a number store or page matrix) which
+# must be cleared before the job is computed again
+#
+TAKEN_OVER = "taken over"
+
+
+###################################################################
+#
+# claim:
+#
+# Atomically moves a job from pending to processing, or takes over
+# a processing job whose lease has expired.
+#
+def claim(dbConn, datafilekey, lease_secs):
+  """
+  Claims the job of an uploaded PDF for this invocation.
+
+  Parameters
+  ----------
+  dbConn : the database connection
+  datafilekey : str
+    The bucket key of the PDF.
+  lease_secs : int
+    How long a claim lasts: a job claimed longer ago than this,
+    and still processing, is taken over.
+
+  Returns
+  -------
+  bool or str
+    True if this invocation now owns the job (TAKEN_OVER if it
+    took the job over from an expired lease), False if the job
+    is not pending (claimed and the lease still held, completed
+    or failed); the event is then counted as a duplicate, unless
+    the job was computed inline.
+  """
+
+  sql = """
+    UPDATE jobs
+    SET status = 'processing', claimedat = NOW()
+    WHERE datafilekey = %s AND status = 'pending';
+  """
+
+  modified = datatier.perform_action(dbConn, sql, [datafilekey])
+
+  if modified > 0:
+    return True
+
+  #
+  # the invocation holding the job may have died: take it over
+  # once its lease has expired
+  #
+  sql = """
+    UPDATE jobs
+    SET claimedat = NOW()
+    WHERE datafilekey = %s AND status = 'processing'
+      AND claimedat < NOW() - INTERVAL %s SECOND;
+  """
+
+  modified = datatier.perform_action(dbConn, sql, [datafilekey, lease_secs])
+
+  if modified > 0:
+    print("**Lease on job expired, taking it over**")
+    return TAKEN_OVER
+
+  #
+  # not pending: a duplicate, unless there's no job at all
+  #
+  sql = "SELECT status, computedinline FROM jobs WHERE datafilekey = %s;"
+
+  row = datatier.retrieve_one_row(dbConn, sql, [datafilekey])
+
+  if row == ():
+    raise Exception("no jobs record for '" + datafilekey + "'")
+
+  (status, computedinline) = row
+
+  if computedinline:
+    print("**Job already computed inline**")
+    return False
+
+  print("**Job already", status, "**")
+
+  count_duplicate(dbConn)
+
+  return False
+
+
+###################################################################
+#
+# renew:
+#
+# Extends the lease of a claimed job.
+#
+def renew(dbConn, datafilekey):
+  """
+  Renews the claim on a job, for an invocation resuming it from
+  a checkpoint.
+
+  Parameters
+  ----------
+  dbConn : the database connection
+  datafilekey : str
+    The bucket key of the PDF.
+  """
+
+  sql = """
+    UPDATE jobs
+    SET claimedat = NOW()
+    WHERE datafilekey = %s AND status = 'processing';
+  """
+
+  datatier.perform_action(dbConn, sql, [datafilekey])
+
+
+###################################################################
+#
+# count_duplicate:
+#
+# Counts an event skipped because its job was already claimed.
+#
+def count_duplicate(dbConn):
+  """
+  Bumps the count of skipped duplicate events.
+
+  Parameters
+  ----------
+  dbConn : the database connection
+  """
+
+  sql = "UPDATE cachestats SET value = value + 1 WHERE name = 'duplicates';"
+
+  datatier.perform_action(dbConn, sql)
+
+
+###################################################################
+#
+# is_results_file:
+#
+# Whether a text file dropped into the bucket is the results file
+# of a job rather than a document to analyze.
+#
+def is_results_file(bucketkey, dbConn):
+  """
+  Recognizes results files, which are written next to the files
+  they analyze: x.txt for x.pdf, x.csv or x.tsv, and x.results.txt
+  for an uploaded text file x.txt. Uploaded files have unique
+  names, so a text file is a results file if a job's file has the
+  same name with another extension.
+
+  Parameters
+  ----------
+  bucketkey : str
+    The bucket key of a .txt file.
+  dbConn : the database connection
+
+  Returns
+  -------
+  bool
+    True if the file holds results.
+  """
+
+  if bucketkey.endswith(".results.txt"):
+    return True
+
+  base = bucketkey[0:-4]
+
+  sql = "SELECT COUNT(*) FROM jobs WHERE datafilekey IN (%s, %s, %s);"
+
+  row = datatier.retrieve_one_row(dbConn, sql, [base + ".pdf", base + ".csv", base + ".tsv"])
+
+  return row != () and row[0] > 0
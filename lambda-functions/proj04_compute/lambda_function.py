@@ -5,142 +5,211 @@
 # value, and save the results to a text file. This will
 # allow checking to see if the results follow Benford's Law,
 # a common method for detecting fraud in numeric data.
+# The second-digit, first-two and last-two digit tests are
+# tallied in the same pass, see tally.py and benford.py.
 #
 # https://en.wikipedia.org/wiki/Benford%27s_law
 # https://chance.amstat.org/2021/04/benfords-law/
 #
 
 import json
-import boto3
 import os
 import pathlib
+import batch
+import benford
 import datatier
-import urllib.parse
-import string
+import checkpoint
+import extraction
+import fanout
+import jobclaim
+import joboptions
+import memguard
+import numstore
+import pagematrix
+import pipeline
+import resultcache
+import runtime
+import s3io
+import sampling
+import tabular
+import tally
+import types
 
-from configparser import ConfigParser
-from pypdf import PdfReader
+from metrics import JobMetrics
+
+
+#
+# config.ini, the bucket and the database connection are set up
+# once per container, and reused by warm invocations, see
+# runtime.py; every event needs S3, so they are opened now, at
+# the cold start
+#
+runtime.init(s3_profile='s3readwrite', eager=True)
+
+
+###################################################################
+#
+# handle_shard:
+#
+# Tallies one shard of a fanned-out PDF, see fanout.py.
+#
+def handle_shard(shard, bucket, spill_threshold, workers, serial_threshold, memory):
+  """
+  Handles a shard event sent by a coordinating invocation.
+
+  Parameters
+  ----------
+  shard : dict
+    The 'shard' entry of the event.
+  bucket : s3.Bucket
+    The bucket holding the PDF.
+  spill_threshold : int
+    The largest PDF, in bytes, to keep in memory.
+  workers : int
+    The number of worker processes to use.
+  serial_threshold : int
+    Shards with fewer pages than this are processed serially.
+  memory : memguard.MemoryGuard
+    Keeps page processing within the memory ceiling.
+
+  Returns
+  -------
+  dict
+    A response whose body holds the shard's digit histograms.
+  """
 
-def lambda_handler(event, context):
   try:
-    print("**STARTING**")
-    print("**lambda: proj04_compute**")
-    
-    # 
-    # in case we get an exception, set this to a default
-    # filename so we can write an error message if need
-    # be
-    #
-    local_results_file = "/tmp/results.txt"
-    bucketkey_results_file = ""
-    
-    #
-    # setup AWS based on config file
-    #
-    config_file = 'config.ini'
-    os.environ['AWS_SHARED_CREDENTIALS_FILE'] = config_file
-    
-    configur = ConfigParser()
-    configur.read(config_file)
-    
-    #
-    # configure for S3 access
-    #
-    s3_profile = 's3readwrite'
-    boto3.setup_default_session(profile_name=s3_profile)
-    
-    bucketname = configur.get('s3', 'bucket_name')
-    
-    s3 = boto3.resource('s3')
-    bucket = s3.Bucket(bucketname)
-    
-    #
-    # configure for RDS access
-    #
-    rds_endpoint = configur.get('rds', 'endpoint')
-    rds_portnum = int(configur.get('rds', 'port_number'))
-    rds_username = configur.get('rds', 'user_name')
-    rds_pwd = configur.get('rds', 'user_pwd')
-    rds_dbname = configur.get('rds', 'db_name')
-    
-    #
-    # this function is event-driven by a PDF being
-    # dropped into S3. The bucket key is sent to 
-    # us and obtain as follows
-    #
-    bucketkey = urllib.parse.unquote_plus(event['Records'][0]['s3']['object']['key'], encoding='utf-8')
-    
-    print("bucketkey:", bucketkey)
-      
-    extension = pathlib.Path(bucketkey).suffix
-    
-    if extension != ".pdf" : 
-      raise Exception("expecting S3 document to have .pdf extension")
-    
-    bucketkey_results_file = bucketkey[0:-4] + ".txt"
-    
-    print("bucketkey results file:", bucketkey_results_file)
-    print("local results file:", local_results_file)
-      
-    #
-    # download PDF from S3
-    #
-    print("**DOWNLOADING '", bucketkey, "'**")
-    
-    local_pdf = "/tmp/data.pdf"
-    
-    bucket.download_file(bucketkey, local_pdf)
-    
-    #
-    # open pdf file
-    #
-    print("**PROCESSING '", local_pdf, "'**")
-    
-    reader = PdfReader(local_pdf)
-    number_of_pages = len(reader.pages)
-    
-    #
-    # for each page, extract text, split into words,
-    # and see which words are numeric values
-    #
-    counts = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-    
-    for i in range(0, number_of_pages):
-      page = reader.pages[i]
-      text = page.extract_text()
-      words = text.split()
-      print("** Page", i, ", text length", len(text), ", num words", len(words))
-      for word in words:
-        word = word.translate(str.maketrans('', '', string.punctuation))
-        if word.isnumeric():
-          #
-          # find the first non-zero digit and count it
-          #
-          for c in word:
-            if c == '0':
-              continue
-            i = int(c) - int('0')
-            counts[i] += 1
-            break
-    
-    print("**RESULTS**")
-    print(number_of_pages, "pages")
-    for i in range(0, 10):
-      print(i, counts[i])
-    
-    outfile = open(local_results_file, "w")
-    outfile.write("**RESULTS**\n")
-    outfile.write(str(number_of_pages))
-    outfile.write(" pages\n")
-    
-    for i in range(0, 10):
-      outfile.write(str(i))
-      outfile.write(" ")
-      outfile.write(str(counts[i]))
-      outfile.write("\n")
-    outfile.close()
-    
-    print("**UPLOADING to S3 file", bucketkey_results_file, "**")
+    print("**SHARD", shard['start'], "to", shard['end'] - 1, "of '", shard['bucketkey'], "'**")
+
+    (pdf_source, pdf_size) = s3io.read_object(bucket, shard['bucketkey'], spill_threshold)
+
+    numbers = numstore.Numbers() if shard['numbers'] else None
+    page_counts = [] if shard.get('page_matrix', False) else None
+
+    try:
+      histograms = fanout.run_shard(pdf_source, shard, workers, serial_threshold, numbers, memory,
+                                    page_counts)
+    finally:
+      s3io.discard(pdf_source)
+
+    if numbers is not None:
+      numstore.write_part(bucket, shard['bucketkey'], numbers,
+                          shard['number_of_pages'], shard['start'], shard['end'])
+
+    if page_counts is not None:
+      pagematrix.write_part(bucket, shard['bucketkey'], page_counts,
+                            shard['number_of_pages'], shard['start'], shard['end'])
+
+    return {
+      'statusCode': 200,
+      'body': json.dumps({'histograms': histograms})
+    }
+
+  except Exception as err:
+    print("**ERROR**")
+    print(str(err))
+
+    return {
+      'statusCode': 500,
+      'body': json.dumps(str(err))
+    }
+
+
+###################################################################
+#
+# handle_reanalyze:
+#
+# Re-runs the digit tests of a completed job from its number store,
+# without re-parsing the PDF, see numstore.py.
+#
+def handle_reanalyze(bucketkey, bucket, dbConn):
+  """
+  Handles a reanalyze event: rebuilds the histograms of a job
+  from its number store and rewrites its results file.
+
+  Parameters
+  ----------
+  bucketkey : str
+    The bucket key of the job's PDF.
+  bucket : s3.Bucket
+    The bucket holding the store and the results.
+  dbConn : the database connection
+
+  Returns
+  -------
+  dict
+    A response with the number of values re-analyzed and the
+    time taken.
+  """
+
+  metrics = JobMetrics()
+
+  print("**REANALYZING '", bucketkey, "' from its number store**")
+
+  with metrics.stage("read_store"):
+    (numbers, number_of_pages) = numstore.read_store(bucket, bucketkey)
+
+  options = joboptions.read(dbConn, bucketkey)
+
+  with metrics.stage("tally"):
+    histograms = tally.new_histograms()
+    tally.tally_digits(numbers.digits, histograms)
+    results = benford.format_results(number_of_pages, histograms, options.get('tests'),
+                                     tabular.unit_of(bucketkey))
+
+  bucketkey_results_file = tabular.results_key(bucketkey)
+
+  with metrics.stage("upload"):
+    s3io.write_text(bucket, bucketkey_results_file, results)
+
+  sql = """
+    UPDATE jobs 
+    SET status = 'completed', resultsfilekey = %s
+    WHERE datafilekey = %s;
+  """
+
+  datatier.perform_action(dbConn, sql, [bucketkey_results_file, bucketkey])
+
+  metrics.record("numbers", len(numbers))
+  metrics.report()
+
+  return {
+    'statusCode': 200,
+    'body': json.dumps(metrics.as_dict())
+  }
+
+
+###################################################################
+#
+# upload_results:
+#
+# Uploads the results file of a job to S3.
+#
+def upload_results(bucket, bucketkey_results_file, results, in_memory, local_results_file):
+  """
+  Uploads the results of a job as a public text file.
+
+  Parameters
+  ----------
+  bucket : s3.Bucket
+    The bucket to upload to.
+  bucketkey_results_file : str
+    The bucket key of the results file.
+  results : str
+    The results, see benford.format_results().
+  in_memory : bool
+    Upload straight from memory, rather than via a local file.
+  local_results_file : str
+    The local file to upload from if not in_memory.
+  """
+
+  print("**UPLOADING to S3 file", bucketkey_results_file, "**")
+
+  if in_memory:
+    s3io.write_text(bucket, bucketkey_results_file, results)
+  else:
+    with open(local_results_file, "w") as outfile:
+      outfile.write(results)
 
     bucket.upload_file(local_results_file,
                        bucketkey_results_file,
@@ -148,89 +217,843 @@ def lambda_handler(event, context):
                          'ACL': 'public-read',
                          'ContentType': 'text/plain'
                        })
-    
-    # 
-    # The last step is to update the database to change
-    # the status of this job, and store the results
-    # bucketkey
+
+
+###################################################################
+#
+# complete_job:
+#
+# Marks a job completed, first adding its results to the cache.
+#
+def complete_job(dbConn, bucketkey, bucketkey_results_file, digest, variant, settings):
+  """
+  Updates the database once a job's results are known.
+
+  Parameters
+  ----------
+  dbConn : the database connection
+  bucketkey : str
+    The bucket key of the job's PDF.
+  bucketkey_results_file : str
+    The bucket key of its results file.
+  digest : str
+    The digest of the PDF, to cache the results under; None
+    to leave the cache alone.
+  variant : str
+    The cache variant of the job's results.
+  settings : SimpleNamespace
+    See read_settings().
+  """
+
+  if digest is not None:
+    resultcache.store(dbConn, digest, bucketkey_results_file, bucketkey, variant,
+                      settings.cache_max_age_days)
+
+  #
+  # update the jobs record that should already be there,
+  # changing the status of this job and storing the results
+  # bucketkey
+  #
+  print("**Updating job in database**")
+
+  sql = """
+    UPDATE jobs
+    SET status = 'completed', resultsfilekey = %s
+    WHERE datafilekey = %s;
+  """
+
+  modified = datatier.perform_action(dbConn, sql, [bucketkey_results_file, bucketkey])
+
+  if modified == 0:
+    raise Exception("update of jobs record either failed, or the existing row was not modified")
+
+
+###################################################################
+#
+# read_settings:
+#
+# Reads the compute settings from config.ini.
+#
+def read_settings(configur, context):
+  """
+  Reads the settings of the extraction engine and the optional
+  features (cache, number store, checkpointing, fan-out, memory
+  bounds and batching) from the config file.
+
+  Parameters
+  ----------
+  configur : ConfigParser
+    The parsed config.ini.
+  context : LambdaContext
+    The context of the invocation, or None when run locally.
+
+  Returns
+  -------
+  SimpleNamespace
+    The settings, named as below.
+  """
+
+  settings = types.SimpleNamespace()
+
+  #
+  # configure the extraction engine: 0 workers means one
+  # per CPU, and small documents are processed serially
+  #
+  settings.compute_workers = configur.getint('compute', 'workers', fallback=0)
+  settings.serial_threshold = configur.getint('compute', 'serial_page_threshold', fallback=16)
+  settings.tally_backend = configur.get('compute', 'tally_backend', fallback='regex')
+
+  #
+  # the tokens backend groups digits and marks decimals the
+  # way number_locale does, see tokenizer.py
+  #
+  number_locale = configur.get('compute', 'number_locale', fallback='en')
+
+  if settings.tally_backend == 'tokens' and number_locale != 'en':
+    settings.tally_backend = 'tokens-' + number_locale
+
+  #
+  # "raw" extraction reads the text operators straight from
+  # the content streams, skipping pypdf's layout analysis
+  #
+  settings.text_extractor = configur.get('compute', 'extractor', fallback='layout')
+
+  #
+  # in-memory mode streams the PDF from S3 into memory and
+  # writes the results back with put_object, avoiding /tmp
+  #
+  settings.in_memory = configur.getboolean('compute', 'in_memory', fallback=False)
+  settings.spill_threshold = configur.getint('compute', 'spill_threshold_mb', fallback=256) * 1024 * 1024
+
+  #
+  # pipelined mode (in-memory only) overlaps the download with
+  # opening the database connection and with parsing, and the
+  # upload with the database updates, see pipeline.py
+  #
+  settings.pipelined = configur.getboolean('compute', 'pipelined', fallback=False)
+
+  #
+  # results cache keyed by the SHA-256 of the PDF bytes
+  #
+  settings.cache_enabled = configur.getboolean('cache', 'enabled', fallback=False)
+  settings.cache_max_age_days = configur.getint('cache', 'max_age_days', fallback=30)
+
+  settings.cache_variant = resultcache.variant_of(settings.text_extractor, settings.tally_backend)
+
+  #
+  # number store: persist every extracted number for re-analysis
+  #
+  settings.numstore_enabled = configur.getboolean('numstore', 'enabled', fallback=False)
+
+  #
+  # page matrix: keep the first-digit counts of every page, for
+  # drilling down into a failed document, see proj04_pages
+  #
+  settings.pagematrix_enabled = configur.getboolean('pagematrix', 'enabled', fallback=False)
+
+  #
+  # checkpointing: stop and requeue when fewer than reserve_secs
+  # remain, checking the time every batch_pages pages at most
+  #
+  settings.checkpoint_enabled = configur.getboolean('checkpoint', 'enabled', fallback=False)
+  settings.checkpoint_reserve_secs = configur.getfloat('checkpoint', 'reserve_secs', fallback=30.0)
+  settings.checkpoint_batch_pages = configur.getint('checkpoint', 'batch_pages', fallback=64)
+
+  #
+  # a job claimed by an invocation that then died is taken over
+  # once the claim is lease_secs old; 0 means the invocation's
+  # time limit, plus a minute, so a running invocation never
+  # loses its job
+  #
+  settings.claim_lease_secs = configur.getint('claim', 'lease_secs', fallback=0)
+
+  if settings.claim_lease_secs == 0:
+    if context is not None:
+      settings.claim_lease_secs = context.get_remaining_time_in_millis() // 1000 + 60
+    else:
+      settings.claim_lease_secs = 900 + 60
+
+  #
+  # fan-out: documents with at least min_pages pages are split
+  # into shards of shard_pages pages, each tallied by a separate
+  # invocation of this function
+  #
+  settings.fanout_enabled = configur.getboolean('fanout', 'enabled', fallback=False)
+  settings.fanout_min_pages = configur.getint('fanout', 'min_pages', fallback=400)
+  settings.fanout_shard_pages = configur.getint('fanout', 'shard_pages', fallback=100)
+  settings.fanout_max_shards = configur.getint('fanout', 'max_shards', fallback=20)
+  settings.fanout_max_concurrency = configur.getint('fanout', 'max_concurrency', fallback=10)
+
+  #
+  # bounded-memory processing: release each page once it has
+  # been tallied, either always or from when RSS nears
+  # max_rss_mb; 0 means 80% of the function's memory size
+  #
+  settings.memory_bounded = configur.getboolean('memory', 'bounded', fallback=False)
+  settings.memory_ceiling_mb = configur.getint('memory', 'max_rss_mb', fallback=0)
+
+  if settings.memory_ceiling_mb == 0 and context is not None:
+    settings.memory_ceiling_mb = int(0.8 * int(context.memory_limit_in_mb))
+
+  #
+  # batching: the records of an event carrying several PDFs are
+  # processed up to max_concurrency at a time
+  #
+  settings.batch_concurrency = configur.getint('batch', 'max_concurrency', fallback=4)
+
+  #
+  # sampled jobs (see joboptions.py): the bootstrap resamples
+  # behind the interval on the conformity score
+  #
+  settings.bootstrap_reps = configur.getint('sampling', 'bootstrap_reps', fallback=200)
+
+  return settings
+
+
+###################################################################
+#
+# handle_record:
+#
+# Analyzes one PDF dropped into S3.
+#
+def handle_record(event, slot, context, bucket, dbConn, settings):
+  """
+  Handles the record of a single-record S3 event: analyzes the
+  PDF, uploads the results, and updates the job. On an error,
+  the error message is uploaded as the results instead, and the
+  job marked as failed.
+
+  Parameters
+  ----------
+  event : dict
+    An S3 event with a single record, see batch.record_events().
+  slot : int
+    The index of the record in its event; keeps apart the local
+    files of records processed at the same time.
+  context : LambdaContext
+    The context of the invocation, or None when run locally.
+  bucket : s3.Bucket
+    The bucket holding the PDF; used by this record alone.
+  dbConn : the database connection
+  settings : SimpleNamespace
+    See read_settings().
+
+  Returns
+  -------
+  dict
+    The record's response.
+  """
+
+  #
+  # in case we get an exception, set this to a default
+  # filename so we can write an error message if need
+  # be
+  #
+  local_results_file = "/tmp/results-" + str(slot) + ".txt"
+  bucketkey = ""
+  bucketkey_results_file = ""
+  in_memory = settings.in_memory
+
+  try:
+    metrics = JobMetrics()
+
+    container = runtime.stats()
+    metrics.record("cold_start", container['cold'])
+    metrics.record("init_secs", round(container['init_secs'], 4))
+
+    memory_guard = memguard.MemoryGuard(settings.memory_bounded, settings.memory_ceiling_mb)
+
+    bucketkey = batch.bucketkey_of(event)
+
+    print("bucketkey:", bucketkey)
+
+    extension = pathlib.Path(bucketkey).suffix
+    kind = tabular.kind_of(bucketkey)
+
+    if extension != ".pdf" and kind is None:
+      raise Exception("expecting S3 document to have .pdf, .csv, .tsv or .txt extension")
+
     #
-    # open connection to the database
+    # with text files accepted, the results files we write would
+    # trigger this function too: leave them be
     #
-    print("**Opening connection**")
-    
-    dbConn = datatier.get_dbConn(rds_endpoint, rds_portnum, rds_username, rds_pwd, rds_dbname)
-
-    #
-    # update the jobs record that should already be there
-    #
-    print("**Updating job in database**")
-    
-    sql = """
-      UPDATE jobs 
-      SET status = 'completed', resultsfilekey = %s
-      WHERE datafilekey = %s;
-    """
-    
-    modified = datatier.perform_action(dbConn, sql, [bucketkey_results_file, bucketkey])
-    
-    if modified == 0:
-      raise Exception("update of jobs record either failed, or the existing row was not modified")
-    
+    if kind == 'text' and jobclaim.is_results_file(bucketkey, dbConn):
+      print("**DONE, results file ignored**")
+
+      return {
+        'statusCode': 200,
+        'body': json.dumps("ignored")
+      }
+
+    bucketkey_results_file = tabular.results_key(bucketkey)
+
+    print("bucketkey results file:", bucketkey_results_file)
+
+    #
+    # a requeued invocation carries the checkpoint to resume from
+    #
+    checkpoint_key = checkpoint.checkpoint_key(bucketkey)
+    resuming = 'checkpoint' in event
+    print("local results file:", local_results_file)
+
+    #
+    # in pipelined mode the PDF downloads while we claim the job
+    # (and the connection to the database may still be opening).
+    # Parsing waits for the whole file: pypdf checks every entry
+    # of the cross-reference table when it opens a PDF
+    #
+    pipelined = settings.pipelined and in_memory
+
+    if pipelined:
+      print("**DOWNLOADING '", bucketkey, "' in the background**")
+
+      downloading = pipeline.start(s3io.read_object, bucket, bucketkey, settings.spill_threshold)
+
+    metrics.record("pipelined", pipelined)
+
+    #
+    # S3 may notify us more than once per upload: claim the job
+    # before doing any work, and skip it if it has already been
+    # claimed, or computed inline by proj04_upload. (A resumed
+    # job was claimed by its first invocation, and renews the
+    # claim.)
+    #
+    if resuming:
+      with metrics.stage("db"):
+        jobclaim.renew(dbConn, bucketkey)
+    else:
+      with metrics.stage("db"):
+        claimed = jobclaim.claim(dbConn, bucketkey, settings.claim_lease_secs)
+
+      if not claimed:
+        #
+        # don't wait for the download, just free it when done
+        #
+        if pipelined:
+          downloading.add_done_callback(s3io.discard_when_read)
+
+        metrics.record("duplicate", True)
+        metrics.report()
+
+        print("**DONE, event skipped, job already claimed or computed**")
+
+        return {
+          'statusCode': 200,
+          'body': json.dumps("duplicate")
+        }
+
+      #
+      # the invocation we took the job over from may have written
+      # parts of the number store and page matrix, over page
+      # ranges other than ours
+      #
+      if claimed == jobclaim.TAKEN_OVER and settings.numstore_enabled:
+        with metrics.stage("numstore"):
+          cleared = numstore.clear_store(bucket, bucketkey)
+        print("**Cleared", cleared, "stale number store parts**")
+
+      if claimed == jobclaim.TAKEN_OVER and settings.pagematrix_enabled:
+        with metrics.stage("pagematrix"):
+          cleared = pagematrix.clear_matrix(bucket, bucketkey)
+        print("**Cleared", cleared, "stale page matrix parts**")
+
+    #
+    # the options the job was uploaded with: which pages to
+    # analyze (or a sample of them), which numbers to count and
+    # which digit tests to report, see joboptions.py
+    #
+    with metrics.stage("db"):
+      options = joboptions.read(dbConn, bucketkey)
+
+    sample = options.get('sample')
+    filters = joboptions.tally_filters(options)
+
+    def select_pages(num_pages):
+      return joboptions.select_pages(options, num_pages)
+
+    select = select_pages if 'pages' in options else None
+
+    #
+    # options that change the results get their own cache entries
+    #
+    cache_variant = settings.cache_variant + joboptions.cache_suffix(options)
+
+    #
+    # download PDF from S3: either to /tmp, or in in-memory mode
+    # streamed into a bounded buffer that only spills to /tmp
+    # for very large documents
+    #
+    if pipelined:
+      with metrics.stage("download"):
+        (pdf_source, pdf_size) = downloading.result()
+    else:
+      print("**DOWNLOADING '", bucketkey, "'**")
+
+      with metrics.stage("download"):
+        if in_memory:
+          (pdf_source, pdf_size) = s3io.read_object(bucket, bucketkey, settings.spill_threshold)
+        else:
+          pdf_source = "/tmp/data-" + str(slot) + extension
+          bucket.download_file(bucketkey, pdf_source)
+          pdf_size = os.path.getsize(pdf_source)
+
+    metrics.record("pdf_bytes", pdf_size)
+
+    #
+    # have we already analyzed a byte-identical PDF? If so,
+    # copy its results rather than parsing again. (A resumed
+    # job already missed the cache, so don't look again.) A
+    # sampled job takes the exact results when there are some,
+    # but its own results are never cached.
+    #
+    cached_key = None
+    cached_datafilekey = ""
+
+    if settings.cache_enabled:
+      with metrics.stage("cache"):
+        digest = resultcache.digest_of(pdf_source)
+        print("digest:", digest)
+
+        if not resuming:
+          cached = resultcache.lookup(dbConn, digest, cache_variant, settings.cache_max_age_days)
+
+          if cached is not None:
+            (cached_key, cached_datafilekey) = cached
+
+        if cached_key is not None:
+          print("**CACHE HIT, copying", cached_key, "**")
+          try:
+            resultcache.copy_results(bucket, cached_key, bucketkey_results_file)
+          except Exception as err:
+            print("**Cached results unavailable, recomputing:", str(err), "**")
+            resultcache.forget(dbConn, digest, cache_variant)
+            cached_key = None
+
+    metrics.record("cache_hit", cached_key is not None)
+
+    if cached_key is not None:
+      if in_memory:
+        s3io.discard(pdf_source)
+
+      #
+      # the number store and page matrix are nice-to-haves, so
+      # a failed copy does not fail the job; they are kept under
+      # the data file of the cached job, not its results file
+      #
+      if cached_datafilekey == "":
+        print("**Cache entry does not name its data file, number store and page matrix not copied**")
+      else:
+        if settings.numstore_enabled:
+          try:
+            copied = numstore.copy_store(bucket, cached_datafilekey, bucketkey)
+            print("**Copied", copied, "number store parts**")
+          except Exception as err:
+            print("**Number store not copied:", str(err), "**")
+
+        if settings.pagematrix_enabled:
+          try:
+            copied = pagematrix.copy_matrix(bucket, cached_datafilekey, bucketkey)
+            print("**Copied", copied, "page matrix parts**")
+          except Exception as err:
+            print("**Page matrix not copied:", str(err), "**")
+    else:
+      #
+      # open pdf file, and for each page extract text, split
+      # into words, and see which words are numeric values;
+      # large documents are split across worker processes
+      #
+      print("**PROCESSING '", bucketkey, "'**")
+
+      #
+      # very large documents are fanned out across several
+      # invocations of this function, one shard of pages each,
+      # and the shard histograms reduced here
+      #
+      fanned_out = False
+
+      #
+      # a sampled job tallies just its sample of the pages, in
+      # this invocation, and estimates the rest
+      #
+      estimates = None
+      unit = "pages"
+
+      if kind is not None:
+        #
+        # CSV, TSV and text files are parsed as they are,
+        # without pypdf
+        #
+        numbers = numstore.Numbers() if settings.numstore_enabled else None
+        page_counts = [] if settings.pagematrix_enabled else None
+        timings = {}
+
+        try:
+          with metrics.stage("parse"):
+            (number_of_pages, histograms) = tabular.count_document(pdf_source, kind,
+                                                                   columns=options.get('columns'),
+                                                                   backend=settings.tally_backend,
+                                                                   numbers=numbers,
+                                                                   filters=filters,
+                                                                   timings=timings,
+                                                                   page_counts=page_counts)
+        finally:
+          if in_memory:
+            s3io.discard(pdf_source)
+
+        for (name, secs) in timings.items():
+          metrics.add(name, secs)
+
+        if numbers is not None:
+          with metrics.stage("numstore"):
+            size = numstore.write_part(bucket, bucketkey, numbers, number_of_pages, 0, number_of_pages)
+          metrics.record("numstore_bytes", size)
+
+        if page_counts is not None:
+          with metrics.stage("pagematrix"):
+            size = pagematrix.write_part(bucket, bucketkey, page_counts, number_of_pages, 0, number_of_pages)
+          metrics.record("pagematrix_bytes", size)
+
+        unit = tabular.unit_of(bucketkey)
+        metrics.record("format", kind)
+
+      elif sample is not None:
+        page_counts = [] if settings.pagematrix_enabled else None
+        timings = {}
+
+        try:
+          with metrics.stage("parse"):
+            (number_of_pages, histograms, estimates) = sampling.extract_sample(pdf_source, sample,
+                                                                               seed=bucketkey,
+                                                                               reps=settings.bootstrap_reps,
+                                                                               workers=settings.compute_workers,
+                                                                               serial_threshold=settings.serial_threshold,
+                                                                               backend=settings.tally_backend,
+                                                                               extractor=settings.text_extractor,
+                                                                               timings=timings,
+                                                                               memory=memory_guard,
+                                                                               select=select,
+                                                                               filters=filters,
+                                                                               page_counts=page_counts)
+        finally:
+          if in_memory:
+            s3io.discard(pdf_source)
+
+        for (name, secs) in timings.items():
+          metrics.add(name, secs)
+
+        #
+        # the matrix of a sampled job has rows for the sampled
+        # pages alone
+        #
+        if page_counts is not None:
+          with metrics.stage("pagematrix"):
+            size = pagematrix.write_part(bucket, bucketkey, page_counts, number_of_pages, 0, number_of_pages)
+          metrics.record("pagematrix_bytes", size)
+
+        metrics.record("sampled_pages", estimates['pages'])
+
+      if settings.fanout_enabled and kind is None and sample is None and not resuming and context is not None:
+        number_of_pages = extraction.page_count(pdf_source)
+
+        if select is not None:
+          number_of_pages = len(select(number_of_pages))
+
+        if number_of_pages >= settings.fanout_min_pages:
+          executor = fanout.LambdaExecutor(context.invoked_function_arn, settings.fanout_max_concurrency)
+          try:
+            with metrics.stage("parse"):
+              histograms = fanout.fan_out(executor, bucketkey, number_of_pages,
+                                          settings.fanout_shard_pages, settings.fanout_max_shards,
+                                          backend=settings.tally_backend,
+                                          numbers=settings.numstore_enabled,
+                                          extractor=settings.text_extractor,
+                                          options=options,
+                                          page_matrix=settings.pagematrix_enabled)
+          finally:
+            if in_memory:
+              s3io.discard(pdf_source)
+
+          fanned_out = True
+          metrics.record("shards", len(fanout.plan_shards(number_of_pages, settings.fanout_shard_pages,
+                                                          settings.fanout_max_shards)))
+
+      #
+      # otherwise, if we are resuming a very large PDF, carry on
+      # from the checkpoint; if we run low on time, save a
+      # checkpoint and requeue ourselves to continue
+      #
+      if not fanned_out and kind is None and sample is None:
+        if resuming:
+          state = checkpoint.load(bucket, checkpoint_key)
+        else:
+          state = checkpoint.new_state()
+
+        histograms = state['histograms']
+        start_page = state['next_page']
+        numbers = numstore.Numbers() if settings.numstore_enabled else None
+        page_counts = [] if settings.pagematrix_enabled else None
+
+        time_left = checkpoint.time_left_fn(context) if settings.checkpoint_enabled else None
+
+        #
+        # the extract and tally seconds are summed across worker
+        # processes, so can exceed the parse stage's wall time
+        #
+        timings = {}
+
+        try:
+          with metrics.stage("parse"):
+            (number_of_pages, next_page) = extraction.extract_counts_until(pdf_source,
+                                                                           state['next_page'],
+                                                                           histograms,
+                                                                           time_left=time_left,
+                                                                           reserve_secs=settings.checkpoint_reserve_secs,
+                                                                           batch_pages=settings.checkpoint_batch_pages,
+                                                                           workers=settings.compute_workers,
+                                                                           serial_threshold=settings.serial_threshold,
+                                                                           backend=settings.tally_backend,
+                                                                           numbers=numbers,
+                                                                           extractor=settings.text_extractor,
+                                                                           timings=timings,
+                                                                           memory=memory_guard,
+                                                                           select=select,
+                                                                           filters=filters,
+                                                                           page_counts=page_counts)
+        finally:
+          if in_memory:
+            s3io.discard(pdf_source)
+
+        for (name, secs) in timings.items():
+          metrics.add(name, secs)
+
+        #
+        # persist the numbers from the pages we just processed,
+        # so later re-analysis can skip the PDF entirely
+        #
+        if numbers is not None:
+          with metrics.stage("numstore"):
+            size = numstore.write_part(bucket, bucketkey, numbers, number_of_pages, start_page, next_page)
+          metrics.record("numstore_bytes", size)
+
+        if page_counts is not None:
+          with metrics.stage("pagematrix"):
+            size = pagematrix.write_part(bucket, bucketkey, page_counts, number_of_pages, start_page, next_page)
+          metrics.record("pagematrix_bytes", size)
+
+        #
+        # the requeued event carries just this record, so the
+        # rest of a batch is not processed twice
+        #
+        if next_page < number_of_pages:
+          state['next_page'] = next_page
+          checkpoint.save(bucket, checkpoint_key, state)
+          checkpoint.requeue(context, event, checkpoint_key)
+
+          metrics.record("next_page", next_page)
+          metrics.record("checkpoints", state['checkpoints'])
+          metrics.record("checkpoint_secs", round(state['checkpoint_secs'], 4))
+          metrics.report()
+
+          print("**DONE, checkpointed at page", next_page, "of", number_of_pages, "**")
+
+          return {
+            'statusCode': 202,
+            'body': json.dumps("checkpointed")
+          }
+
+        if resuming:
+          checkpoint.clear(bucket, checkpoint_key)
+          metrics.record("invocations", state['invocations'])
+          metrics.record("checkpoints", state['checkpoints'])
+          metrics.record("checkpoint_secs", round(state['checkpoint_secs'], 4))
+
+      print("**RESULTS**")
+      print(number_of_pages, unit)
+      for i in range(0, 10):
+        print(i, histograms['first'][i])
+
+      metrics.record("pages", number_of_pages)
+      metrics.record("memory_bounded", memory_guard.bounded)
+      if memory_guard.degraded_at is not None:
+        metrics.record("memory_degraded_at_page", memory_guard.degraded_at)
+      metrics.record("numbers", sum(histograms['first']))
+
+      results = benford.format_results(number_of_pages, histograms, options.get('tests'), unit)
+
+      if estimates is not None:
+        results += sampling.format_sample(estimates)
+
+    #
+    # The last steps are to upload the results (unless copied
+    # from the cache), and to update the database: add the
+    # results to the cache, and mark the job completed. In
+    # pipelined mode the upload and the database updates run
+    # at the same time; should the upload fail, the job is
+    # then marked as failed below.
+    #
+    steps = []
+
+    if cached_key is None:
+      steps.append(("upload", lambda: upload_results(bucket, bucketkey_results_file, results,
+                                                     in_memory, local_results_file)))
+
+    cache_digest = digest if settings.cache_enabled and cached_key is None and sample is None else None
+
+    steps.append(("db", lambda: complete_job(dbConn, bucketkey, bucketkey_results_file,
+                                             cache_digest, cache_variant, settings)))
+
+    if pipelined:
+      pipeline.run_concurrently(steps, metrics)
+    else:
+      for (name, step) in steps:
+        with metrics.stage(name):
+          step()
+
     #
     # respond in an HTTP-like way, i.e. with a status
     # code and body in JSON format
     #
+    metrics.report()
+
     print("**DONE, returning success**")
-    
+
     return {
       'statusCode': 200,
       'body': json.dumps("success")
     }
-    
+
   #
   # on an error, try to upload error message to S3:
   #
   except Exception as err:
     print("**ERROR**")
     print(str(err))
-    
-    outfile = open(local_results_file, "w")
-
-    outfile.write(str(err))
-    outfile.write("\n")
-    outfile.close()
-    
-    if bucketkey_results_file == "": 
-      #
-      # we can't upload the error file
+
+    #
+    # in a batch, reporting one record's error must not stop
+    # the others, so failures here are only logged
+    #
+    try:
+      if bucketkey_results_file == "":
+        #
+        # we can't upload the error file
+        #
+        pass
+      elif in_memory:
+        print("**UPLOADING**")
+        s3io.write_text(bucket, bucketkey_results_file, str(err) + "\n")
+      else:
+        #
+        # upload the error file to S3
+        #
+        with open(local_results_file, "w") as outfile:
+          outfile.write(str(err))
+          outfile.write("\n")
+
+        print("**UPLOADING**")
+        bucket.upload_file(local_results_file,
+                           bucketkey_results_file,
+                           ExtraArgs={
+                             'ACL': 'public-read',
+                             'ContentType': 'text/plain'
+                           })
+
       #
-      pass
-    else:
-      # 
-      # upload the error file to S3
+      # update jobs row in database
       #
-      print("**UPLOADING**")
-      bucket.upload_file(local_results_file,
-                         bucketkey_results_file,
-                         ExtraArgs={
-                           'ACL': 'public-read',
-                           'ContentType': 'text/plain'
-                         })
-                         
+      print("**Updating job in database**")
+      sql = """
+        UPDATE jobs
+        SET status = 'error', resultsfilekey = %s
+        WHERE datafilekey = %s;
+      """
+      datatier.perform_action(dbConn, sql, [bucketkey_results_file, bucketkey])
+
+    except Exception as report_err:
+      print("**Error not reported:", str(report_err), "**")
+
+    return {
+      'statusCode': 500,
+      'body': json.dumps(str(err))
+    }
+
+
+def lambda_handler(event, context):
+  try:
+    print("**STARTING**")
+    print("**lambda: proj04_compute**")
+
+    runtime.start_invocation()
+
+    configur = runtime.config()
+    bucket = runtime.bucket()
+
+    settings = read_settings(configur, context)
+
+    #
+    # a shard event comes from an invocation fanning out a large
+    # PDF: tally just those pages and return the histograms to it
+    #
+    if 'shard' in event:
+      return handle_shard(event['shard'], bucket, settings.spill_threshold, settings.compute_workers,
+                          settings.serial_threshold,
+                          memguard.MemoryGuard(settings.memory_bounded, settings.memory_ceiling_mb))
+
+    #
+    # a reanalyze event re-runs the digit tests of a completed
+    # job from its number store, without touching the PDF
+    #
+    if 'reanalyze' in event:
+      dbConn = runtime.db_conn()
+      return handle_reanalyze(event['reanalyze']['bucketkey'], bucket, dbConn)
+
     #
-    # update jobs row in database
+    # this function is event-driven by PDFs being dropped
+    # into S3. The bucket keys are sent to us in the records
+    # of the event, one or (when uploads are batched) several
+    #
+    events = batch.record_events(event)
+
+    #
+    # the connection to the database, shared by the records; it
+    # is checked (and reopened if need be) in the background in
+    # pipelined mode
     #
     print("**Opening connection**")
-    dbConn = datatier.get_dbConn(rds_endpoint, rds_portnum, rds_username, rds_pwd, rds_dbname)
-
-    print("**Updating job in database**")
-    sql = """
-      UPDATE jobs 
-      SET status = 'error', resultsfilekey = %s
-      WHERE datafilekey = %s;
-    """
-    datatier.perform_action(dbConn, sql, [bucketkey_results_file, bucketkey])
-    
+
+    if settings.pipelined:
+      connecting = pipeline.start(runtime.db_conn)
+    else:
+      connecting = runtime.db_conn()
+
+    dbConn = batch.SharedConnection(connecting)
+
+    if len(events) == 1:
+      return handle_record(events[0], 0, context, bucket, dbConn, settings)
+
+    #
+    # process several records at a time, splitting the worker
+    # processes between them; boto3 resources are not
+    # thread-safe, so each record gets its own bucket
+    #
+    concurrency = min(settings.batch_concurrency, len(events))
+    settings.compute_workers = max(1, extraction.resolve_workers(settings.compute_workers) // concurrency)
+
+    print("**BATCH of", len(events), "records,", concurrency, "at a time**")
+
+    buckets = [runtime.bucket(slot) for slot in range(len(events))]
+
+    responses = batch.run_records(
+      lambda record_event, slot: handle_record(record_event, slot, context, buckets[slot], dbConn, settings),
+      events,
+      concurrency)
+
+    return batch.summarize(events, responses)
+
+  except Exception as err:
+    print("**ERROR**")
+    print(str(err))
+
     return {
       'statusCode': 500,
       'body': json.dumps(str(err))
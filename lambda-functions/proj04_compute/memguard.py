@@ -0,0 +1,96 @@
+#
+# memguard.py
+#
+# Bounded-memory page processing for proj04_compute. A PdfReader
+# keeps every object it has parsed (page dictionaries, fonts, and
+# the decoded content stream of every page) in its resolved object
+# cache, so memory grows with the size of the document. A guard
+# can release that cache after each page is tallied, trading some
+# re-parsing of shared objects (e.g. fonts) for a flat footprint.
+#
+# With a ceiling, the guard starts out fast and degrades only when
+# the process nears the ceiling: first it begins releasing pages,
+# and between batches the extraction engine drops to a single
+# worker process, since every worker holds its own reader.
+#
+
+import gc
+
+from metrics import current_rss_mb
+
+
+#
+# while still over the ceiling in bounded mode, run the cycle
+# collector every this many pages
+#
+GC_EVERY_PAGES = 64
+
+
+###################################################################
+#
+# release_caches:
+#
+# Drops the objects a reader has parsed so far.
+#
+def release_caches(reader):
+  """
+  Releases the parsed objects cached by a reader; they are
+  re-read from the PDF if needed again.
+
+  Parameters
+  ----------
+  reader : PdfReader
+    The open PDF.
+  """
+
+  cache = getattr(reader, 'resolved_objects', None)
+
+  if cache is not None:
+    cache.clear()
+
+
+class MemoryGuard:
+  """
+  Keeps page processing within a memory ceiling.
+
+  bounded - release the reader's caches after every page
+  ceiling_mb - RSS, in MB, above which to start releasing; 0
+               for no ceiling
+  """
+
+  def __init__(self, bounded=False, ceiling_mb=0):
+    self.bounded = bounded
+    self.ceiling_mb = ceiling_mb
+    self.degraded_at = None
+
+  def share(self, workers):
+    """
+    The guard for one of several worker processes, each allowed
+    an equal share of the ceiling.
+    """
+
+    return MemoryGuard(self.bounded, self.ceiling_mb / max(1, workers))
+
+  def over_ceiling(self):
+    return self.ceiling_mb > 0 and current_rss_mb() > self.ceiling_mb
+
+  def after_page(self, reader, page):
+    """
+    Called once each page has been tallied: releases the
+    reader's caches in bounded mode, switching to bounded mode
+    first if the ceiling has been reached.
+    """
+
+    if not self.bounded and self.over_ceiling():
+      print("**Memory ceiling of", round(self.ceiling_mb), "MB reached at page", page,
+            ", releasing pages from now on**")
+      self.bounded = True
+      self.degraded_at = page
+
+    if self.bounded:
+      release_caches(reader)
+      #
+      # a full collection is slow, so only now and then
+      #
+      if (page - (self.degraded_at or 0)) % GC_EVERY_PAGES == 0 and self.over_ceiling():
+        gc.collect()
@@ -0,0 +1,116 @@
+#
+# metrics.py
+#
+# Per-job performance metrics for proj04_compute: wall-clock time
+# spent in each stage of the job, and peak resident memory.
+#
+
+import time
+import resource
+import contextlib
+
+
+###################################################################
+#
+# peak_rss_mb:
+#
+# Peak resident set size of this process (and optionally of its
+# finished child processes), in megabytes.
+#
+def peak_rss_mb(include_children=True):
+  """
+  Returns the peak resident memory used so far.
+
+  Parameters
+  ----------
+  include_children : bool
+    Also consider worker processes that have been waited
+    for. Defaults to True.
+
+  Returns
+  -------
+  float
+    The peak RSS in MB.
+  """
+
+  #
+  # ru_maxrss is in kilobytes on Linux
+  #
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+  if include_children:
+    peak = max(peak, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+  return peak / 1024.0
+
+
+###################################################################
+#
+# current_rss_mb:
+#
+# Current resident set size of this process, in megabytes.
+#
+def current_rss_mb():
+  """
+  Returns the memory this process is using right now.
+
+  Returns
+  -------
+  float
+    The current RSS in MB; where /proc is not available,
+    the peak RSS instead.
+  """
+
+  try:
+    with open("/proc/self/statm") as infile:
+      pages = int(infile.read().split()[1])
+    return pages * resource.getpagesize() / (1024.0 * 1024.0)
+  except (OSError, ValueError, IndexError):
+    return peak_rss_mb(include_children=False)
+
+
+class JobMetrics:
+  """
+  Accumulates the time spent in each named stage of a job.
+
+  Usage:
+    metrics = JobMetrics()
+    with metrics.stage("download"):
+      ...
+    metrics.add("tally", secs)  # timed elsewhere, e.g. in a worker
+    metrics.report()
+  """
+
+  def __init__(self):
+    self.start = time.perf_counter()
+    self.timings = {}
+    self.values = {}
+
+  @contextlib.contextmanager
+  def stage(self, name):
+    t0 = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.timings[name] = self.timings.get(name, 0.0) + (time.perf_counter() - t0)
+
+  def add(self, name, secs):
+    self.timings[name] = self.timings.get(name, 0.0) + secs
+
+  def record(self, name, value):
+    self.values[name] = value
+
+  def total(self):
+    return time.perf_counter() - self.start
+
+  def as_dict(self):
+    d = {name + "_secs": round(secs, 4) for (name, secs) in self.timings.items()}
+    d.update(self.values)
+    d['total_secs'] = round(self.total(), 4)
+    d['peak_rss_mb'] = round(peak_rss_mb(), 1)
+    return d
+
+  def report(self):
+    print("**METRICS**")
+    for (name, value) in self.as_dict().items():
+      print(name + ":", value)
@@ -0,0 +1,82 @@
+#
+# pipeline.py
+#
+# Overlapping the I/O of a proj04_compute job. Run one stage after
+# another, a job waits in turn for the database connection, the
+# download, the upload of its results and the update of its jobs
+# row; in pipelined mode (see config.ini) these run on a small
+# thread pool instead, while the calling thread carries on.
+#
+
+import concurrent.futures
+
+
+#
+# the pool outlives an invocation, and is reused by the next one
+# in a warm container
+#
+_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="pipeline")
+
+
+###################################################################
+#
+# start:
+#
+# Starts a call in the background.
+#
+def start(fn, *args):
+  """
+  Calls fn(*args) on the pipeline's thread pool.
+
+  Parameters
+  ----------
+  fn : function
+    The function to call.
+  args : any
+    Its arguments.
+
+  Returns
+  -------
+  concurrent.futures.Future
+    The pending result of the call.
+  """
+
+  return _POOL.submit(fn, *args)
+
+
+###################################################################
+#
+# run_concurrently:
+#
+# Runs several steps of a job at the same time, and waits for
+# them all.
+#
+def run_concurrently(steps, metrics):
+  """
+  Runs steps at the same time, timing each as a stage of the
+  job. Every step runs to completion, even if another fails.
+
+  Parameters
+  ----------
+  steps : list
+    (stage name, function) pairs; each function takes no
+    arguments.
+  metrics : JobMetrics
+    The metrics of the job.
+
+  Returns
+  -------
+  list
+    The results of the steps, in order. If a step raised an
+    exception, the first such exception is raised instead.
+  """
+
+  def timed(name, fn):
+    with metrics.stage(name):
+      return fn()
+
+  futures = [_POOL.submit(timed, name, fn) for (name, fn) in steps]
+
+  concurrent.futures.wait(futures)
+
+  return [future.result() for future in futures]
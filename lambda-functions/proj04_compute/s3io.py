@@ -0,0 +1,174 @@
+#
+# s3io.py
+#
+# Disk-free S3 transfers for proj04_compute. Objects are streamed
+# from the get_object body into an in-memory buffer, spilling to a
+# file in /tmp only when the object is larger than a threshold, and
+# results are written back with put_object straight from memory.
+#
+
+import contextlib
+import io
+import os
+import tempfile
+
+
+CHUNK_SIZE = 1024 * 1024
+
+
+###################################################################
+#
+# read_object:
+#
+# Streams an S3 object into memory, or into a spill file under
+# /tmp if it is larger than spill_threshold bytes.
+#
+def read_object(bucket, bucketkey, spill_threshold):
+  """
+  Streams an S3 object into a bounded in-memory buffer.
+
+  If the object is (or turns out to be) larger than
+  spill_threshold bytes, it is written to a temporary file
+  instead, and the filename is returned. The caller must
+  remove a spilled file with discard().
+
+  Parameters
+  ----------
+  bucket : s3.Bucket
+    The bucket holding the object.
+  bucketkey : str
+    The key of the object.
+  spill_threshold : int
+    The largest object, in bytes, to keep in memory.
+
+  Returns
+  -------
+  tuple
+    (source, size) where source is a BytesIO positioned at
+    the start of the data, or the filename of the spill file.
+  """
+
+  response = bucket.Object(bucketkey).get()
+  body = response['Body']
+
+  size = 0
+  buffer = io.BytesIO()
+  spill = None
+
+  #
+  # the spill file, if any, is closed on the way out; on an error
+  # it is removed as well
+  #
+  with contextlib.ExitStack() as stack:
+    stack.callback(body.close)
+
+    #
+    # if S3 already tells us the object is too big, skip the
+    # in-memory buffer entirely
+    #
+    if response.get('ContentLength', 0) > spill_threshold:
+      spill = stack.enter_context(_spill_file())
+
+    try:
+      for chunk in body.iter_chunks(chunk_size=CHUNK_SIZE):
+        size += len(chunk)
+
+        if spill is None and size > spill_threshold:
+          print("**Spilling to disk after", size, "bytes**")
+          spill = stack.enter_context(_spill_file())
+          spill.write(buffer.getbuffer())
+          buffer = None
+
+        if spill is None:
+          buffer.write(chunk)
+        else:
+          spill.write(chunk)
+
+    except Exception:
+      if spill is not None:
+        stack.callback(os.remove, spill.name)
+      raise
+
+  if spill is not None:
+    return spill.name, size
+
+  buffer.seek(0)
+  return buffer, size
+
+
+def _spill_file():
+  return tempfile.NamedTemporaryFile(prefix="data-", suffix=".pdf", dir="/tmp",
+                                     delete=False)
+
+
+###################################################################
+#
+# discard:
+#
+# Releases a source returned by read_object.
+#
+def discard(source):
+  """
+  Releases the buffer or removes the spill file returned by
+  read_object.
+
+  Parameters
+  ----------
+  source : BytesIO or str
+    The source returned by read_object.
+  """
+
+  if isinstance(source, str):
+    if os.path.exists(source):
+      os.remove(source)
+  else:
+    source.close()
+
+
+###################################################################
+#
+# discard_when_read:
+#
+# Releases the source of a background read_object once it is done.
+#
+def discard_when_read(done):
+  """
+  A done-callback for read_object run in the background (see
+  pipeline.start), whose result will not be used: releases the
+  source, unless the read failed and there is nothing to release.
+
+  Parameters
+  ----------
+  done : concurrent.futures.Future
+    The finished read.
+  """
+
+  if done.exception() is None:
+    (source, _) = done.result()
+    discard(source)
+
+
+###################################################################
+#
+# write_text:
+#
+# Uploads a string as a public text/plain S3 object.
+#
+def write_text(bucket, bucketkey, text):
+  """
+  Writes a string to S3 directly from memory.
+
+  Parameters
+  ----------
+  bucket : s3.Bucket
+    The bucket to write to.
+  bucketkey : str
+    The key of the object to write.
+  text : str
+    The contents of the object.
+  """
+
+  bucket.put_object(Key=bucketkey,
+                    Body=text.encode('utf-8'),
+                    ACL='public-read',
+                    ContentType='text/plain')
@@ -0,0 +1,298 @@
+#
+# sampling.py
+#
+# Page sampling for quick triage of long documents. Instead of
+# every page, a job with the sample option (see joboptions.py)
+# analyzes a stratified random sample: the document is cut into
+# as many equal runs of pages as pages are to be sampled, and one
+# page is drawn at random from each run, so the sample covers the
+# whole document. The draw is seeded by the bucket key, so a job
+# always samples the same pages.
+#
+# The pages are clusters of numbers, so the intervals are computed
+# per page rather than per number: each first-digit frequency is a
+# ratio estimate (digit count / numbers counted) with a normal
+# interval from the between-page variance, and the first-digit
+# MAD gets a bootstrap percentile interval over the sampled pages.
+# Both treat the strata as a simple random sample of pages, which
+# errs on the wide side.
+#
+
+import math
+import random
+import statistics
+
+import benford
+import extraction
+import tally
+
+
+###################################################################
+#
+# plan_sample:
+#
+# Chooses the pages of a stratified random sample.
+#
+def plan_sample(number_of_pages, pages=None, percent=None, seed=""):
+  """
+  Chooses the pages to analyze.
+
+  Parameters
+  ----------
+  number_of_pages : int
+    The number of pages in the document.
+  pages : int
+    The number of pages to sample, or None.
+  percent : float
+    The percentage of pages to sample if pages is None; at
+    least one page is sampled.
+  seed : str
+    Seeds the draw, e.g. the bucket key of the document.
+
+  Returns
+  -------
+  list
+    The sampled page numbers, in increasing order; every page
+    if the sample would be the whole document.
+  """
+
+  if pages is None:
+    pages = math.ceil(number_of_pages * percent / 100)
+
+  m = max(1, min(pages, number_of_pages))
+
+  if m == number_of_pages:
+    return list(range(0, number_of_pages))
+
+  rng = random.Random(seed)
+
+  sample = []
+  for k in range(0, m):
+    first = (k * number_of_pages) // m
+    last = ((k + 1) * number_of_pages) // m
+    sample.append(rng.randrange(first, last))
+
+  return sample
+
+
+###################################################################
+#
+# estimate:
+#
+# Confidence intervals from the per-page counts of a sample.
+#
+def estimate(page_counts, number_of_pages, confidence=0.95, reps=200, seed=""):
+  """
+  Estimates the first-digit frequencies and conformity of the
+  whole document from the sampled pages.
+
+  Parameters
+  ----------
+  page_counts : list
+    (page number, first-digit counts) for each sampled page, see
+    extraction.extract_pages().
+  number_of_pages : int
+    The number of pages in the document.
+  confidence : float
+    The confidence level of the intervals, e.g. 0.95.
+  reps : int
+    The number of bootstrap resamples for the MAD interval.
+  seed : str
+    Seeds the bootstrap, e.g. the bucket key of the document.
+
+  Returns
+  -------
+  dict
+    pages (sampled), of (document pages), confidence, digits (a
+    list of (digit, proportion, low, high) for digits 1..9) and
+    mad (mad, low, high). Bounds are None when they cannot be
+    estimated, e.g. when fewer than two pages are sampled.
+  """
+
+  m = len(page_counts)
+  counts = [[c[d] for d in range(1, 10)] for (page, c) in page_counts]
+  totals = [sum(c) for c in counts]
+  n = sum(totals)
+
+  z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+
+  #
+  # finite population correction: sampling every page leaves no
+  # sampling error
+  #
+  fpc = 1 - m / number_of_pages
+
+  digits = []
+  for d in range(0, 9):
+    if n == 0:
+      digits.append((d + 1, None, None, None))
+      continue
+
+    p = sum(c[d] for c in counts) / n
+
+    if m < 2:
+      digits.append((d + 1, p, None, None))
+      continue
+
+    mean_total = n / m
+    residuals = sum((c[d] - p * t) ** 2 for (c, t) in zip(counts, totals, strict=True))
+    variance = fpc * residuals / (m * (m - 1) * mean_total ** 2)
+    half = z * math.sqrt(max(variance, 0.0))
+
+    digits.append((d + 1, p, max(0.0, p - half), min(1.0, p + half)))
+
+  #
+  # bootstrap the MAD: resample pages with replacement
+  #
+  first = [0] + [sum(c[d] for c in counts) for d in range(0, 9)]
+  mad = benford.mean_absolute_deviation('first', first)
+
+  low = None
+  high = None
+
+  if mad is not None and m >= 2 and fpc > 0:
+    rng = random.Random(seed)
+    mads = []
+    for _ in range(0, reps):
+      resample = [0] * 10
+      for _ in range(0, m):
+        c = counts[rng.randrange(0, m)]
+        for d in range(0, 9):
+          resample[d + 1] += c[d]
+      value = benford.mean_absolute_deviation('first', resample)
+      if value is not None:
+        mads.append(value)
+
+    if len(mads) > 0:
+      mads.sort()
+      alpha = (1 - confidence) / 2
+      low = mads[int(alpha * (len(mads) - 1))]
+      high = mads[int(math.ceil((1 - alpha) * (len(mads) - 1)))]
+  elif mad is not None and fpc <= 0:
+    low = mad
+    high = mad
+
+  return {
+    'pages': m,
+    'of': number_of_pages,
+    'confidence': confidence,
+    'digits': digits,
+    'mad': (mad, low, high),
+  }
+
+
+###################################################################
+#
+# extract_sample:
+#
+# Tallies a sample of the pages of a PDF.
+#
+def extract_sample(source, sample, seed="", reps=200, workers=0, serial_threshold=16,
+                   backend=tally.DEFAULT_BACKEND, extractor=extraction.DEFAULT_EXTRACTOR,
+                   timings=None, memory=None, select=None, filters=None, page_counts=None):
+  """
+  Extracts and tallies a stratified random sample of the pages
+  of a PDF, and estimates the conformity of the whole document
+  (or of the selected pages).
+
+  Parameters
+  ----------
+  source : str or file-like
+    The PDF filename, or a binary stream of the PDF.
+  sample : dict
+    The sample option of the job, see joboptions.py.
+  seed : str
+    Seeds the sample, e.g. the bucket key of the document.
+  reps : int
+    The number of bootstrap resamples, see estimate().
+  workers, serial_threshold, backend, extractor, timings, memory
+    See extraction.extract_pages().
+  select, filters
+    See extraction.extract_counts_until(); the sample is drawn
+    from the selected pages.
+  page_counts : list
+    If given, (page number, first-digit counts) is appended to
+    it for each sampled page.
+
+  Returns
+  -------
+  tuple
+    (number of pages sampled from, histograms of the sampled
+    pages, estimates, see estimate()).
+  """
+
+  from pypdf import PdfReader
+
+  reader = PdfReader(source)
+
+  selected = range(0, len(reader.pages))
+  if select is not None:
+    selected = select(len(reader.pages))
+
+  number_of_pages = len(selected)
+
+  if number_of_pages == 0:
+    return (0, tally.new_histograms(), estimate([], 1, sample['confidence'], reps, seed))
+
+  positions = plan_sample(number_of_pages, sample.get('pages'), sample.get('percent'), seed)
+  pages = [selected[i] for i in positions]
+
+  print("**Sampling", len(pages), "of", number_of_pages, "pages**")
+
+  if page_counts is None:
+    page_counts = []
+
+  histograms = extraction.extract_pages(source, reader, pages, workers, serial_threshold,
+                                        backend, None, extractor, timings, memory, page_counts,
+                                        filters)
+
+  return (number_of_pages, histograms,
+          estimate(page_counts, number_of_pages, sample['confidence'], reps, seed))
+
+
+def _fmt(value, places):
+  return "None" if value is None else str(round(value, places))
+
+
+###################################################################
+#
+# format_sample:
+#
+# Builds the sample section of the results file.
+#
+def format_sample(sample):
+  """
+  Formats the estimates of a sample as a section appended to the
+  results file; the histograms above it count the sampled pages
+  only.
+
+  Parameters
+  ----------
+  sample : dict
+    The estimates, see estimate().
+
+  Returns
+  -------
+  str
+    The section text.
+  """
+
+  (mad, low, high) = sample['mad']
+
+  low_label = benford.conformity('first', low) if low is not None else None
+  high_label = benford.conformity('first', high) if high is not None else None
+
+  lines = ["**SAMPLE** pages=" + str(sample['pages']) +
+           " of=" + str(sample['of']) +
+           " confidence=" + str(sample['confidence'])]
+
+  lines.append("**FIRST DIGIT MAD** mad=" + _fmt(mad, 6) +
+               " low=" + _fmt(low, 6) +
+               " high=" + _fmt(high, 6) +
+               " conformity=" + str(low_label) + ".." + str(high_label))
+
+  lines.append("**FIRST DIGIT INTERVALS** digit proportion low high")
+  for (digit, p, lo, hi) in sample['digits']:
+    lines.append(str(digit) + " " + _fmt(p, 4) + " " + _fmt(lo, 4) + " " + _fmt(hi, 4))
+
+  return "\n".join(lines) + "\n"
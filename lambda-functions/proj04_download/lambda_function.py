@@ -1,46 +1,23 @@
 import json
-import boto3
-import os
 import base64
 import datatier
+import runtime
 import auth
 import api_utils
 
-from configparser import ConfigParser
+#
+# config.ini, the bucket and the database connection are set up
+# once per container, on first use, and reused by warm
+# invocations, see runtime.py
+#
+runtime.init(s3_profile='s3readonly')
 
 def lambda_handler(event, context):
   try:
     print("**STARTING**")
     print("**lambda: proj04_download**")
 
-    #
-    # setup AWS based on config file
-    #
-    config_file = 'config.ini'
-    os.environ['AWS_SHARED_CREDENTIALS_FILE'] = config_file
-    
-    configur = ConfigParser()
-    configur.read(config_file)
-    
-    #
-    # configure for S3 access
-    #
-    s3_profile = 's3readonly'
-    boto3.setup_default_session(profile_name=s3_profile)
-    
-    bucketname = configur.get('s3', 'bucket_name')
-    
-    s3 = boto3.resource('s3')
-    bucket = s3.Bucket(bucketname)
-    
-    #
-    # configure for RDS access
-    #
-    rds_endpoint = configur.get('rds', 'endpoint')
-    rds_portnum = int(configur.get('rds', 'port_number'))
-    rds_username = configur.get('rds', 'user_name')
-    rds_pwd = configur.get('rds', 'user_pwd')
-    rds_dbname = configur.get('rds', 'db_name')
+    runtime.start_invocation()
     
     #
     # jobid from event: could be a parameter
@@ -94,7 +71,7 @@ def lambda_handler(event, context):
     #
     print("**Opening connection**")
     
-    dbConn = datatier.get_dbConn(rds_endpoint, rds_portnum, rds_username, rds_pwd, rds_dbname)
+    dbConn = runtime.db_conn()
 
     #
     # first we need to make sure the userid is valid
@@ -133,6 +110,15 @@ def lambda_handler(event, context):
     if status == "pending":
       print("**Job status pending, returning...**")
       return api_utils.error(400, "job status is pending")
+
+    if status == "processing":
+      print("**Job status processing, returning...**")
+      return api_utils.error(400, "job status is processing")
+
+    #
+    # from here on we download the results
+    #
+    bucket = runtime.bucket()
       
     if status == 'error':
       #
@@ -1,57 +1,69 @@
-import json
-import os
 import datatier
+import runtime
 import api_utils
 
-from configparser import ConfigParser
+#
+# config.ini and the database connection are set up once per
+# container, on first use, and reused by warm invocations, see
+# runtime.py
+#
+runtime.init()
+
+#
+# the jobs table grows without bound, so it is returned a page at
+# a time: GET /jobs?limit=100&after=1100 returns up to limit jobs
+# with a jobid above after, in jobid order; a page shorter than
+# limit is the last
+#
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
 
 def lambda_handler(event, context):
   try:
     print("**STARTING**")
     print("**lambda: proj04_jobs**")
-    
-    #
-    # setup AWS based on config file
-    #
-    config_file = 'config.ini'
-    os.environ['AWS_SHARED_CREDENTIALS_FILE'] = config_file
-    
-    configur = ConfigParser()
-    configur.read(config_file)
-    
-    #
-    # configure for RDS access
-    #
-    rds_endpoint = configur.get('rds', 'endpoint')
-    rds_portnum = int(configur.get('rds', 'port_number'))
-    rds_username = configur.get('rds', 'user_name')
-    rds_pwd = configur.get('rds', 'user_pwd')
-    rds_dbname = configur.get('rds', 'db_name')
 
+    runtime.start_invocation()
+
+    params = event.get("queryStringParameters") or {}
+
+    try:
+      limit = int(params.get("limit", DEFAULT_LIMIT))
+      after = int(params.get("after", 0))
+    except ValueError:
+      return api_utils.error(400, "limit and after must be integers")
+
+    if limit < 1 or limit > MAX_LIMIT:
+      return api_utils.error(400, "limit must be between 1 and " + str(MAX_LIMIT))
+
+    print("limit:", limit)
+    print("after:", after)
+    
     #
     # open connection to the database
     #
     print("**Opening connection**")
     
-    dbConn = datatier.get_dbConn(rds_endpoint, rds_portnum, rds_username, rds_pwd, rds_dbname)
+    dbConn = runtime.db_conn()
     
     #
-    # now retrieve all the jobs
+    # now retrieve the page of jobs; LIMIT bounds it, so it is
+    # read in one go. Only the columns clients see are selected
     #
     print("**Retrieving data**")
     
-    sql = "SELECT * FROM jobs ORDER BY jobid";
-    
-    rows = datatier.retrieve_all_rows(dbConn, sql)
+    sql = """
+      SELECT jobid, userid, status, originaldatafile, datafilekey, resultsfilekey
+      FROM jobs WHERE jobid > %s ORDER BY jobid LIMIT %s;
+    """
     
-    for row in rows:
-      print(row)
+    rows = datatier.retrieve_all_rows(dbConn, sql, [after, limit])
 
     #
     # respond in an HTTP-like way, i.e. with a status
     # code and body in JSON format
     #
-    print("**DONE, returning rows**")
+    print("**DONE, returning", len(rows), "rows**")
     
     return api_utils.success(200, rows)
     
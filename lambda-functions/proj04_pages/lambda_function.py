@@ -0,0 +1,167 @@
+#
+# Drill-down into the pages of a completed job: scores each page
+# against Benford's Law from the page matrix stored by
+# proj04_compute (see pagematrix.py), and returns the pages ranked
+# worst-first, so an anomaly can be localized without re-parsing
+# the document.
+#
+# GET /pages/{jobid}?limit=20&min_numbers=10
+#
+
+import datatier
+import runtime
+import auth
+import api_utils
+import pagematrix
+import tabular
+
+#
+# config.ini, the bucket and the database connection are set up
+# once per container, on first use, and reused by warm
+# invocations, see runtime.py
+#
+runtime.init(s3_profile='s3readonly')
+
+
+#
+# defaults for the query string parameters
+#
+DEFAULT_LIMIT = 20
+DEFAULT_MIN_NUMBERS = 10
+
+
+def lambda_handler(event, context):
+  try:
+    print("**STARTING**")
+    print("**lambda: proj04_pages**")
+
+    runtime.start_invocation()
+
+    #
+    # jobid from event: could be a parameter
+    # or could be part of URL path ("pathParameters")
+    #
+    if "jobid" in event:
+      jobid = event["jobid"]
+    elif "pathParameters" in event:
+      if "jobid" in event["pathParameters"]:
+        jobid = event["pathParameters"]["jobid"]
+      else:
+        return api_utils.error(400, "no jobid in pathParameters")
+    else:
+      return api_utils.error(400, "no jobid in event")
+
+    print("jobid:", jobid)
+
+    #
+    # how many pages to return, and how many numbers a page
+    # needs to be scored at all
+    #
+    params = event.get("queryStringParameters") or {}
+
+    try:
+      limit = int(params.get("limit", DEFAULT_LIMIT))
+      min_numbers = int(params.get("min_numbers", DEFAULT_MIN_NUMBERS))
+    except ValueError:
+      return api_utils.error(400, "limit and min_numbers must be integers")
+
+    if limit < 1:
+      return api_utils.error(400, "limit must be at least 1")
+
+    print("limit:", limit)
+    print("min_numbers:", min_numbers)
+
+    #
+    # get the access token from the request headers,
+    # then get the user ID from the token
+    #
+    print("**Accessing request headers to get authenticated user info**")
+
+    if "headers" not in event:
+      return api_utils.error(400, "no headers in request")
+
+    headers = event["headers"]
+
+    token = auth.get_token_from_header(headers)
+    if token is None:
+      return api_utils.error(401, "no bearer token in headers")
+
+    try:
+      userid = auth.get_user_from_token(token, secret="abc")
+    except Exception:
+      return api_utils.error(401, "invalid access token")
+
+    print("userid:", userid)
+
+    #
+    # open connection to the database
+    #
+    print("**Opening connection**")
+
+    dbConn = runtime.db_conn()
+
+    #
+    # does the jobid exist? is it owned by the user? has it
+    # completed?
+    #
+    print("**Checking jobid status**")
+
+    sql = "SELECT userid, status, datafilekey FROM jobs WHERE jobid = %s;"
+
+    row = datatier.retrieve_one_row(dbConn, sql, [jobid])
+
+    if row == ():  # no such job
+      print("**No such job, returning...**")
+      return api_utils.error(404, "no such job")
+
+    (job_owner_userid, status, datafilekey) = row
+
+    print("job_owner_userid:", job_owner_userid)
+    print("status:", status)
+    print("data file key:", datafilekey)
+
+    if userid != job_owner_userid:
+      return api_utils.error(403, "job does not belong to user")
+
+    if status != "completed":
+      print("**Job not completed, returning...**")
+      return api_utils.error(400, "job status is " + status)
+
+    #
+    # read the page matrix and score the pages
+    #
+    print("**Reading page matrix from S3**")
+
+    bucket = runtime.bucket()
+
+    try:
+      (pages, matrix, number_of_pages) = pagematrix.read_matrix(bucket, datafilekey)
+    except pagematrix.MatrixNotFound as err:
+      print("**No page matrix:", str(err), "**")
+      return api_utils.error(404, "no per-page counts for this job")
+
+    print("pages with numbers:", len(pages), "of", number_of_pages)
+
+    scores = pagematrix.score_pages(pages, matrix, min_numbers)
+
+    #
+    # for a table, a "page" is a block of rows, and its number
+    # the first row of the block
+    #
+    unit = tabular.unit_of(datafilekey)
+
+    print("**DONE, returning", min(limit, len(scores)), "of", len(scores), "scored pages**")
+
+    return api_utils.success(200, {
+      'jobid': int(jobid),
+      'unit': unit,
+      'pages': number_of_pages,
+      'scored': len(scores),
+      'worst': scores[0:limit],
+    })
+
+  except Exception as err:
+    print("**ERROR**")
+    print(str(err))
+
+    return api_utils.error(500, str(err))
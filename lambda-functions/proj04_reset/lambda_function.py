@@ -1,105 +1,79 @@
-import json
-import os
 import datatier
+import runtime
 import api_utils
 
-from configparser import ConfigParser
+#
+# config.ini and the database connection are set up once per
+# container, on first use, and reused by warm invocations, see
+# runtime.py
+#
+runtime.init()
 
 def lambda_handler(event, context):
   try:
     print("**STARTING**")
     print("**lambda: proj04_reset**")
-    
-    #
-    # setup AWS based on config file
-    #
-    config_file = 'config.ini'
-    os.environ['AWS_SHARED_CREDENTIALS_FILE'] = config_file
-    
-    configur = ConfigParser()
-    configur.read(config_file)
-    
-    #
-    # configure for RDS access
-    #
-    rds_endpoint = configur.get('rds', 'endpoint')
-    rds_portnum = int(configur.get('rds', 'port_number'))
-    rds_username = configur.get('rds', 'user_name')
-    rds_pwd = configur.get('rds', 'user_pwd')
-    rds_dbname = configur.get('rds', 'db_name')
 
+    runtime.start_invocation()
+    
     #
     # open connection to the database
     #
     print("**Opening connection**")
     
-    dbConn = datatier.get_dbConn(rds_endpoint, rds_portnum, rds_username, rds_pwd, rds_dbname)
+    dbConn = runtime.db_conn()
     
     #
-    # delete all rows from jobs and users
+    # delete all rows from jobs and users, clear the results
+    # cache, and restart the ids, in one batch with a single
+    # commit rather than a round trip and a commit per
+    # statement. TRUNCATE and ALTER commit implicitly, so this
+    # is not atomic: a failure part way leaves the tables
+    # partly reset, and the reset can simply be run again.
     #
-    print("**Deleting jobs**")
-    
-    sql = "SET FOREIGN_KEY_CHECKS = 0;"
-    
-    datatier.perform_action(dbConn, sql)
-    
-    sql = "TRUNCATE TABLE jobs";
-    
-    datatier.perform_action(dbConn, sql)
-    
-    print("**Deleting users**")
-    
-    sql = "TRUNCATE TABLE users";
-    
-    datatier.perform_action(dbConn, sql)
-    
-    sql = "SET FOREIGN_KEY_CHECKS = 1;"
-    
-    datatier.perform_action(dbConn, sql)
-    
-    sql = "ALTER TABLE users AUTO_INCREMENT = 80001;"
-    
-    datatier.perform_action(dbConn, sql)
-    
-    sql = "ALTER TABLE jobs AUTO_INCREMENT = 1001;"
-    
-    datatier.perform_action(dbConn, sql)
-    
+    # The connection is reused by later invocations, so the
+    # foreign key checks are turned back on whatever happens
     #
-    # let's add the 3 users back
+    print("**Deleting jobs and users, clearing results cache**")
+
+    statements = [
+      "TRUNCATE TABLE jobs;",
+      "TRUNCATE TABLE users;",
+      "TRUNCATE TABLE resultcache;",
+      "UPDATE cachestats SET value = 0;",
+      "ALTER TABLE users AUTO_INCREMENT = 80001;",
+      "ALTER TABLE jobs AUTO_INCREMENT = 1001;",
+    ]
+
+    datatier.perform_action(dbConn, "SET FOREIGN_KEY_CHECKS = 0;")
+
+    try:
+      (rowcounts, elapsed) = datatier.perform_batch(dbConn, statements)
+    finally:
+      datatier.perform_action(dbConn, "SET FOREIGN_KEY_CHECKS = 1;")
+
+    print("rows modified:", rowcounts, "in", round(elapsed, 4), "secs")
+
     #
-    #INSERT INTO users(username, pwdhash)  -- pwd = abc123!!
-    #        values('p_sarkar', '$2y$10$/8B5evVyaHF.hxVx0i6dUe2JpW89EZno/VISnsiD1xSh6ZQsNMtXK');
+    # let's add the 3 users back, in one multi-row insert:
     #
-    #INSERT INTO users(username, pwdhash)  -- pwd = abc456!!
-    #        values('e_ricci', '$2y$10$F.FBSF4zlas/RpHAxqsuF.YbryKNr53AcKBR3CbP2KsgZyMxOI2z2');
+    #   p_sarkar  -- pwd = abc123!!
+    #   e_ricci   -- pwd = abc456!!
+    #   l_chen    -- pwd = abc789!!
     #
-    #INSERT INTO users(username, pwdhash)  -- pwd = abc789!!
-    #        values('l_chen', '$2y$10$GmIzRsGKP7bd9MqH.mErmuKvZQ013kPfkKbeUAHxar5bn1vu9.sdK');
-    
     print("**Inserting 3 users back into database...")
-    
-    sql = """
-      INSERT INTO users(username, pwdhash)
-             values('p_sarkar', '$2y$10$/8B5evVyaHF.hxVx0i6dUe2JpW89EZno/VISnsiD1xSh6ZQsNMtXK');
-    """
-    
-    datatier.perform_action(dbConn, sql)
 
-    sql = """
-      INSERT INTO users(username, pwdhash)
-             values('e_ricci', '$2y$10$F.FBSF4zlas/RpHAxqsuF.YbryKNr53AcKBR3CbP2KsgZyMxOI2z2');
-    """
-    
-    datatier.perform_action(dbConn, sql)
-    
-    sql = """
-      INSERT INTO users(username, pwdhash)
-             values('l_chen', '$2y$10$GmIzRsGKP7bd9MqH.mErmuKvZQ013kPfkKbeUAHxar5bn1vu9.sdK');
-    """
-    
-    datatier.perform_action(dbConn, sql)
+    sql = "INSERT INTO users(username, pwdhash) VALUES(%s, %s);"
+
+    users = [
+      ['p_sarkar', '$2y$10$/8B5evVyaHF.hxVx0i6dUe2JpW89EZno/VISnsiD1xSh6ZQsNMtXK'],
+      ['e_ricci', '$2y$10$F.FBSF4zlas/RpHAxqsuF.YbryKNr53AcKBR3CbP2KsgZyMxOI2z2'],
+      ['l_chen', '$2y$10$GmIzRsGKP7bd9MqH.mErmuKvZQ013kPfkKbeUAHxar5bn1vu9.sdK'],
+    ]
+
+    (inserted, elapsed) = datatier.perform_bulk_action(dbConn, sql, users)
+
+    print("users inserted:", inserted, "in", round(elapsed, 4), "secs")
 
     #
     # respond in an HTTP-like way, i.e. with a status
@@ -0,0 +1,358 @@
+#
+# inline.py
+#
+# Inline compute for small uploads. Rather than waiting for the S3
+# event, a cold start of proj04_compute and then polling /download,
+# a document below the thresholds of the [inline] section of
+# config.ini is tallied right here, with the same engine (the
+# shared modules of the layer, see lambda-functions/layer), and its
+# results returned with the upload.
+#
+# The job is created in the processing state, and completed with
+# its computedinline flag set, so when the upload of the document
+# triggers proj04_compute anyway, the function skips it without
+# counting a duplicate (see proj04_compute/jobclaim.py). Should
+# the inline compute fail, the job is put back to pending before
+# the document is uploaded, and proj04_compute processes it as
+# usual.
+#
+# Inline jobs share the results cache with proj04_compute (see
+# resultcache.py): a document already analyzed is not tallied
+# again, and the results of one tallied here are cached.
+#
+
+import io
+import types
+
+import benford
+import datatier
+import extraction
+import joboptions
+import numstore
+import pagematrix
+import resultcache
+import tabular
+
+
+###################################################################
+#
+# read_settings:
+#
+# Reads the inline compute settings from config.ini.
+#
+def read_settings(configur):
+  """
+  Reads the thresholds and the engine settings; the engine
+  settings must match those of proj04_compute, so a job's results
+  do not depend on where it was computed.
+
+  Parameters
+  ----------
+  configur : ConfigParser
+    The parsed config.ini.
+
+  Returns
+  -------
+  SimpleNamespace
+    The settings.
+  """
+
+  settings = types.SimpleNamespace()
+
+  settings.enabled = configur.getboolean('inline', 'enabled', fallback=False)
+  settings.max_bytes = configur.getint('inline', 'max_bytes', fallback=1024 * 1024)
+  settings.max_pages = configur.getint('inline', 'max_pages', fallback=10)
+
+  settings.tally_backend = configur.get('compute', 'tally_backend', fallback='regex')
+  number_locale = configur.get('compute', 'number_locale', fallback='en')
+
+  if settings.tally_backend == 'tokens' and number_locale != 'en':
+    settings.tally_backend = 'tokens-' + number_locale
+
+  settings.text_extractor = configur.get('compute', 'extractor', fallback='layout')
+  settings.numstore_enabled = configur.getboolean('numstore', 'enabled', fallback=False)
+  settings.pagematrix_enabled = configur.getboolean('pagematrix', 'enabled', fallback=False)
+
+  settings.cache_enabled = configur.getboolean('cache', 'enabled', fallback=False)
+  settings.cache_max_age_days = configur.getint('cache', 'max_age_days', fallback=30)
+  settings.cache_variant = resultcache.variant_of(settings.text_extractor, settings.tally_backend)
+
+  return settings
+
+
+###################################################################
+#
+# is_candidate:
+#
+# Whether an upload is small enough to try computing inline.
+#
+def is_candidate(size, options, settings):
+  """
+  Checks an upload against the size threshold; the page count
+  of a PDF is checked by compute(). Sampled jobs are left to
+  proj04_compute.
+
+  Parameters
+  ----------
+  size : int
+    The size of the uploaded file, in bytes.
+  options : dict
+    The job's options, see joboptions.py.
+  settings : SimpleNamespace
+    See read_settings().
+
+  Returns
+  -------
+  bool
+    True if the upload may be computed inline.
+  """
+
+  return settings.enabled and size <= settings.max_bytes and 'sample' not in options
+
+
+###################################################################
+#
+# compute:
+#
+# Tallies a small upload in-process.
+#
+def compute(data, bucketkey, options, settings):
+  """
+  Tallies an uploaded file the way proj04_compute would.
+
+  Parameters
+  ----------
+  data : bytes
+    The contents of the file.
+  bucketkey : str
+    Its bucket key; the extension gives the kind of file.
+  options : dict
+    The job's options, see joboptions.py.
+  settings : SimpleNamespace
+    See read_settings().
+
+  Returns
+  -------
+  tuple
+    (number of pages or rows, histograms, results file text,
+    numbers or None, per-page counts or None), or None if a PDF
+    has more than max_pages pages.
+  """
+
+  source = io.BytesIO(data)
+  kind = tabular.kind_of(bucketkey)
+  filters = joboptions.tally_filters(options)
+  numbers = numstore.Numbers() if settings.numstore_enabled else None
+  page_counts = [] if settings.pagematrix_enabled else None
+
+  if kind is not None:
+    (number_of_pages, histograms) = tabular.count_document(source, kind,
+                                                           columns=options.get('columns'),
+                                                           backend=settings.tally_backend,
+                                                           numbers=numbers,
+                                                           filters=filters,
+                                                           page_counts=page_counts)
+  else:
+    from pypdf import PdfReader
+
+    reader = PdfReader(source)
+
+    if len(reader.pages) > settings.max_pages:
+      return None
+
+    pages = joboptions.select_pages(options, len(reader.pages))
+    number_of_pages = len(pages)
+
+    histograms = extraction.count_pages(reader, pages,
+                                        backend=settings.tally_backend,
+                                        numbers=numbers,
+                                        extractor=settings.text_extractor,
+                                        page_counts=page_counts,
+                                        filters=filters)
+
+  results = benford.format_results(number_of_pages, histograms, options.get('tests'),
+                                   tabular.unit_of(bucketkey))
+
+  return (number_of_pages, histograms, results, numbers, page_counts)
+
+
+###################################################################
+#
+# from_cache:
+#
+# Completes a job from the results of a byte-identical upload.
+#
+def from_cache(bucket, bucketkey, cached, settings):
+  """
+  Copies cached results (and number store and page matrix) to a
+  job, see resultcache.py.
+
+  Parameters
+  ----------
+  bucket : s3.Bucket
+    The bucket holding the results.
+  bucketkey : str
+    The bucket key of the upload.
+  cached : tuple
+    (resultsfilekey, datafilekey) of the cached job, see
+    resultcache.lookup().
+  settings : SimpleNamespace
+    See read_settings().
+
+  Returns
+  -------
+  str
+    The results file.
+  """
+
+  (cached_key, cached_datafilekey) = cached
+
+  print("**CACHE HIT, copying", cached_key, "**")
+
+  bucketkey_results_file = tabular.results_key(bucketkey)
+
+  resultcache.copy_results(bucket, cached_key, bucketkey_results_file)
+
+  #
+  # as in proj04_compute, a missing store or matrix does not
+  # fail the job
+  #
+  if cached_datafilekey != "":
+    if settings.numstore_enabled:
+      try:
+        numstore.copy_store(bucket, cached_datafilekey, bucketkey)
+      except Exception as err:
+        print("**Number store not copied:", str(err), "**")
+
+    if settings.pagematrix_enabled:
+      try:
+        pagematrix.copy_matrix(bucket, cached_datafilekey, bucketkey)
+      except Exception as err:
+        print("**Page matrix not copied:", str(err), "**")
+
+  body = bucket.Object(bucketkey_results_file).get()['Body']
+  results = body.read().decode('utf-8')
+  body.close()
+
+  return results
+
+
+def _complete(dbConn, jobid, bucketkey_results_file):
+  sql = """
+    UPDATE jobs
+    SET status = 'completed', resultsfilekey = %s, computedinline = true
+    WHERE jobid = %s;
+  """
+
+  datatier.perform_action(dbConn, sql, [bucketkey_results_file, jobid])
+
+
+###################################################################
+#
+# run:
+#
+# Computes a job inline, and completes it.
+#
+def run(bucket, dbConn, jobid, bucketkey, data, options, settings):
+  """
+  Computes a small upload, or copies the results of an identical
+  one from the cache, writes its results (and number store and
+  page matrix) to S3 and marks its job completed. Call before
+  the upload itself is written to S3. If the file turns out to
+  be too large, or anything fails, the job is put back to
+  pending, for proj04_compute.
+
+  Parameters
+  ----------
+  bucket : s3.Bucket
+    The bucket to write to.
+  dbConn : the database connection
+  jobid : int
+    The job, created in the processing state.
+  bucketkey : str
+    The bucket key of the upload.
+  data : bytes
+    The contents of the upload.
+  options : dict
+    The job's options, see joboptions.py.
+  settings : SimpleNamespace
+    See read_settings().
+
+  Returns
+  -------
+  dict
+    The results to add to the upload response: status, pages
+    (or rows, for a table), histogram (first-digit counts) and
+    results (the results file); from the cache, status, cached
+    and results alone. None if the job was left to
+    proj04_compute.
+  """
+
+  try:
+    digest = None
+    cache_variant = settings.cache_variant + joboptions.cache_suffix(options)
+
+    if settings.cache_enabled:
+      digest = resultcache.digest_of(io.BytesIO(data))
+      print("digest:", digest)
+
+      cached = resultcache.lookup(dbConn, digest, cache_variant, settings.cache_max_age_days)
+
+      if cached is not None:
+        try:
+          results = from_cache(bucket, bucketkey, cached, settings)
+
+          _complete(dbConn, jobid, tabular.results_key(bucketkey))
+
+          return {
+            'status': 'completed',
+            'cached': True,
+            'results': results,
+          }
+        except Exception as err:
+          print("**Cached results unavailable, recomputing:", str(err), "**")
+          resultcache.forget(dbConn, digest, cache_variant)
+
+    computed = compute(data, bucketkey, options, settings)
+
+    if computed is not None:
+      (number_of_pages, histograms, results, numbers, page_counts) = computed
+
+      print("**Computed inline:", number_of_pages, tabular.unit_of(bucketkey), "**")
+
+      bucketkey_results_file = tabular.results_key(bucketkey)
+
+      if numbers is not None:
+        numstore.write_part(bucket, bucketkey, numbers, number_of_pages, 0, number_of_pages)
+
+      if page_counts is not None:
+        pagematrix.write_part(bucket, bucketkey, page_counts, number_of_pages, 0, number_of_pages)
+
+      bucket.put_object(Key=bucketkey_results_file,
+                        Body=results.encode('utf-8'),
+                        ACL='public-read',
+                        ContentType='text/plain')
+
+      if digest is not None:
+        resultcache.store(dbConn, digest, bucketkey_results_file, bucketkey, cache_variant,
+                          settings.cache_max_age_days)
+
+      _complete(dbConn, jobid, bucketkey_results_file)
+
+      return {
+        'status': 'completed',
+        tabular.unit_of(bucketkey): number_of_pages,
+        'histogram': histograms['first'],
+        'results': results,
+      }
+
+    print("**Too many pages to compute inline**")
+
+  except Exception as err:
+    print("**Inline compute failed, leaving the job to proj04_compute:", str(err), "**")
+
+  sql = "UPDATE jobs SET status = 'pending' WHERE jobid = %s;"
+
+  datatier.perform_action(dbConn, sql, [jobid])
+
+  return None
@@ -1,48 +1,44 @@
 import json
-import boto3
-import os
 import uuid
 import base64
 import pathlib
 import datatier
+import runtime
+import inline
+import joboptions
 import auth
 import api_utils
 
-from configparser import ConfigParser
+#
+# config.ini, the bucket and the database connection are set up
+# once per container, on first use, and reused by warm
+# invocations, see runtime.py
+#
+runtime.init(s3_profile='s3readwrite')
+
+#
+# the kinds of file we analyze, and their content types: PDFs, and
+# data already in text form (see proj04_compute/tabular.py)
+#
+CONTENT_TYPES = {
+  '.pdf': 'application/pdf',
+  '.csv': 'text/csv',
+  '.tsv': 'text/tab-separated-values',
+  '.txt': 'text/plain',
+}
 
 def lambda_handler(event, context):
   try:
     print("**STARTING**")
     print("**lambda: proj04_upload**")
     
+    runtime.start_invocation()
+
     #
-    # setup AWS based on config file
-    #
-    config_file = 'config.ini'
-    os.environ['AWS_SHARED_CREDENTIALS_FILE'] = config_file
-    
-    configur = ConfigParser()
-    configur.read(config_file)
-    
-    #
-    # configure for S3 access
-    #
-    s3_profile = 's3readwrite'
-    boto3.setup_default_session(profile_name=s3_profile)
-    
-    bucketname = configur.get('s3', 'bucket_name')
-    
-    s3 = boto3.resource('s3')
-    bucket = s3.Bucket(bucketname)
-    
-    #
-    # configure for RDS access
+    # small uploads are computed here rather than by proj04_compute,
+    # see inline.py
     #
-    rds_endpoint = configur.get('rds', 'endpoint')
-    rds_portnum = int(configur.get('rds', 'port_number'))
-    rds_username = configur.get('rds', 'user_name')
-    rds_pwd = configur.get('rds', 'user_pwd')
-    rds_dbname = configur.get('rds', 'db_name')
+    inline_settings = inline.read_settings(runtime.config())
 
     #
     # get the access token from the request headers,
@@ -75,6 +71,7 @@ def lambda_handler(event, context):
     # the user has sent us two parameters:
     #  1. filename of their file
     #  2. raw file data in base64 encoded string
+    # and optionally the analysis options, see joboptions.py
     #
     # The parameters are coming through web server 
     # (or API Gateway) in the body of the request
@@ -94,16 +91,22 @@ def lambda_handler(event, context):
 
     filename = body["filename"]
     datastr = body["data"]
+
+    try:
+      options = joboptions.validate(body.get("options"))
+    except ValueError as err:
+      return api_utils.error(400, str(err))
     
     print("filename:", filename)
     print("datastr (first 10 chars):", datastr[0:10])
+    print("options:", options)
 
     #
     # open connection to the database
     #
     print("**Opening connection**")
     
-    dbConn = datatier.get_dbConn(rds_endpoint, rds_portnum, rds_username, rds_pwd, rds_dbname)
+    dbConn = runtime.db_conn()
 
     #
     # first we need to make sure the userid is valid
@@ -128,12 +131,23 @@ def lambda_handler(event, context):
     base64_bytes = datastr.encode()        # string -> base64 bytes
     bytes = base64.b64decode(base64_bytes) # base64 bytes -> raw bytes
     
+    basename = pathlib.Path(filename).stem
+    extension = pathlib.Path(filename).suffix.lower()
+    
+    if extension not in CONTENT_TYPES: 
+      return api_utils.error(400, "expecting filename to have .pdf, .csv, .tsv or .txt extension")
+
+    try:
+      joboptions.check_file_options(options, extension)
+    except ValueError as err:
+      return api_utils.error(400, str(err))
+    
     #
     # write raw bytes to local filesystem for upload
     #
     print("**Writing local data file**")
     
-    local_filename = "/tmp/data.pdf"
+    local_filename = "/tmp/data" + extension
     
     outfile = open(local_filename, "wb")
     outfile.write(bytes)
@@ -144,29 +158,29 @@ def lambda_handler(event, context):
     #
     print("**Uploading local file to S3**")
     
-    basename = pathlib.Path(filename).stem
-    extension = pathlib.Path(filename).suffix
-    
-    if extension != ".pdf" : 
-      return api_utils.error(400, "expecting filename to have .pdf extension")
-    
-    bucketkey = "benfordapp/" + username + "/" + basename + "-" + str(uuid.uuid4()) + ".pdf"
+    bucketkey = "benfordapp/" + username + "/" + basename + "-" + str(uuid.uuid4()) + extension
     
     print("S3 bucketkey:", bucketkey)
     
     #
     # add a jobs record to the database BEFORE we upload, just in case
     # the compute function is triggered faster than we can update the
-    # database
+    # database. A job we will compute inline starts out processing,
+    # claimed now (see proj04_compute/jobclaim.py), so the compute
+    # function leaves it be
     #
     print("**Adding jobs row to database**")
     
+    computing_inline = inline.is_candidate(len(bytes), options, inline_settings)
+    
     sql = """
-      INSERT INTO jobs(userid, status, originaldatafile, datafilekey, resultsfilekey)
-                  VALUES(%s, 'pending', %s, %s, '');
+      INSERT INTO jobs(userid, status, originaldatafile, datafilekey, resultsfilekey, options, claimedat)
+                  VALUES(%s, %s, %s, %s, '', %s, NOW());
     """
     
-    datatier.perform_action(dbConn, sql, [userid, filename, bucketkey])
+    status = 'processing' if computing_inline else 'pending'
+    
+    datatier.perform_action(dbConn, sql, [userid, status, filename, bucketkey, joboptions.encode(options)])
     
     #
     # grab the jobid that was auto-generated by mysql
@@ -179,6 +193,19 @@ def lambda_handler(event, context):
     
     print("jobid:", jobid)
     
+    bucket = runtime.bucket()
+    
+    #
+    # compute small uploads now, before the upload triggers the
+    # compute function
+    #
+    computed = None
+    
+    if computing_inline:
+      print("**Computing inline**")
+      
+      computed = inline.run(bucket, dbConn, jobid, bucketkey, bytes, options, inline_settings)
+    
     #
     # finally, upload to S3
     #
@@ -188,7 +215,7 @@ def lambda_handler(event, context):
                        bucketkey, 
                        ExtraArgs={
                          'ACL': 'public-read',
-                         'ContentType': 'application/pdf'
+                         'ContentType': CONTENT_TYPES[extension]
                        })
 
     #
@@ -197,7 +224,12 @@ def lambda_handler(event, context):
     #
     print("**DONE, returning jobid**")
 
-    return api_utils.success(200, {'jobid': jobid})
+    response = {'jobid': jobid}
+    
+    if computed is not None:
+      response.update(computed)
+
+    return api_utils.success(200, response)
     
   except Exception as err:
     print("**ERROR**")
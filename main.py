@@ -159,6 +159,8 @@ def prompt():
   print("")
   print("   8 => log out all")
   print("   9 => reset users and jobs")
+  print("")
+  print("  10 => pages that deviate most")
 
   cmd = input()
 
@@ -411,31 +413,42 @@ def get_jobs(baseurl):
   """
 
   #
-  # call the web service:
+  # call the web service, a page of jobs at a time; a page
+  # shorter than the limit is the last:
   #
   api = '/jobs'
   url = baseurl + api
 
-  res = requests.get(url)
-
-  #
-  # let's look at what we got back:
-  #
-  if not res.ok:
-    handle_error(url, res)
-    return
+  limit = 100
+  after = 0
 
-  #
-  # deserialize and extract jobs:
-  #
-  body = res.json()
-  #
-  # let's map each row into an Job object:
-  #
   jobs = []
-  for row in body:
-    job = Job(row)
-    jobs.append(job)
+
+  while True:
+    res = requests.get(url, params={'limit': limit, 'after': after})
+
+    #
+    # let's look at what we got back:
+    #
+    if not res.ok:
+      handle_error(url, res)
+      return
+
+    #
+    # deserialize and extract jobs:
+    #
+    body = res.json()
+    #
+    # let's map each row into an Job object:
+    #
+    for row in body:
+      job = Job(row)
+      jobs.append(job)
+
+    if len(body) < limit:
+      break
+
+    after = jobs[-1].jobid
   #
   # Now we can think OOP:
   #
@@ -461,7 +474,8 @@ def get_jobs(baseurl):
 def upload(baseurl):
   """
   Prompts the user for a local filename, and uploads that
-  asset (PDF) to S3 for processing as an authenticated user.
+  asset (PDF, or CSV / TSV / text data) to S3 for processing
+  as an authenticated user.
 
   Parameters
   ----------
@@ -480,13 +494,15 @@ def upload(baseurl):
 
   print("Uploading as user:", username)
 
-  print("Enter PDF filename>")
+  print("Enter PDF, CSV, TSV or TXT filename>")
   local_filename = input()
 
   if not pathlib.Path(local_filename).is_file():
-    print("PDF file '", local_filename, "' does not exist...")
+    print("File '", local_filename, "' does not exist...")
     return
 
+  extension = pathlib.Path(local_filename).suffix.lower()
+
   #
   # build the data packet:
   #
@@ -505,6 +521,46 @@ def upload(baseurl):
 
   data = {"filename": local_filename, "data": datastr}
 
+  if extension in (".csv", ".tsv"):
+    #
+    # optionally tally only some columns:
+    #
+    print("Columns to analyze (e.g. Amount,Total), or ENTER for every column>")
+    columns = input().strip()
+
+    if columns != "":
+      data["options"] = {"columns": [name.strip() for name in columns.split(",")]}
+
+  elif extension == ".pdf":
+    #
+    # optionally analyze only some pages, e.g. to skip the
+    # cover pages and appendices:
+    #
+    print("Pages to analyze (e.g. 3-40,52), or ENTER for every page>")
+    pages = input().strip()
+
+    if pages != "":
+      data["options"] = {"pages": pages}
+
+    #
+    # optionally analyze a sample of the pages, for a quick
+    # estimate on long documents:
+    #
+    print("Pages to sample (e.g. 200 or 5%), or ENTER for every page>")
+    s = input().strip()
+
+    if s != "":
+      try:
+        if s.endswith("%"):
+          sample = {"percent": float(s[:-1])}
+        else:
+          sample = {"pages": int(s)}
+      except ValueError:
+        print("Invalid sample size '", s, "'...")
+        return
+
+      data.setdefault("options", {})["sample"] = sample
+
   #
   # call the web service:
   #
@@ -530,6 +586,14 @@ def upload(baseurl):
   jobid = body["jobid"]
 
   print("PDF uploaded, job id =", jobid)
+
+  #
+  # small files are analyzed as part of the upload:
+  #
+  if body.get("status") == "completed":
+    print()
+    print(body["results"])
+
   return
 
 
@@ -594,6 +658,71 @@ def download(baseurl):
   return
 
 
+############################################################
+#
+# worst_pages
+#
+def worst_pages(baseurl):
+  """
+  Prompts the user for the job id, and lists the pages
+  of its document that deviate most from Benford's Law.
+
+  Job must belong to the authenticated user.
+
+  Parameters
+  ----------
+  baseurl: baseurl for web service
+
+  Returns
+  -------
+  nothing
+  """
+
+  username, token = get_active_session()
+
+  if username is None:
+    print("No active session...")
+    return
+
+  print("Enter job id>")
+  jobid = input()
+
+  print("Enter the number of pages to list (default 20)>")
+  limit = input()
+
+  #
+  # call the web service:
+  #
+  api = '/pages'
+  url = baseurl + api + '/' + jobid
+
+  params = {}
+  if limit != "":
+    params["limit"] = limit
+
+  res = requests.get(url, params=params, headers={"Authorization": "Bearer " + token})
+
+  #
+  # let's look at what we got back:
+  #
+  if not res.ok:
+    handle_error(url, res)
+    return
+
+  body = res.json()
+
+  print(body["scored"], "of", body["pages"], body["unit"], "scored, worst first:")
+
+  for page in body["worst"]:
+    print(" ", body["unit"][0:-1], page["page"],
+          ": n =", page["n"],
+          ", chi2 =", page["chi_square"],
+          ", mad =", page["mad"],
+          ",", page["conformity"])
+
+  return
+
+
 ############################################################
 #
 # reset_sessions
@@ -734,7 +863,7 @@ try:
 
   fns = [
       None, get_users, add_user, login, switch_user, get_jobs, upload,
-      download, reset_sessions, reset_everything
+      download, reset_sessions, reset_everything, worst_pages
   ]
 
   try:
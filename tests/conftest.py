@@ -0,0 +1,16 @@
+#
+# conftest.py
+#
+# Puts the shared layer (see lambda-functions/layer) and the
+# modules of proj04_compute on the path, as Lambda does. The
+# stand-ins for the database and S3 are in fakes.py.
+#
+
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+for folder in [os.path.join("lambda-functions", "proj04_compute"),
+               os.path.join("lambda-functions", "layer", "python")]:
+  sys.path.insert(0, os.path.abspath(os.path.join(ROOT, folder)))
@@ -0,0 +1,316 @@
+#
+# fakes.py
+#
+# Stand-ins for the database and S3, for the tests:
+#
+#   SnapshotConnection - a pymysql-like connection over a sqlite3
+#                        database file; the MySQL-isms the functions
+#                        use (%s parameters, NOW(), INTERVAL) are
+#                        translated, datetime columns come back as
+#                        datetime.datetime, and transactions read a
+#                        snapshot, as under InnoDB's REPEATABLE READ
+#   FakeBucket         - a boto3 S3 Bucket, kept as a directory
+#
+# load_module() imports a module of one of the proj04_* functions,
+# whose folders all have a lambda_function.py. SAMPLE_PDF is a PDF
+# to extract.
+#
+
+import datetime
+import importlib.util
+import io
+import os
+import re
+import shutil
+import sqlite3
+import sys
+
+FUNCTIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda-functions")
+
+#
+# a 28-page PDF of tables and prose, checked in at the top of the
+# repo
+#
+SAMPLE_PDF = os.path.join(FUNCTIONS_DIR, "..", "update09.pdf")
+
+#
+# pymysql returns DATETIME columns as datetime.datetime
+#
+sqlite3.register_converter("datetime", lambda value: datetime.datetime.fromisoformat(value.decode()))
+
+#
+# the tables of benfordapp-database.sql, in sqlite's dialect
+#
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs
+(
+    jobid             integer primary key autoincrement,
+    userid            int not null,
+    status            varchar(256) not null,
+    originaldatafile  varchar(256) not null,
+    datafilekey       varchar(256) not null,
+    resultsfilekey    varchar(256) not null,
+    options           varchar(1024) not null default '',
+    claimedat         datetime null,
+    computedinline    boolean not null default false
+);
+
+CREATE TABLE IF NOT EXISTS resultcache
+(
+    digest            char(64) not null,
+    variant           varchar(64) not null,
+    resultsfilekey    varchar(256) not null,
+    datafilekey       varchar(256) not null default '',
+    hits              int not null,
+    created           datetime not null,
+    lastused          datetime not null,
+    PRIMARY KEY (digest, variant)
+);
+
+CREATE TABLE IF NOT EXISTS cachestats
+(
+    name              varchar(64) not null,
+    value             bigint not null,
+    PRIMARY KEY (name)
+);
+
+INSERT OR IGNORE INTO cachestats(name, value) VALUES('hits', 0);
+INSERT OR IGNORE INTO cachestats(name, value) VALUES('misses', 0);
+INSERT OR IGNORE INTO cachestats(name, value) VALUES('evictions', 0);
+INSERT OR IGNORE INTO cachestats(name, value) VALUES('duplicates', 0);
+"""
+
+_TRANSLATIONS = [
+  (re.compile(r"NOW\(\)\s*-\s*INTERVAL\s+%s\s+DAY", re.IGNORECASE), "datetime('now', '-' || %s || ' days')"),
+  (re.compile(r"NOW\(\)\s*-\s*INTERVAL\s+%s\s+SECOND", re.IGNORECASE), "datetime('now', '-' || %s || ' seconds')"),
+  (re.compile(r"NOW\(\)", re.IGNORECASE), "datetime('now')"),
+  (re.compile(r"REPLACE INTO", re.IGNORECASE), "INSERT OR REPLACE INTO"),
+  (re.compile(r"%s"), "?"),
+]
+
+
+def translate(sql):
+  for (pattern, replacement) in _TRANSLATIONS:
+    sql = pattern.sub(replacement, sql)
+  return sql
+
+
+def create_database(path):
+  """
+  Creates the benfordapp tables in a sqlite3 database file, in
+  WAL mode so that readers keep their snapshot.
+  """
+
+  conn = sqlite3.connect(path)
+  conn.execute("PRAGMA journal_mode=WAL")
+  conn.executescript(SCHEMA)
+  conn.commit()
+  conn.close()
+
+
+def add_job(path, datafilekey, status='pending', options='', userid=80001):
+  """
+  Adds a job for a data file; returns its jobid.
+  """
+
+  conn = sqlite3.connect(path)
+  cursor = conn.execute(
+    "INSERT INTO jobs(userid, status, originaldatafile, datafilekey, resultsfilekey, options) "
+    "VALUES(?, ?, ?, ?, '', ?);",
+    (userid, status, os.path.basename(datafilekey), datafilekey, options))
+  conn.commit()
+  jobid = cursor.lastrowid
+  conn.close()
+
+  return jobid
+
+
+def load_module(function, name="lambda_function"):
+  """
+  Imports function/name.py (e.g. proj04_jobs/lambda_function.py)
+  as the module function.name, with the function's folder on the
+  path for its own imports.
+  """
+
+  folder = os.path.abspath(os.path.join(FUNCTIONS_DIR, function))
+
+  if folder not in sys.path:
+    sys.path.append(folder)
+
+  spec = importlib.util.spec_from_file_location(function + "." + name, os.path.join(folder, name + ".py"))
+  module = importlib.util.module_from_spec(spec)
+  spec.loader.exec_module(module)
+
+  return module
+
+
+class SnapshotConnection:
+  """
+  A pymysql-like connection over a sqlite3 database file. Like
+  InnoDB under REPEATABLE READ with autocommit off, its first
+  statement begins a transaction whose reads all see the
+  snapshot taken then, until commit() or rollback().
+  """
+
+  def __init__(self, path):
+    self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False,
+                                detect_types=sqlite3.PARSE_DECLTYPES)
+    self.in_transaction = False
+    self.closed = False
+    self.cursorclasses = []
+
+  def cursor(self, cursorclass=None):
+    self.cursorclasses.append(cursorclass)
+    return SnapshotCursor(self)
+
+  def begin(self):
+    if not self.in_transaction:
+      self.conn.execute("BEGIN")
+      self.in_transaction = True
+
+  def commit(self):
+    if self.in_transaction:
+      self.conn.execute("COMMIT")
+      self.in_transaction = False
+
+  def rollback(self):
+    if self.in_transaction:
+      self.conn.execute("ROLLBACK")
+      self.in_transaction = False
+
+  def ping(self, reconnect=False):
+    if self.closed and not reconnect:
+      raise Exception("connection closed")
+
+  def close(self):
+    self.closed = True
+    self.conn.close()
+
+
+class SnapshotCursor:
+  def __init__(self, owner):
+    self.owner = owner
+    self.cursor = owner.conn.cursor()
+    self.rowcount = -1
+
+  def execute(self, sql, parameters=None):
+    self.owner.begin()
+    self.cursor.execute(translate(sql), tuple(parameters or ()))
+    self.rowcount = self.cursor.rowcount
+    return self.rowcount
+
+  def executemany(self, sql, rows):
+    self.owner.begin()
+    self.cursor.executemany(translate(sql), [tuple(row) for row in rows])
+    self.rowcount = self.cursor.rowcount
+    return self.rowcount
+
+  def fetchone(self):
+    return self.cursor.fetchone()
+
+  def fetchmany(self, size=1):
+    return tuple(self.cursor.fetchmany(size))
+
+  def fetchall(self):
+    return tuple(self.cursor.fetchall())
+
+  def close(self):
+    self.cursor.close()
+
+
+class NoSuchKey(Exception):
+  """
+  What boto3 raises (a botocore ClientError) for a missing key.
+  """
+
+  def __init__(self, key):
+    super().__init__("NoSuchKey: " + key)
+    self.response = {'Error': {'Code': 'NoSuchKey', 'Key': key}}
+
+
+class FakeObject:
+  def __init__(self, bucket, key):
+    self.bucket = bucket
+    self.key = key
+    self.path = bucket.path_of(key)
+
+  def get(self, **_kwargs):
+    if not os.path.exists(self.path):
+      raise NoSuchKey(self.key)
+    with open(self.path, "rb") as infile:
+      data = infile.read()
+    return {'Body': io.BytesIO(data), 'ContentLength': len(data)}
+
+  def put(self, Body, **_kwargs):
+    self.bucket.put_object(Key=self.key, Body=Body)
+
+  def delete(self, **_kwargs):
+    if os.path.exists(self.path):
+      os.remove(self.path)
+
+  def copy_from(self, CopySource, **_kwargs):
+    source = self.bucket.path_of(CopySource['Key'])
+    if not os.path.exists(source):
+      raise NoSuchKey(CopySource['Key'])
+    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+    shutil.copyfile(source, self.path)
+
+
+class FakeObjects:
+  def __init__(self, bucket):
+    self.bucket = bucket
+
+  def all(self):
+    return self.filter(Prefix="")
+
+  def filter(self, Prefix=""):
+    found = []
+    for (dirpath, _, filenames) in os.walk(self.bucket.root):
+      for filename in filenames:
+        key = os.path.relpath(os.path.join(dirpath, filename), self.bucket.root).replace(os.sep, "/")
+        if key.startswith(Prefix):
+          found.append(FakeObject(self.bucket, key))
+    return sorted(found, key=lambda obj: obj.key)
+
+
+class FakeBucket:
+  """
+  An S3 bucket, kept as the directory root/name.
+  """
+
+  def __init__(self, root, name="benfordapp"):
+    self.name = name
+    self.root = os.path.join(str(root), name)
+    self.objects = FakeObjects(self)
+    os.makedirs(self.root, exist_ok=True)
+
+  def path_of(self, key):
+    return os.path.join(self.root, *key.split("/"))
+
+  def Object(self, key):
+    return FakeObject(self, key)
+
+  def put_object(self, Key, Body, **_kwargs):
+    path = self.path_of(Key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if isinstance(Body, str):
+      Body = Body.encode('utf-8')
+    with open(path, "wb") as outfile:
+      if isinstance(Body, (bytes, bytearray)):
+        outfile.write(Body)
+      else:
+        shutil.copyfileobj(Body, outfile)
+
+  def upload_file(self, Filename, Key, **_kwargs):
+    path = self.path_of(Key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    shutil.copyfile(Filename, path)
+
+  def download_file(self, Key, Filename):
+    if not os.path.exists(self.path_of(Key)):
+      raise NoSuchKey(Key)
+    shutil.copyfile(self.path_of(Key), Filename)
+
+  def read(self, key):
+    with open(self.path_of(key), "rb") as infile:
+      return infile.read()
@@ -0,0 +1,147 @@
+#
+# test_batch.py
+#
+# Splitting batched S3 events, running their records concurrently
+# on one shared database connection, and summing up the outcomes.
+#
+
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import batch
+import datatier
+import fakes
+import pytest
+
+
+def s3_event(*keys, **entries):
+  records = [{'s3': {'bucket': {'name': "benfordapp"}, 'object': {'key': key}}}
+             for key in keys]
+  return dict(entries, Records=records)
+
+
+def response(statusCode, body):
+  return {'statusCode': statusCode, 'body': json.dumps(body)}
+
+
+def test_record_events():
+  event = s3_event("u/a.pdf", "u/my+file%281%29.pdf", resume="x")
+  events = batch.record_events(event)
+
+  assert [len(event['Records']) for event in events] == [1, 1]
+  assert [event['resume'] for event in events] == ["x", "x"]
+
+  keys = [batch.bucketkey_of(event) for event in events]
+
+  assert keys == ["u/a.pdf", "u/my file(1).pdf"]
+
+
+def test_no_records():
+  with pytest.raises(Exception, match="no S3 records"):
+    batch.record_events({'Records': []})
+
+
+@pytest.mark.parametrize("max_concurrency, most", [(1, 1), (3, 3), (10, 6)])
+def test_run_records(max_concurrency, most):
+  events = batch.record_events(s3_event(*["u/" + str(i) + ".pdf" for i in range(6)]))
+  lock = threading.Lock()
+  running = [0, 0]  # now, most at once
+
+  def handler(event, slot):
+    with lock:
+      running[0] += 1
+      running[1] = max(running)
+    time.sleep(0.02)
+    with lock:
+      running[0] -= 1
+    return (slot, batch.bucketkey_of(event))
+
+  responses = batch.run_records(handler, events, max_concurrency)
+
+  assert responses == [(i, "u/" + str(i) + ".pdf") for i in range(6)]
+  assert running[1] == most
+
+
+def test_summarize():
+  events = batch.record_events(s3_event("u/a.pdf", "u/b.pdf", "u/c.pdf"))
+
+  ok = batch.summarize(events[0:2], [response(200, "success"),
+                                     response(202, "checkpointed")])
+  bodies = [outcome['body'] for outcome in json.loads(ok['body'])]
+
+  assert ok['statusCode'] == 200
+  assert bodies == ["success", "checkpointed"]
+
+  failed = batch.summarize(events, [response(200, "success"),
+                                    response(500, "bad pdf"),
+                                    response(200, "duplicate")])
+
+  assert failed['statusCode'] == 500
+  assert json.loads(failed['body'])[1] == {'bucketkey': "u/b.pdf", 'statusCode': 500,
+                                           'body': "bad pdf"}
+
+
+@pytest.fixture
+def database(tmp_path):
+  path = str(tmp_path / "benfordapp.db")
+  fakes.create_database(path)
+  return path
+
+
+def test_shared_connection_one_cursor_at_a_time(database):
+  shared = batch.SharedConnection(fakes.SnapshotConnection(database))
+
+  first = shared.cursor()
+  opened = []
+
+  def second():
+    cursor = shared.cursor()
+    opened.append(cursor)
+    cursor.close()
+
+  thread = threading.Thread(target=second)
+  thread.start()
+  thread.join(0.1)
+
+  assert opened == []
+
+  first.close()
+  thread.join()
+
+  assert len(opened) == 1
+
+
+def test_shared_connection_across_records(database):
+  opening = Future()
+  shared = batch.SharedConnection(opening)
+  opening.set_result(fakes.SnapshotConnection(database))
+
+  def count(slot):
+    sql = "UPDATE cachestats SET value = value + %s WHERE name = 'hits'"
+    datatier.perform_action(shared, sql, [slot])
+
+  with ThreadPoolExecutor(max_workers=4) as pool:
+    list(pool.map(count, range(1, 21)))
+
+  sql = "SELECT value FROM cachestats WHERE name = 'hits'"
+
+  assert datatier.retrieve_one_row(shared, sql) == (210,)
+
+
+def test_shared_connection_failed_cursor(database):
+  conn = fakes.SnapshotConnection(database)
+  conn.close()
+  shared = batch.SharedConnection(conn)
+
+  with pytest.raises(sqlite3.ProgrammingError):
+    shared.cursor()
+
+  #
+  # the failed call does not keep the connection from other
+  # threads
+  #
+  with ThreadPoolExecutor(max_workers=1) as pool:
+    assert pool.submit(shared._lock.acquire, blocking=False).result()
@@ -0,0 +1,103 @@
+#
+# test_benford.py
+#
+# The expected digit proportions, the conformity statistics, and
+# the results file.
+#
+
+import benford
+import pytest
+import tally
+
+
+def benford_histograms(n):
+  """
+  Histograms of n numbers that follow Benford's Law as closely
+  as whole counts can.
+  """
+
+  return {name: [round(n * p) for p in expected]
+          for (name, expected) in benford.EXPECTED.items()}
+
+
+@pytest.mark.parametrize("name", benford.EXPECTED.keys())
+def test_expected_proportions_sum_to_one(name):
+  assert sum(benford.EXPECTED[name]) == pytest.approx(1.0)
+
+
+def test_expected_proportions():
+  assert benford.EXPECTED['first'][1] == pytest.approx(0.30103, abs=1e-5)
+  assert benford.EXPECTED['first'][9] == pytest.approx(0.04576, abs=1e-5)
+  assert benford.EXPECTED['second'][0] == pytest.approx(0.11968, abs=1e-5)
+  assert benford.EXPECTED['second'][9] == pytest.approx(0.08500, abs=1e-5)
+  assert benford.EXPECTED['first_two'][10] == pytest.approx(0.04139, abs=1e-5)
+  assert benford.EXPECTED['first_two'][0:10] == [0.0] * 10
+
+
+def test_conforming_data():
+  stats = benford.analyze(benford_histograms(100000))
+
+  for name in ('first', 'second', 'first_two'):
+    assert stats[name]['conformity'] == "close", name
+    assert stats[name]['chi_square'] < 1.0
+
+  assert stats['last_two']['conformity'] is None
+  assert stats['last_two']['mad'] < 0.0001
+
+
+def test_uniform_first_digits():
+  counts = [0] + [100] * 9
+
+  stats = benford.analyze_test('first', counts)
+
+  assert stats['n'] == 900
+  assert stats['conformity'] == "nonconformity"
+  assert stats['mad'] == pytest.approx(benford.mean_absolute_deviation('first', counts))
+  assert stats['chi_square'] > 100
+
+
+@pytest.mark.parametrize("mad, label", [
+  (0.0, "close"), (0.006, "close"), (0.0061, "acceptable"), (0.012, "acceptable"),
+  (0.013, "marginal"), (0.016, "nonconformity"),
+])
+def test_conformity_ranges(mad, label):
+  assert benford.conformity('first', mad) == label
+
+
+def test_no_data():
+  assert benford.analyze_test('second', [0] * 10) == {
+    'n': 0, 'chi_square': None, 'mad': None, 'conformity': None}
+  assert benford.mean_absolute_deviation('first', [0] * 10) is None
+
+
+def test_one_pass_fills_every_test():
+  histograms = tally.new_histograms()
+  tally.tally_text("1234 7", histograms)
+
+  stats = benford.analyze(histograms)
+
+  counted = [stats[name]['n'] for name in ('first', 'second', 'first_two', 'last_two')]
+
+  assert counted == [2, 1, 1, 1]
+
+
+def test_format_results():
+  histograms = tally.new_histograms()
+  tally.tally_text("1234 7 1906", histograms)
+
+  results = benford.format_results(3, histograms, tests=['first', 'last_two'],
+                                   unit="rows")
+  lines = results.splitlines()
+
+  #
+  # the first block is the original results format
+  #
+  assert lines[0:12] == ["**RESULTS**", "3 rows", "0 0", "1 2", "2 0", "3 0", "4 0",
+                         "5 0", "6 0", "7 1", "8 0", "9 0"]
+
+  assert lines[12].startswith("**FIRST DIGIT** n=3 chi2=")
+  assert lines[13:22] == lines[3:12]
+  assert lines[22].startswith("**LAST TWO DIGITS** n=2 ")
+  assert lines[23:] == [str(i).zfill(2) + " " + str(histograms['last_two'][i])
+                        for i in range(0, 100)]
+  assert "SECOND DIGIT" not in results
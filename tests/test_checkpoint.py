@@ -0,0 +1,124 @@
+#
+# test_checkpoint.py
+#
+# A PDF tallied over several invocations, each resuming from the
+# checkpoint of the last, must give exactly what one invocation
+# gives: the same histograms, and a number store and page matrix
+# whose parts join up. Needs pypdf.
+#
+
+import functools
+
+import checkpoint
+import extraction
+import fakes
+import numstore
+import pagematrix
+import pytest
+import tally
+
+pytest.importorskip("pypdf")
+
+KEY = "u/update09.pdf"
+
+
+@pytest.fixture
+def bucket(tmp_path):
+  return fakes.FakeBucket(tmp_path)
+
+
+def one_batch():
+  """
+  A time_left() with time for the first batch of an invocation,
+  and none after it.
+  """
+
+  calls = []
+
+  def time_left():
+    calls.append(None)
+    return 100.0 if len(calls) == 1 else 0.0
+
+  return time_left
+
+
+def invoke(bucket, resuming, workers, select=None):
+  """
+  What proj04_compute does with a large PDF in one invocation;
+  returns True once the whole document is done.
+  """
+
+  key = checkpoint.checkpoint_key(KEY)
+  state = checkpoint.load(bucket, key) if resuming else checkpoint.new_state()
+
+  numbers = numstore.Numbers()
+  page_counts = []
+  start_page = state['next_page']
+
+  (number_of_pages, next_page) = extraction.extract_counts_until(fakes.SAMPLE_PDF,
+                                                                 start_page,
+                                                                 state['histograms'],
+                                                                 time_left=one_batch(),
+                                                                 batch_pages=6,
+                                                                 workers=workers,
+                                                                 serial_threshold=2,
+                                                                 numbers=numbers,
+                                                                 page_counts=page_counts,
+                                                                 select=select)
+
+  assert next_page > start_page
+
+  pages = (number_of_pages, start_page, next_page)
+
+  numstore.write_part(bucket, KEY, numbers, *pages)
+  pagematrix.write_part(bucket, KEY, page_counts, *pages)
+
+  state['next_page'] = next_page
+  checkpoint.save(bucket, key, state)
+
+  return next_page == number_of_pages
+
+
+def whole(bucket, workers, select=None):
+  invocations = 1
+  while not invoke(bucket, invocations > 1, workers, select):
+    invocations += 1
+
+  state = checkpoint.load(bucket, checkpoint.checkpoint_key(KEY))
+
+  return (invocations, state['histograms'], numstore.read_store(bucket, KEY)[0].digits,
+          list(pagematrix.read_matrix(bucket, KEY)[1]))
+
+
+def odd_pages(number_of_pages):
+  return range(1, number_of_pages, 2)
+
+
+@functools.lru_cache
+def serial(select=None):
+  histograms = tally.new_histograms()
+  numbers = numstore.Numbers()
+  page_counts = []
+
+  extraction.extract_counts_until(fakes.SAMPLE_PDF, 0, histograms, workers=1,
+                                  numbers=numbers, page_counts=page_counts,
+                                  select=select)
+
+  matrix = [count for (_, counts) in page_counts if sum(counts) > 0 for count in counts]
+
+  return histograms, numbers.digits, matrix
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_resumed_run_matches_serial(bucket, workers):
+  (invocations, histograms, digits, matrix) = whole(bucket, workers)
+
+  assert invocations == 5
+  assert (histograms, digits, matrix) == serial()
+
+
+def test_resumed_run_of_selected_pages(bucket):
+  (invocations, histograms, digits, matrix) = whole(bucket, 1, odd_pages)
+
+  assert invocations == 3
+  assert (histograms, digits, matrix) == serial(odd_pages)
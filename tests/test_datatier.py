@@ -0,0 +1,215 @@
+#
+# test_datatier.py
+#
+# The connection pool, and the bulk and batched action queries of
+# datatier.py, on the database stand-in of fakes.py.
+#
+
+import sqlite3
+import sys
+import time
+import types
+
+import datatier
+import fakes
+import pytest
+
+
+@pytest.fixture
+def database(tmp_path):
+  path = str(tmp_path / "benfordapp.db")
+  fakes.create_database(path)
+  return path
+
+
+@pytest.fixture
+def pool(database, monkeypatch):
+  def get_dbConn(*_args):
+    return fakes.SnapshotConnection(database)
+
+  monkeypatch.setattr(datatier, "get_dbConn", get_dbConn)
+
+  pool = datatier.ConnectionPool("h", 3306, "u", "p", "d", size=1, idle_timeout=300)
+  yield pool
+  pool.close()
+
+
+def test_pool_reuses_a_released_connection(pool):
+  dbConn = pool.acquire()
+  pool.release(dbConn)
+
+  assert pool.acquire() is dbConn
+  assert pool.stats() == {'connects': 1, 'reuses': 1, 'expired': 0, 'dropped': 0,
+                          'idle': 0}
+
+
+def test_release_ends_the_transaction(database, pool):
+  jobid = fakes.add_job(database, "u/a.pdf")
+  status = "SELECT status FROM jobs WHERE jobid = %s"
+
+  dbConn = pool.acquire()
+  datatier.retrieve_one_row(dbConn, status, [jobid])
+  pool.release(dbConn)
+
+  assert not dbConn.in_transaction
+
+  #
+  # so the next user sees changes made since
+  #
+  other = fakes.SnapshotConnection(database)
+  datatier.perform_action(other,
+                          "UPDATE jobs SET status = 'completed' WHERE jobid = %s",
+                          [jobid])
+  other.close()
+
+  dbConn = pool.acquire()
+
+  assert datatier.retrieve_one_row(dbConn, status, [jobid]) == ('completed',)
+
+
+def test_pool_keeps_size_idle_connections(pool):
+  first = pool.acquire()
+  second = pool.acquire()
+
+  pool.release(first)
+  pool.release(second)
+
+  assert second.closed
+  assert pool.stats()['connects'] == 2
+  assert pool.stats()['expired'] == 1
+  assert pool.stats()['idle'] == 1
+
+
+def test_idle_connection_expires(pool):
+  dbConn = pool.acquire()
+  pool.release(dbConn, last_used=time.monotonic() - 301)
+
+  assert dbConn.closed
+  assert pool.acquire() is not dbConn
+  assert pool.stats()['expired'] == 1
+
+
+def test_dead_connection_is_dropped(pool):
+  dbConn = pool.acquire()
+  pool.release(dbConn)
+
+  #
+  # the server closed it while it sat idle
+  #
+  dbConn.close()
+
+  assert pool.acquire() is not dbConn
+  assert pool.stats()['dropped'] == 1
+  assert pool.stats()['connects'] == 2
+
+
+def test_discard(pool):
+  dbConn = pool.acquire()
+  pool.discard(dbConn)
+
+  assert dbConn.closed
+  assert pool.stats()['dropped'] == 1
+  assert pool.stats()['idle'] == 0
+
+
+@pytest.fixture
+def dbConn(database):
+  conn = fakes.SnapshotConnection(database)
+  yield conn
+  conn.close()
+
+
+def counters(dbConn):
+  sql = "SELECT name, value FROM cachestats ORDER BY name"
+  try:
+    return dict(datatier.retrieve_all_rows(dbConn, sql))
+  finally:
+    dbConn.rollback()
+
+
+def test_bulk_action(dbConn):
+  sql = "INSERT INTO cachestats(name, value) VALUES(%s, %s)"
+
+  (rowcount, elapsed) = datatier.perform_bulk_action(dbConn, sql, [["a", 1], ["b", 2]])
+
+  assert rowcount == 2
+  assert elapsed >= 0
+  assert counters(dbConn)['b'] == 2
+
+
+def test_bulk_action_rolls_back(dbConn):
+  sql = "INSERT INTO cachestats(name, value) VALUES(%s, %s)"
+
+  #
+  # 'hits' is already there: nothing is inserted
+  #
+  with pytest.raises(sqlite3.IntegrityError):
+    datatier.perform_bulk_action(dbConn, sql, [["a", 1], ["hits", 2]])
+
+  assert not dbConn.in_transaction
+  assert 'a' not in counters(dbConn)
+
+
+def test_batch(dbConn):
+  (rowcounts, _) = datatier.perform_batch(dbConn, [
+    "UPDATE cachestats SET value = 5",
+    ("UPDATE cachestats SET value = value + 1 WHERE name = %s", ["hits"]),
+  ])
+
+  assert rowcounts == [4, 1]
+  assert counters(dbConn) == {'duplicates': 5, 'evictions': 5, 'hits': 6, 'misses': 5}
+
+
+def test_batch_rolls_back(dbConn):
+  with pytest.raises(sqlite3.IntegrityError):
+    datatier.perform_batch(dbConn, [
+      ("UPDATE cachestats SET value = 7 WHERE name = %s", ["hits"]),
+      ("INSERT INTO cachestats(name, value) VALUES(%s, %s)", ["misses", 0]),
+    ])
+
+  assert not dbConn.in_transaction
+  assert counters(dbConn)['hits'] == 0
+
+
+@pytest.fixture
+def pymysql(monkeypatch):
+  #
+  # iter_rows() asks pymysql for its unbuffered cursor class; the
+  # stand-in connection records which class it was given
+  #
+  module = types.SimpleNamespace(cursors=types.SimpleNamespace(SSCursor="SSCursor"))
+  monkeypatch.setitem(sys.modules, "pymysql", module)
+  return module
+
+
+def test_iter_rows(database, dbConn, pymysql):
+  for n in range(0, 5):
+    fakes.add_job(database, "u/" + str(n) + ".pdf")
+
+  sql = "SELECT jobid FROM jobs WHERE jobid > %s ORDER BY jobid"
+  rows = datatier.iter_rows(dbConn, sql, [1], batch_size=2)
+
+  assert [row[0] for row in rows] == [2, 3, 4, 5]
+  assert dbConn.cursorclasses == [pymysql.cursors.SSCursor]
+
+
+@pytest.mark.usefixtures("pymysql")
+def test_iter_rows_closed_early(database, dbConn):
+  for n in range(0, 5):
+    fakes.add_job(database, "u/" + str(n) + ".pdf")
+
+  sql = "SELECT jobid FROM jobs ORDER BY jobid"
+  rows = datatier.iter_rows(dbConn, sql, batch_size=2)
+
+  assert next(rows) == (1,)
+  rows.close()
+
+  #
+  # the connection is free for the next query
+  #
+  assert datatier.retrieve_one_row(dbConn, "SELECT COUNT(*) FROM jobs") == (5,)
+
+
+@pytest.mark.usefixtures("pymysql")
+def test_iter_rows_no_rows(dbConn):
+  assert list(datatier.iter_rows(dbConn, "SELECT jobid FROM jobs")) == []
@@ -0,0 +1,68 @@
+#
+# test_extraction.py
+#
+# Tallying a PDF across worker processes must give exactly what a
+# serial run gives: the same histograms, numbers and per-page
+# counts, in page order. Needs pypdf.
+#
+
+import io
+
+import extraction
+import fakes
+import numstore
+import pytest
+import tally
+
+pytest.importorskip("pypdf")
+
+
+def extract(pages, workers, source=fakes.SAMPLE_PDF):
+  from pypdf import PdfReader
+
+  numbers = numstore.Numbers()
+  page_counts = []
+
+  histograms = extraction.extract_pages(source, PdfReader(source), pages,
+                                        workers=workers, serial_threshold=1,
+                                        numbers=numbers, page_counts=page_counts)
+
+  return histograms, list(numbers.pages), numbers.digits, page_counts
+
+
+@pytest.fixture(scope="module")
+def serial():
+  return extract(range(0, 28), workers=1)
+
+
+def test_serial_run_counts_numbers(serial):
+  (histograms, pages, digits, page_counts) = serial
+
+  assert sum(histograms['first']) == len(digits) > 1000
+  assert pages == sorted(pages)
+  assert [page for (page, _) in page_counts] == list(range(0, 28))
+
+
+@pytest.mark.parametrize("workers", [2, 5])
+def test_parallel_run_matches_serial(serial, workers):
+  assert extract(range(0, 28), workers) == serial
+
+
+def test_parallel_run_in_memory(serial):
+  with open(fakes.SAMPLE_PDF, "rb") as infile:
+    source = io.BytesIO(infile.read())
+
+  assert extract(range(0, 28), 4, source) == serial
+
+
+def test_some_pages_in_parallel(serial):
+  (_, _, _, page_counts) = extract([1, 5, 6, 20, 27], workers=2)
+
+  assert page_counts == [serial[3][i] for i in (1, 5, 6, 20, 27)]
+
+
+def test_no_pages():
+  (histograms, pages, digits, page_counts) = extract([], workers=2)
+
+  assert histograms == tally.new_histograms()
+  assert (pages, digits, page_counts) == ([], [], [])
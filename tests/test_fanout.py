@@ -0,0 +1,129 @@
+#
+# test_fanout.py
+#
+# Planning, dispatching and reducing the shards of a fanned-out
+# PDF. Tallying the sample PDF needs pypdf.
+#
+
+import io
+import json
+import sys
+import types
+
+import extraction
+import fakes
+import fanout
+import joboptions
+import pytest
+import tally
+
+
+class SerialExecutor:
+  """
+  Runs the shards one after the other, in this process.
+  """
+
+  def __init__(self, source):
+    self.source = source
+    self.events = []
+
+  def map(self, events):
+    self.events.extend(events)
+    return [fanout.run_shard(self.source, event['shard'], workers=1)
+            for event in events]
+
+
+@pytest.mark.parametrize("number_of_pages, shard_pages, max_shards, shards", [
+  (28, 8, 10, [(0, 7), (7, 14), (14, 21), (21, 28)]),
+  (28, 8, 2, [(0, 14), (14, 28)]),
+  (5, 8, 10, [(0, 5)]),
+  (10, 0, 3, [(0, 4), (4, 7), (7, 10)]),
+])
+def test_plan_shards(number_of_pages, shard_pages, max_shards, shards):
+  assert fanout.plan_shards(number_of_pages, shard_pages, max_shards) == shards
+
+
+def test_shard_event_is_json():
+  event = fanout.shard_event("u/a.pdf", 28, 7, 14, options={'pages': [[1, 20]]})
+
+  assert json.loads(json.dumps(event)) == event
+  assert event['shard']['options'] == {'pages': [[1, 20]]}
+  assert not event['shard']['page_matrix']
+
+
+def test_reduce_histograms():
+  first = tally.new_histograms()
+  second = tally.new_histograms()
+  first['first'][1] = 3
+  second['first'][1] = 4
+  second['last_two'][42] = 1
+
+  histograms = fanout.reduce_histograms([first, second])
+
+  assert histograms['first'][1] == 7
+  assert histograms['last_two'][42] == 1
+
+
+@pytest.mark.parametrize("options", [{}, {'pages': [[2, 25]]}])
+def test_fan_out_matches_serial(options):
+  pytest.importorskip("pypdf")
+
+  def select(number_of_pages):
+    return joboptions.select_pages(options, number_of_pages)
+
+  baseline = tally.new_histograms()
+  (number_of_pages, _) = extraction.extract_counts_until(fakes.SAMPLE_PDF, 0, baseline,
+                                                         workers=1, select=select)
+
+  executor = SerialExecutor(fakes.SAMPLE_PDF)
+  histograms = fanout.fan_out(executor, "u/update09.pdf", number_of_pages, 5, 4,
+                              options=options)
+
+  assert histograms == baseline
+  assert len(executor.events) == 4
+
+
+class LambdaClient:
+  """
+  boto3's lambda client, answering each shard as proj04_compute
+  would, or failing the shard starting at fail_at.
+  """
+
+  def __init__(self, fail_at=None):
+    self.fail_at = fail_at
+
+  def invoke(self, FunctionName, InvocationType, Payload):
+    assert (FunctionName, InvocationType) == ("proj04_compute", 'RequestResponse')
+
+    shard = json.loads(Payload)['shard']
+    histograms = tally.new_histograms()
+    histograms['first'][1] = shard['end'] - shard['start']
+
+    if shard['start'] == self.fail_at:
+      return {'FunctionError': 'Unhandled',
+              'Payload': io.BytesIO(b'{"errorMessage": "timed out"}')}
+
+    body = json.dumps({'histograms': histograms})
+    payload = json.dumps({'statusCode': 200, 'body': body})
+    return {'Payload': io.BytesIO(payload.encode('utf-8'))}
+
+
+@pytest.fixture
+def lambda_client(monkeypatch):
+  client = LambdaClient()
+  boto3 = types.SimpleNamespace(client=lambda _service: client)
+  monkeypatch.setitem(sys.modules, "boto3", boto3)
+  return client
+
+
+def test_lambda_executor(lambda_client):
+  executor = fanout.LambdaExecutor("proj04_compute", max_concurrency=3)
+
+  histograms = fanout.fan_out(executor, "u/a.pdf", 100, 10, 10)
+
+  assert histograms['first'][1] == 100
+
+  lambda_client.fail_at = 30
+
+  with pytest.raises(Exception, match="shard 30-39 failed"):
+    fanout.fan_out(executor, "u/a.pdf", 100, 10, 10)
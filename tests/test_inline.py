@@ -0,0 +1,125 @@
+#
+# test_inline.py
+#
+# Computing small uploads in proj04_upload, and completing them
+# from the results cache, on the stand-ins of fakes.py.
+#
+
+import configparser
+
+import datatier
+import fakes
+import pytest
+
+TABLE = b"amount\n4\n17265\n6589\n18\n1203\n250\n"
+
+
+@pytest.fixture
+def inline():
+  return fakes.load_module("proj04_upload", "inline")
+
+
+@pytest.fixture
+def settings(inline):
+  configur = configparser.ConfigParser()
+  configur.read_dict({
+    'inline': {'enabled': 'true'},
+    'cache': {'enabled': 'true'},
+    'numstore': {'enabled': 'true'},
+  })
+  return inline.read_settings(configur)
+
+
+@pytest.fixture
+def database(tmp_path):
+  path = str(tmp_path / "benfordapp.db")
+  fakes.create_database(path)
+  return path
+
+
+@pytest.fixture
+def dbConn(database):
+  conn = fakes.SnapshotConnection(database)
+  yield conn
+  conn.close()
+
+
+@pytest.fixture
+def bucket(tmp_path):
+  return fakes.FakeBucket(tmp_path)
+
+
+#
+# as proj04_upload does: the job is created processing, and the
+# connection's transaction committed once the upload is done
+#
+def upload(inline, settings, bucket, database, dbConn, bucketkey, data=TABLE):
+  jobid = fakes.add_job(database, bucketkey, status='processing')
+  try:
+    return inline.run(bucket, dbConn, jobid, bucketkey, data, {}, settings)
+  finally:
+    dbConn.commit()
+
+
+def job_of(dbConn, bucketkey):
+  sql = "SELECT status, resultsfilekey, computedinline FROM jobs WHERE datafilekey = %s"
+  try:
+    return datatier.retrieve_one_row(dbConn, sql, [bucketkey])
+  finally:
+    dbConn.rollback()
+
+
+def stats(dbConn):
+  sql = "SELECT name, value FROM cachestats WHERE name IN ('hits', 'misses')"
+  try:
+    return dict(datatier.retrieve_all_rows(dbConn, sql))
+  finally:
+    dbConn.rollback()
+
+
+def test_cache_miss(inline, settings, bucket, database, dbConn):
+  computed = upload(inline, settings, bucket, database, dbConn, "u/a.csv")
+
+  assert computed['status'] == 'completed'
+  assert computed['rows'] == 6
+  assert computed['histogram'][1] == 3
+  assert 'cached' not in computed
+  assert bucket.read("u/a.txt").decode('utf-8') == computed['results']
+
+  assert job_of(dbConn, "u/a.csv") == ('completed', "u/a.txt", 1)
+  assert stats(dbConn) == {'hits': 0, 'misses': 1}
+
+
+def test_cache_hit(inline, settings, bucket, database, dbConn):
+  computed = upload(inline, settings, bucket, database, dbConn, "u/a.csv")
+  cached = upload(inline, settings, bucket, database, dbConn, "u/b.csv")
+
+  #
+  # a hit has no histogram to return, only the results file
+  #
+  assert cached == {'status': 'completed', 'cached': True,
+                    'results': computed['results']}
+  assert bucket.read("u/b.txt") == bucket.read("u/a.txt")
+  assert bucket.objects.filter(Prefix="u/b.numbers/")
+
+  assert job_of(dbConn, "u/b.csv") == ('completed', "u/b.txt", 1)
+  assert stats(dbConn) == {'hits': 1, 'misses': 1}
+
+
+def test_cache_hit_without_results(inline, settings, bucket, database, dbConn):
+  computed = upload(inline, settings, bucket, database, dbConn, "u/a.csv")
+
+  #
+  # the cached results file has gone: recompute, and cache anew
+  #
+  bucket.Object("u/a.txt").delete()
+
+  recomputed = upload(inline, settings, bucket, database, dbConn, "u/b.csv")
+
+  assert recomputed == dict(computed, results=recomputed['results'])
+  assert 'cached' not in recomputed
+
+  cached = upload(inline, settings, bucket, database, dbConn, "u/c.csv")
+
+  assert cached['cached']
+  assert bucket.read("u/c.txt") == bucket.read("u/b.txt")
@@ -0,0 +1,141 @@
+#
+# test_jobclaim.py
+#
+# Claiming jobs against duplicate S3 notifications, on the database
+# stand-in of fakes.py.
+#
+
+import sqlite3
+
+import datatier
+import fakes
+import jobclaim
+import pytest
+
+LEASE_SECS = 900
+
+
+@pytest.fixture
+def database(tmp_path):
+  path = str(tmp_path / "benfordapp.db")
+  fakes.create_database(path)
+  return path
+
+
+@pytest.fixture
+def dbConn(database):
+  conn = fakes.SnapshotConnection(database)
+  yield conn
+  conn.close()
+
+
+#
+# each call stands for an invocation: runtime.py ends the
+# connection's transaction when the invocation is done with it
+#
+def claim(dbConn, datafilekey):
+  try:
+    return jobclaim.claim(dbConn, datafilekey, LEASE_SECS)
+  finally:
+    dbConn.rollback()
+
+
+def job_of(dbConn, datafilekey):
+  sql = "SELECT status, claimedat FROM jobs WHERE datafilekey = %s"
+  try:
+    return datatier.retrieve_one_row(dbConn, sql, [datafilekey])
+  finally:
+    dbConn.rollback()
+
+
+def duplicates(dbConn):
+  sql = "SELECT value FROM cachestats WHERE name = 'duplicates'"
+  try:
+    return datatier.retrieve_one_row(dbConn, sql)[0]
+  finally:
+    dbConn.rollback()
+
+
+def claimed_secs_ago(database, datafilekey, secs):
+  conn = sqlite3.connect(database)
+  conn.execute("UPDATE jobs SET claimedat = datetime('now', ?) WHERE datafilekey = ?",
+               ("-" + str(secs) + " seconds", datafilekey))
+  conn.commit()
+  conn.close()
+
+
+def test_claims_a_pending_job_once(database, dbConn):
+  fakes.add_job(database, "u/a.pdf")
+
+  assert claim(dbConn, "u/a.pdf") is True
+
+  (status, claimedat) = job_of(dbConn, "u/a.pdf")
+  assert status == 'processing'
+  assert claimedat is not None
+
+  assert not claim(dbConn, "u/a.pdf")
+  assert duplicates(dbConn) == 1
+
+
+def test_completed_and_failed_jobs_are_duplicates(database, dbConn):
+  for (datafilekey, status) in [("u/a.pdf", 'completed'), ("u/b.pdf", 'failed')]:
+    fakes.add_job(database, datafilekey, status=status)
+
+    assert not claim(dbConn, datafilekey)
+
+  assert duplicates(dbConn) == 2
+
+
+def test_expired_lease_is_taken_over(database, dbConn):
+  fakes.add_job(database, "u/a.pdf")
+
+  assert claim(dbConn, "u/a.pdf")
+
+  #
+  # the invocation holding the claim died long ago
+  #
+  claimed_secs_ago(database, "u/a.pdf", LEASE_SECS + 60)
+
+  assert claim(dbConn, "u/a.pdf") == jobclaim.TAKEN_OVER
+  assert duplicates(dbConn) == 0
+
+  #
+  # and the takeover renewed the lease
+  #
+  assert not claim(dbConn, "u/a.pdf")
+  assert duplicates(dbConn) == 1
+
+
+def test_renew_keeps_the_lease(database, dbConn):
+  fakes.add_job(database, "u/a.pdf")
+
+  assert claim(dbConn, "u/a.pdf")
+
+  claimed_secs_ago(database, "u/a.pdf", LEASE_SECS + 60)
+  jobclaim.renew(dbConn, "u/a.pdf")
+
+  assert not claim(dbConn, "u/a.pdf")
+
+
+def test_inline_job_is_not_a_duplicate(database, dbConn):
+  fakes.add_job(database, "u/a.csv")
+  datatier.perform_action(dbConn,
+                          "UPDATE jobs SET status = 'completed', computedinline = true WHERE datafilekey = %s",
+                          ["u/a.csv"])
+
+  assert not claim(dbConn, "u/a.csv")
+  assert duplicates(dbConn) == 0
+
+
+def test_no_job(dbConn):
+  with pytest.raises(Exception, match="no jobs record"):
+    jobclaim.claim(dbConn, "u/missing.pdf", LEASE_SECS)
+
+
+def test_results_files(database, dbConn):
+  fakes.add_job(database, "u/a.pdf")
+  fakes.add_job(database, "u/b.txt")
+
+  assert jobclaim.is_results_file("u/a.txt", dbConn)
+  assert jobclaim.is_results_file("u/b.results.txt", dbConn)
+  assert not jobclaim.is_results_file("u/b.txt", dbConn)
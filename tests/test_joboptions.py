@@ -0,0 +1,118 @@
+#
+# test_joboptions.py
+#
+# Checking job options, and the cache variants they lead to.
+#
+
+import joboptions
+import pytest
+
+
+def test_no_options():
+  assert joboptions.validate(None) == {}
+  assert joboptions.validate({}) == {}
+  assert joboptions.encode({}) == ''
+
+
+def test_defaults_and_normal_forms():
+  options = joboptions.validate({'pages': "3-40, 52,60-",
+                                 'tests': ["last_two", "first"],
+                                 'min_digits': 2.0,
+                                 'skip_dates': True,
+                                 'skip_page_numbers': False,
+                                 'sample': {'percent': 10}})
+
+  assert options == {'pages': [[3, 40], [52, 52], [60, None]],
+                     'tests': ["first", "last_two"],
+                     'min_digits': 2,
+                     'skip_dates': True,
+                     'sample': {'percent': 10, 'confidence': joboptions.DEFAULT_CONFIDENCE}}
+
+
+def test_stored_options_validate_again():
+  options = joboptions.validate({'pages': "2-", 'columns': ["Amount", 7]})
+
+  assert joboptions.validate(options) == options
+
+
+@pytest.mark.parametrize("options", [
+  [],
+  {'color': 'blue'},
+  {'pages': "0-3"},
+  {'pages': "5-2"},
+  {'pages': "a-b"},
+  {'pages': 7},
+  {'tests': []},
+  {'tests': ["third"]},
+  {'columns': [0]},
+  {'columns': [True]},
+  {'min_digits': 0},
+  {'min_digits': 1.5},
+  {'min_digits': "2"},
+  {'skip_dates': "yes"},
+  {'sample': {}},
+  {'sample': {'pages': 3, 'percent': 10}},
+  {'sample': {'pages': 0}},
+  {'sample': {'percent': 101}},
+  {'sample': {'pages': 3, 'confidence': 1}},
+  {'sample': {'pages': 3, 'seed': 1}},
+])
+def test_invalid_options(options):
+  with pytest.raises(ValueError):
+    joboptions.validate(options)
+
+
+def test_file_options():
+  joboptions.check_file_options({'pages': [[1, 2]]}, ".pdf")
+  joboptions.check_file_options({'columns': [1]}, ".csv")
+
+  with pytest.raises(ValueError):
+    joboptions.check_file_options({'pages': [[1, 2]]}, ".txt")
+  with pytest.raises(ValueError):
+    joboptions.check_file_options({'columns': [1]}, ".pdf")
+
+
+def test_select_pages():
+  options = joboptions.validate({'pages': "2-3,9-"})
+
+  assert joboptions.select_pages(options, 10) == [1, 2, 8, 9]
+  assert joboptions.select_pages(options, 5) == [1, 2]
+  assert list(joboptions.select_pages({}, 3)) == [0, 1, 2]
+
+  with pytest.raises(Exception, match="no page"):
+    joboptions.select_pages(joboptions.validate({'pages': "20-"}), 10)
+
+
+def test_cache_suffix():
+  assert joboptions.cache_suffix({}) == ''
+
+  #
+  # a sample is answered by the exact results
+  #
+  assert joboptions.cache_suffix(joboptions.validate({'sample': {'pages': 3}})) == ''
+
+  pages = joboptions.cache_suffix(joboptions.validate({'pages': "1-5"}))
+  assert pages.startswith("-") and len(pages) == 13
+
+  #
+  # the same options, however they were written, share a variant;
+  # different options don't
+  #
+  assert joboptions.cache_suffix(joboptions.validate({'pages': "1 - 5"})) == pages
+  assert joboptions.cache_suffix(joboptions.validate({'pages': "1-5", 'sample': {'pages': 2}})) == pages
+  assert joboptions.cache_suffix(joboptions.validate({'pages': "1-6"})) != pages
+
+  both = joboptions.validate({'skip_dates': True, 'min_digits': 2})
+  assert joboptions.cache_suffix(both) == joboptions.cache_suffix(dict(reversed(list(both.items()))))
+
+
+def test_options_must_fit_the_jobs_table():
+  columns = ["column " + str(i) for i in range(80)]
+
+  assert len(joboptions.encode(joboptions.validate({'columns': columns[0:50]}))) <= joboptions.MAX_ENCODED_LENGTH
+
+  with pytest.raises(ValueError, match="too long"):
+    joboptions.validate({'columns': columns})
+
+  with pytest.raises(ValueError, match="too long"):
+    joboptions.validate({'pages': ",".join(str(page) for page in range(1, 200, 2))})
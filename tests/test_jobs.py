@@ -0,0 +1,104 @@
+#
+# test_jobs.py
+#
+# GET /jobs: the jobs table, a page at a time.
+#
+
+import importlib
+import json
+
+import datatier
+import fakes
+import jobclaim
+import pytest
+import runtime
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+  path = str(tmp_path / "benfordapp.db")
+
+  fakes.create_database(path)
+
+  config = tmp_path / "config.ini"
+  config.write_text("[rds]\n"
+                    "endpoint = localhost\nport_number = 3306\n"
+                    "user_name = u\nuser_pwd = p\ndb_name = benfordapp\n")
+
+  monkeypatch.setattr(datatier, "get_dbConn", lambda *_args: fakes.SnapshotConnection(path))
+
+  importlib.reload(runtime)
+  monkeypatch.setattr(runtime, "CONFIG_FILE", str(config))
+
+  return path
+
+
+@pytest.fixture
+def jobs():
+  return fakes.load_module("proj04_jobs")
+
+
+def get(jobs, params=None):
+  response = jobs.lambda_handler({'queryStringParameters': params}, None)
+  return (response['statusCode'], json.loads(response['body']))
+
+
+def test_pages(database, jobs):
+  jobids = [fakes.add_job(database, "u/" + str(i) + ".pdf") for i in range(5)]
+
+  (status, body) = get(jobs, {'limit': "2"})
+  assert status == 200
+  assert [row[0] for row in body] == jobids[0:2]
+  assert body[0] == [jobids[0], 80001, 'pending', "0.pdf", "u/0.pdf", ""]
+
+  (status, body) = get(jobs, {'limit': "2", 'after': str(jobids[1])})
+  assert [row[0] for row in body] == jobids[2:4]
+
+  #
+  # a page shorter than the limit is the last
+  #
+  (status, body) = get(jobs, {'limit': "2", 'after': str(jobids[3])})
+  assert [row[0] for row in body] == jobids[4:]
+
+  (status, body) = get(jobs, {'after': str(jobids[4])})
+  assert (status, body) == (200, [])
+
+
+def test_claimed_jobs(database, jobs):
+  #
+  # a claim stamps the job's claimedat, a DATETIME column, which
+  # JSON can't encode; it is not sent
+  #
+  jobid = fakes.add_job(database, "u/a.pdf")
+
+  dbConn = fakes.SnapshotConnection(database)
+  assert jobclaim.claim(dbConn, "u/a.pdf", 900)
+  dbConn.close()
+
+  (status, body) = get(jobs)
+
+  assert status == 200
+  assert body == [[jobid, 80001, 'processing', "a.pdf", "u/a.pdf", ""]]
+
+
+def test_default_limit(database, jobs):
+  for i in range(jobs.DEFAULT_LIMIT + 1):
+    fakes.add_job(database, "u/" + str(i) + ".pdf")
+
+  (status, body) = get(jobs)
+
+  assert status == 200
+  assert len(body) == jobs.DEFAULT_LIMIT
+
+
+@pytest.mark.parametrize("params", [
+  {'limit': "0"},
+  {'limit': "1001"},
+  {'limit': "ten"},
+  {'after': "1.5"},
+])
+def test_bad_paging(jobs, params):
+  (status, body) = get(jobs, params)
+
+  assert status == 400
+  assert 'message' in body
@@ -0,0 +1,98 @@
+#
+# test_numstore.py
+#
+# Writing a number store in parts, reading it back and copying it
+# to another job, on the S3 stand-in of fakes.py.
+#
+
+import fakes
+import numstore
+import pytest
+
+
+def numbers_of(pages):
+  numbers = numstore.Numbers()
+  for (page, digits) in pages:
+    numbers.add(page, digits)
+  return numbers
+
+
+@pytest.fixture
+def bucket(tmp_path):
+  return fakes.FakeBucket(tmp_path)
+
+
+def test_encode_round_trip():
+  numbers = numbers_of([(0, ["1", "42"]), (3, ["9" * 300, "7001"])])
+
+  (decoded, number_of_pages, start, end) = numstore.decode(numstore.encode(numbers, 10, 0, 4))
+
+  assert (number_of_pages, start, end) == (10, 0, 4)
+  assert list(decoded.pages) == [0, 0, 3, 3]
+  assert decoded.digits == ["1", "42", "9" * numstore.MAX_DIGITS, "7001"]
+
+
+def test_not_a_store():
+  with pytest.raises(ValueError):
+    numstore.decode(b"XXXX" + bytes(16))
+
+
+def test_parts_round_trip(bucket):
+  numstore.write_part(bucket, "u/a.pdf", numbers_of([(2, ["3", "14"])]), 4, 2, 4)
+  numstore.write_part(bucket, "u/a.pdf", numbers_of([(0, ["27"]), (1, [])]), 4, 0, 2)
+
+  (numbers, number_of_pages) = numstore.read_store(bucket, "u/a.pdf")
+
+  assert number_of_pages == 4
+  assert list(numbers.pages) == [0, 2, 2]
+  assert numbers.digits == ["27", "3", "14"]
+
+
+def test_missing_parts(bucket):
+  with pytest.raises(Exception, match="no number store"):
+    numstore.read_store(bucket, "u/a.pdf")
+
+  numstore.write_part(bucket, "u/a.pdf", numbers_of([(0, ["1"])]), 4, 0, 2)
+
+  with pytest.raises(Exception, match="incomplete"):
+    numstore.read_store(bucket, "u/a.pdf")
+
+  numstore.write_part(bucket, "u/a.pdf", numbers_of([(3, ["1"])]), 4, 3, 4)
+
+  with pytest.raises(Exception, match="missing pages"):
+    numstore.read_store(bucket, "u/a.pdf")
+
+
+def test_clear_stale_parts(bucket):
+  numstore.write_part(bucket, "u/a.pdf", numbers_of([(0, ["5"])]), 8, 0, 3)
+
+  assert numstore.clear_store(bucket, "u/a.pdf") == 1
+
+  numstore.write_part(bucket, "u/a.pdf", numbers_of([(0, ["1"])]), 8, 0, 8)
+
+  (numbers, number_of_pages) = numstore.read_store(bucket, "u/a.pdf")
+
+  assert (numbers.digits, number_of_pages) == (["1"], 8)
+
+
+def test_copy(bucket):
+  numstore.write_part(bucket, "u/a.txt", numbers_of([(0, ["5", "55"])]), 2, 0, 1)
+  numstore.write_part(bucket, "u/a.txt", numbers_of([(1, ["6"])]), 2, 1, 2)
+
+  assert numstore.copy_store(bucket, "u/a.txt", "u/b.txt") == 2
+
+  (numbers, number_of_pages) = numstore.read_store(bucket, "u/b.txt")
+
+  assert number_of_pages == 2
+  assert numbers.digits == ["5", "55", "6"]
+
+
+def test_copy_from_results_key(bucket):
+  #
+  # the store lives under the data file's key: for a text file
+  # x.txt, the results file x.results.txt finds nothing
+  #
+  numstore.write_part(bucket, "u/a.txt", numbers_of([(0, ["5"])]), 1, 0, 1)
+
+  with pytest.raises(Exception, match="no number store"):
+    numstore.copy_store(bucket, "u/a.results.txt", "u/b.txt")
@@ -0,0 +1,135 @@
+#
+# test_pagematrix.py
+#
+# Writing a page matrix in parts, reading it back, clearing and
+# copying it, on the S3 stand-in of fakes.py; and ranking its
+# pages against Benford's Law.
+#
+
+import benford
+import fakes
+import pagematrix
+import pytest
+
+
+def counts_of(digits):
+  """
+  The first-digit counts of a page, indexed like the matrix.
+  """
+
+  counts = [0] * pagematrix.SLOTS
+  for d in digits:
+    counts[d] += 1
+  return counts
+
+
+@pytest.fixture
+def bucket(tmp_path):
+  return fakes.FakeBucket(tmp_path)
+
+
+def test_encode_round_trip():
+  page_counts = [(4, counts_of([1, 1, 2])), (5, counts_of([])), (6, counts_of([9]))]
+
+  data = pagematrix.encode(page_counts, 10, 4, 7)
+
+  (pages, matrix, number_of_pages, start, end) = pagematrix.decode(data)
+
+  assert (number_of_pages, start, end) == (10, 4, 7)
+  assert list(pages) == [4, 6]
+  assert list(matrix) == counts_of([1, 1, 2]) + counts_of([9])
+
+
+def test_not_a_matrix():
+  with pytest.raises(ValueError):
+    pagematrix.decode(b"XXXX" + bytes(16))
+
+
+def test_parts_round_trip(bucket):
+  later = [(2, counts_of([3])), (3, counts_of([1, 4]))]
+  earlier = [(0, counts_of([2, 7])), (1, counts_of([]))]
+
+  pagematrix.write_part(bucket, "u/a.pdf", later, 4, 2, 4)
+  pagematrix.write_part(bucket, "u/a.pdf", earlier, 4, 0, 2)
+
+  (pages, matrix, number_of_pages) = pagematrix.read_matrix(bucket, "u/a.pdf")
+
+  assert number_of_pages == 4
+  assert list(pages) == [0, 2, 3]
+  assert list(matrix) == counts_of([2, 7]) + counts_of([3]) + counts_of([1, 4])
+
+
+def test_missing_parts(bucket):
+  with pytest.raises(pagematrix.MatrixNotFound):
+    pagematrix.read_matrix(bucket, "u/a.pdf")
+
+  pagematrix.write_part(bucket, "u/a.pdf", [(0, counts_of([1]))], 4, 0, 2)
+
+  with pytest.raises(Exception, match="incomplete"):
+    pagematrix.read_matrix(bucket, "u/a.pdf")
+
+  pagematrix.write_part(bucket, "u/a.pdf", [(3, counts_of([1]))], 4, 3, 4)
+
+  with pytest.raises(Exception, match="missing pages"):
+    pagematrix.read_matrix(bucket, "u/a.pdf")
+
+
+def test_clear_stale_parts(bucket):
+  #
+  # an invocation that died wrote pages 0-3 of 8; the one taking
+  # the job over computes the whole document in one part
+  #
+  pagematrix.write_part(bucket, "u/a.pdf", [(0, counts_of([5]))], 8, 0, 3)
+
+  assert pagematrix.clear_matrix(bucket, "u/a.pdf") == 1
+  assert pagematrix.clear_matrix(bucket, "u/a.pdf") == 0
+
+  pagematrix.write_part(bucket, "u/a.pdf", [(0, counts_of([1]))], 8, 0, 8)
+
+  (pages, matrix, number_of_pages) = pagematrix.read_matrix(bucket, "u/a.pdf")
+
+  assert (list(pages), list(matrix), number_of_pages) == ([0], counts_of([1]), 8)
+
+
+def test_copy(bucket):
+  pagematrix.write_part(bucket, "u/a.txt", [(0, counts_of([5]))], 2, 0, 1)
+  pagematrix.write_part(bucket, "u/a.txt", [(1, counts_of([6]))], 2, 1, 2)
+
+  assert pagematrix.copy_matrix(bucket, "u/a.txt", "u/b.txt") == 2
+  copy = pagematrix.read_matrix(bucket, "u/b.txt")
+
+  assert copy == pagematrix.read_matrix(bucket, "u/a.txt")
+
+  with pytest.raises(pagematrix.MatrixNotFound):
+    pagematrix.copy_matrix(bucket, "u/c.txt", "u/d.txt")
+
+
+def test_score_pages():
+  #
+  # page 0 follows Benford's Law roughly, page 1 is all 9s, page 2
+  # is all 9s but short, page 3 has too few numbers to score
+  #
+  benfordish = counts_of([])
+  for (d, count) in enumerate([30, 18, 12, 10, 8, 7, 6, 5, 5], start=1):
+    benfordish[d] = count
+
+  pages = [0, 1, 2, 3]
+  matrix = benfordish + counts_of([9] * 50) + counts_of([9] * 5) + counts_of([1])
+
+  scores = pagematrix.score_pages(pages, matrix, min_numbers=2)
+
+  assert [score['page'] for score in scores] == [2, 3, 1]
+
+  for score in scores:
+    counts = score['counts']
+    n = sum(counts)
+    expected = [n * benford.EXPECTED['first'][d] for d in range(1, 10)]
+    chi_square = sum((c - e) ** 2 / e
+                     for (c, e) in zip(counts, expected, strict=True))
+    mad = benford.mean_absolute_deviation('first', [0] + counts)
+
+    assert score['n'] == n
+    assert score['chi_square'] == pytest.approx(chi_square, abs=1e-4)
+    assert score['mad'] == pytest.approx(mad, abs=1e-6)
+
+  assert scores[-1]['conformity'] != scores[0]['conformity']
@@ -0,0 +1,75 @@
+#
+# test_rawtext.py
+#
+# How far the raw extractor's numbers are from those of pypdf's
+# layout extractor, on the sample PDF (see rawtext.py). Needs pypdf.
+#
+
+from collections import Counter
+
+import extraction
+import fakes
+import pytest
+import tally
+
+pytest.importorskip("pypdf")
+
+
+@pytest.fixture(scope="module")
+def numbers():
+  """
+  extractor -> the numbers found on each page.
+  """
+
+  from pypdf import PdfReader
+
+  reader = PdfReader(fakes.SAMPLE_PDF)
+  found = {'layout': [], 'raw': []}
+
+  for page in reader.pages:
+    for (extractor, pages) in found.items():
+      page_numbers = []
+      tally.tally_text(extraction.page_text(page, extractor), tally.new_histograms(),
+                       numbers=page_numbers)
+      pages.append(Counter(page_numbers))
+
+  return found
+
+
+def test_totals(numbers):
+  layout = sum(sum(page.values()) for page in numbers['layout'])
+  raw = sum(sum(page.values()) for page in numbers['raw'])
+
+  assert (layout, raw) == (2264, 2246)
+
+
+def test_most_pages_agree(numbers):
+  pairs = list(zip(numbers['layout'], numbers['raw'], strict=True))
+  same = [layout == raw for (layout, raw) in pairs]
+
+  assert sum(same) == 21
+  assert sum(same) >= 0.75 * len(pairs)
+
+
+def test_first_digits_close(numbers):
+  proportions = {}
+
+  for (extractor, pages) in numbers.items():
+    histograms = tally.new_histograms()
+    tally.tally_digits(list(sum(pages, Counter()).elements()), histograms)
+    n = sum(histograms['first'])
+    proportions[extractor] = [count / n for count in histograms['first']]
+
+  for d in range(1, 10):
+    assert abs(proportions['raw'][d] - proportions['layout'][d]) < 0.005
+
+
+def test_split_runs(numbers):
+  #
+  # page 10 has "COVID-19" four times: extract_text() gives
+  # "COVID -19", and so a 19
+  #
+  difference = numbers['layout'][9] - numbers['raw'][9]
+
+  assert difference['19'] == 4
+  assert numbers['raw'][9] - numbers['layout'][9] == Counter()
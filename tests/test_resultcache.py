@@ -0,0 +1,139 @@
+#
+# test_resultcache.py
+#
+# The content-addressed results cache, on the stand-ins of
+# fakes.py.
+#
+
+import hashlib
+import io
+import sqlite3
+
+import datatier
+import fakes
+import pytest
+import resultcache
+
+DIGEST = hashlib.sha256(b"%PDF-1.4 a").hexdigest()
+
+
+@pytest.fixture
+def database(tmp_path):
+  path = str(tmp_path / "benfordapp.db")
+  fakes.create_database(path)
+  return path
+
+
+@pytest.fixture
+def dbConn(database):
+  conn = fakes.SnapshotConnection(database)
+  yield conn
+  conn.close()
+
+
+def lookup(dbConn, digest=DIGEST, variant=resultcache.RESULTS_VERSION):
+  try:
+    return resultcache.lookup(dbConn, digest, variant, 30)
+  finally:
+    dbConn.rollback()
+
+
+def stats(dbConn):
+  sql = "SELECT name, value FROM cachestats"
+  try:
+    return dict(datatier.retrieve_all_rows(dbConn, sql))
+  finally:
+    dbConn.rollback()
+
+
+def last_used_days_ago(database, days):
+  conn = sqlite3.connect(database)
+  conn.execute("UPDATE resultcache SET lastused = datetime('now', ?)",
+               ("-" + str(days) + " days",))
+  conn.commit()
+  conn.close()
+
+
+def test_digest(tmp_path):
+  path = tmp_path / "a.pdf"
+  path.write_bytes(b"%PDF-1.4 a")
+
+  assert resultcache.digest_of(str(path)) == DIGEST
+  assert resultcache.digest_of(io.BytesIO(b"%PDF-1.4 a")) == DIGEST
+
+
+@pytest.mark.parametrize("extractor, backend, suffix", [
+  ('layout', 'regex', ""),
+  ('raw', 'regex', "-raw"),
+  ('layout', 'tokens-de', "-tokens-de"),
+  ('raw', 'tokens', "-raw-tokens"),
+])
+def test_variant(extractor, backend, suffix):
+  variant = resultcache.variant_of(extractor, backend)
+
+  assert variant == resultcache.RESULTS_VERSION + suffix
+
+
+def test_miss_then_hit(dbConn):
+  assert lookup(dbConn) is None
+
+  resultcache.store(dbConn, DIGEST, "u/a.txt", "u/a.pdf")
+
+  assert lookup(dbConn) == ("u/a.txt", "u/a.pdf")
+  assert lookup(dbConn) == ("u/a.txt", "u/a.pdf")
+
+  assert stats(dbConn)['misses'] == 1
+  assert stats(dbConn)['hits'] == 2
+
+  hits = datatier.retrieve_one_row(dbConn, "SELECT hits FROM resultcache")
+  assert hits == (2,)
+
+
+def test_variants_are_separate(dbConn):
+  raw = resultcache.variant_of('raw', 'regex')
+  resultcache.store(dbConn, DIGEST, "u/a.txt", "u/a.pdf", raw)
+
+  assert lookup(dbConn) is None
+  assert lookup(dbConn, variant=raw) == ("u/a.txt", "u/a.pdf")
+
+
+def test_stale_entries(database, dbConn):
+  resultcache.store(dbConn, DIGEST, "u/a.txt", "u/a.pdf")
+  last_used_days_ago(database, 31)
+
+  assert lookup(dbConn) is None
+
+  #
+  # the next store evicts it
+  #
+  other = hashlib.sha256(b"%PDF-1.4 b").hexdigest()
+  resultcache.store(dbConn, other, "u/b.txt", "u/b.pdf")
+
+  assert stats(dbConn)['evictions'] == 1
+  digests = datatier.retrieve_all_rows(dbConn, "SELECT digest FROM resultcache")
+
+  assert digests == ((other,),)
+
+
+def test_hit_refreshes_the_entry(database, dbConn):
+  resultcache.store(dbConn, DIGEST, "u/a.txt", "u/a.pdf")
+  last_used_days_ago(database, 29)
+
+  assert lookup(dbConn) is not None
+  assert resultcache.evict(dbConn, 1) == 0
+
+
+def test_forget(dbConn):
+  resultcache.store(dbConn, DIGEST, "u/a.txt", "u/a.pdf")
+  resultcache.forget(dbConn, DIGEST)
+
+  assert lookup(dbConn) is None
+
+
+def test_copy_results(tmp_path):
+  bucket = fakes.FakeBucket(tmp_path)
+  bucket.put_object(Key="u/a.txt", Body="results")
+
+  resultcache.copy_results(bucket, "u/a.txt", "u/b.txt")
+
+  assert bucket.read("u/b.txt") == b"results"
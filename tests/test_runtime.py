@@ -0,0 +1,87 @@
+#
+# test_runtime.py
+#
+# The database connection that runtime.py keeps across warm
+# invocations must not carry a transaction, and its snapshot, from
+# one invocation into the next.
+#
+
+import importlib
+
+import datatier
+import fakes
+import pytest
+import runtime
+
+KEY = "benfordapp/u/a.pdf"
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+  path = str(tmp_path / "benfordapp.db")
+
+  fakes.create_database(path)
+  fakes.add_job(path, KEY)
+
+  config = tmp_path / "config.ini"
+  config.write_text("[rds]\n"
+                    "endpoint = localhost\nport_number = 3306\n"
+                    "user_name = u\nuser_pwd = p\ndb_name = benfordapp\n")
+
+  monkeypatch.setattr(datatier, "get_dbConn", lambda *_args: fakes.SnapshotConnection(path))
+
+  importlib.reload(runtime)
+  monkeypatch.setattr(runtime, "CONFIG_FILE", str(config))
+
+  return path
+
+
+def status_of(dbConn):
+  return datatier.retrieve_one_row(dbConn, "SELECT status FROM jobs WHERE datafilekey = %s", [KEY])[0]
+
+
+def test_snapshot_emulation_is_stale_without_rollback(database):
+  #
+  # the stand-in reproduces the problem: an open transaction
+  # does not see a change committed by another connection
+  #
+  reader = fakes.SnapshotConnection(database)
+  writer = fakes.SnapshotConnection(database)
+
+  assert status_of(reader) == 'pending'
+
+  datatier.perform_action(writer, "UPDATE jobs SET status = 'completed' WHERE datafilekey = %s", [KEY])
+
+  assert status_of(reader) == 'pending'
+
+
+def test_warm_invocation_sees_committed_changes(database):
+  runtime.start_invocation()
+  dbConn = runtime.db_conn()
+
+  assert status_of(dbConn) == 'pending'
+
+  #
+  # another function (proj04_compute) completes the job
+  #
+  writer = fakes.SnapshotConnection(database)
+  datatier.perform_action(writer, "UPDATE jobs SET status = 'completed' WHERE datafilekey = %s", [KEY])
+
+  runtime.start_invocation()
+  warm = runtime.db_conn()
+
+  assert warm is dbConn
+  assert runtime.stats()['reuses'] == 1
+  assert status_of(warm) == 'completed'
+
+
+def test_db_conn_within_an_invocation_sees_committed_changes(database):
+  runtime.start_invocation()
+  dbConn = runtime.db_conn()
+
+  assert status_of(dbConn) == 'pending'
+
+  writer = fakes.SnapshotConnection(database)
+  datatier.perform_action(writer, "UPDATE jobs SET status = 'completed' WHERE datafilekey = %s", [KEY])
+
+  assert status_of(runtime.db_conn()) == 'completed'
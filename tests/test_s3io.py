@@ -0,0 +1,124 @@
+#
+# test_s3io.py
+#
+# Streaming S3 objects into memory or a spill file, and releasing
+# them, on the S3 stand-in of fakes.py.
+#
+
+import io
+import os
+from concurrent.futures import Future
+
+import fakes
+import pytest
+import s3io
+
+THRESHOLD = 1024
+
+
+class Body(io.BytesIO):
+  """
+  A botocore StreamingBody, which can fail partway through.
+  """
+
+  def __init__(self, data, fail=False):
+    super().__init__(data)
+    self.fail = fail
+
+  def iter_chunks(self, chunk_size):
+    while True:
+      chunk = self.read(chunk_size)
+      if not chunk:
+        break
+      yield chunk
+    if self.fail:
+      raise ConnectionResetError("connection reset")
+
+
+class Stream(fakes.FakeObject):
+  def __init__(self, bucket, key, length, fail=False):
+    super().__init__(bucket, key)
+    self.length = length
+    self.fail = fail
+    self.body = None
+
+  def get(self, **_kwargs):
+    self.body = Body(self.bucket.read(self.key), self.fail)
+    return {'Body': self.body, 'ContentLength': self.length}
+
+
+@pytest.fixture
+def bucket(tmp_path, monkeypatch):
+  monkeypatch.setattr(s3io, "CHUNK_SIZE", 100)
+  return fakes.FakeBucket(tmp_path / "s3")
+
+
+@pytest.fixture
+def spill_dir(tmp_path, monkeypatch):
+  folder = tmp_path / "spill"
+  folder.mkdir()
+
+  def spill_file():
+    return open(folder / "data-spill.pdf", "w+b")
+
+  monkeypatch.setattr(s3io, "_spill_file", spill_file)
+  return folder
+
+
+def read(bucket, data, length=None, fail=False):
+  bucket.put_object(Key="u/a.pdf", Body=data)
+  obj = Stream(bucket, "u/a.pdf", len(data) if length is None else length, fail)
+  bucket.Object = lambda _key: obj
+  return s3io.read_object(bucket, "u/a.pdf", THRESHOLD), obj.body
+
+
+@pytest.mark.usefixtures("spill_dir")
+def test_small_object_stays_in_memory(bucket):
+  ((source, size), body) = read(bucket, b"x" * THRESHOLD)
+
+  assert (source.read(), size) == (b"x" * THRESHOLD, THRESHOLD)
+  assert body.closed
+
+
+@pytest.mark.parametrize("length", [THRESHOLD + 1, 0])
+def test_large_object_spills(bucket, spill_dir, length):
+  #
+  # ContentLength 0 stands for an object whose size S3 did not
+  # give: it spills once the buffer passes the threshold
+  #
+  data = os.urandom(5 * THRESHOLD)
+  ((source, size), body) = read(bucket, data, length)
+
+  assert source == str(spill_dir / "data-spill.pdf")
+  with open(source, "rb") as infile:
+    assert (infile.read(), size) == (data, len(data))
+  assert body.closed
+
+  s3io.discard(source)
+
+  assert os.listdir(spill_dir) == []
+
+
+def test_failed_read_removes_the_spill_file(bucket, spill_dir):
+  with pytest.raises(ConnectionResetError):
+    read(bucket, os.urandom(5 * THRESHOLD), fail=True)
+
+  assert os.listdir(spill_dir) == []
+
+
+def test_discard_when_read(spill_dir):
+  path = spill_dir / "data-spill.pdf"
+  path.write_bytes(b"%PDF")
+
+  done = Future()
+  done.set_result((str(path), 4))
+  s3io.discard_when_read(done)
+
+  assert not path.exists()
+
+  #
+  # a failed read has nothing to release, and must not raise
+  #
+  failed = Future()
+  failed.set_exception(ConnectionResetError("connection reset"))
+  s3io.discard_when_read(failed)
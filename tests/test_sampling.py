@@ -0,0 +1,38 @@
+#
+# test_sampling.py
+#
+# Choosing the pages of a stratified random sample.
+#
+
+import pytest
+import sampling
+
+
+@pytest.mark.parametrize("number_of_pages, pages", [(100, 10), (7, 3), (1000, 1), (50, 49)])
+def test_one_page_from_each_stratum(number_of_pages, pages):
+  sample = sampling.plan_sample(number_of_pages, pages=pages, seed="benfordapp/u/a.pdf")
+
+  assert len(sample) == pages
+  assert sample == sorted(set(sample))
+
+  for (k, page) in enumerate(sample):
+    assert (k * number_of_pages) // pages <= page < ((k + 1) * number_of_pages) // pages
+
+
+def test_percent():
+  assert len(sampling.plan_sample(200, percent=10)) == 20
+  assert len(sampling.plan_sample(15, percent=10)) == 2
+  assert len(sampling.plan_sample(5, percent=0.1)) == 1
+
+
+def test_whole_document():
+  assert sampling.plan_sample(8, pages=8) == list(range(0, 8))
+  assert sampling.plan_sample(8, pages=20) == list(range(0, 8))
+  assert sampling.plan_sample(8, percent=100) == list(range(0, 8))
+
+
+def test_seeded():
+  first = sampling.plan_sample(500, pages=25, seed="a.pdf")
+
+  assert sampling.plan_sample(500, pages=25, seed="a.pdf") == first
+  assert sampling.plan_sample(500, pages=25, seed="b.pdf") != first
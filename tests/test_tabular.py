@@ -0,0 +1,117 @@
+#
+# test_tabular.py
+#
+# Tallying CSV, TSV and text files without pypdf.
+#
+
+import io
+
+import numstore
+import pytest
+import tabular
+import tally
+
+
+def count(data, kind, columns=None, filters=None):
+  source = io.BytesIO(data.encode('utf-8'))
+  numbers = numstore.Numbers()
+  (size, histograms) = tabular.count_document(source, kind, columns, numbers=numbers, filters=filters)
+  return size, histograms, numbers.digits
+
+
+def reference(text):
+  histograms = tally.new_histograms()
+  tally.tally_text(text, histograms)
+  return histograms
+
+
+def test_kinds():
+  assert tabular.kind_of("u/a.CSV") == 'csv'
+  assert tabular.kind_of("u/a.pdf") is None
+  assert tabular.unit_of("u/a.tsv") == "rows"
+  assert tabular.unit_of("u/a.txt") == "pages"
+  assert tabular.results_key("u/a.csv") == "u/a.txt"
+  assert tabular.results_key("u/a.txt") == "u/a.results.txt"
+
+
+@pytest.mark.parametrize("header", ["Region,Q1 2024,Q2 2024", "Region,Sales,Costs"])
+def test_header_is_not_data(header):
+  data = header + "\nNorth,1234,5678\nSouth,99,101\n"
+
+  (rows, histograms, digits) = count(data, 'csv')
+
+  assert rows == 2
+  assert digits == ["1234", "5678", "99", "101"]
+  assert histograms == reference("1234 5678 99 101")
+
+
+def test_no_header():
+  (rows, _, digits) = count("1234,5678\n99,101\n", 'csv')
+
+  assert rows == 2
+  assert digits == ["1234", "5678", "99", "101"]
+
+
+def test_byte_order_mark():
+  (rows, _, digits) = count("\ufeffAmount\n12\n345\n", 'csv')
+
+  assert (rows, digits) == (2, ["12", "345"])
+
+
+def test_columns_by_name():
+  data = "Id,Amount,Note\n7,1234,x 99\n8,\"5,678\",\n"
+
+  (rows, _, digits) = count(data, 'csv', columns=["Amount"])
+
+  assert (rows, digits) == (2, ["1234", "5678"])
+
+  with pytest.raises(Exception, match="no column 'Total'"):
+    count(data, 'csv', columns=["Total"])
+
+
+def test_columns_by_position():
+  data = "Id\tAmount\n7\t1234\n8\t99\n9\n"
+
+  (rows, _, digits) = count(data, 'tsv', columns=[2])
+
+  assert (rows, digits) == (3, ["1234", "99"])
+
+  (rows, _, digits) = count("7\t1234\n8\t99\n", 'tsv', columns=[1, 2])
+
+  assert (rows, digits) == (2, ["7", "1234", "8", "99"])
+
+
+def test_blocks(monkeypatch):
+  monkeypatch.setattr(tabular, "BLOCK_ROWS", 2)
+
+  page_counts = []
+  tabular.count_document(io.BytesIO(b"1\n2\n3\n4\n5\n"), 'csv', page_counts=page_counts)
+
+  assert [first for (first, _) in page_counts] == [0, 2, 4]
+  assert page_counts[2][1][5] == 1
+
+
+def test_form_feed_pages():
+  data = "Page 1\nrevenue 1234\n\fPage 2\ncosts 567\n2023\n\f"
+
+  (pages, histograms, digits) = count(data, 'text')
+
+  assert pages == 2
+  assert digits == ["1", "1234", "2", "567", "2023"]
+  assert histograms == reference(data)
+
+  #
+  # page numbers are only looked for on form feed pages
+  #
+  (pages, _, digits) = count(data, 'text', filters={'skip_page_numbers': True})
+
+  assert (pages, digits) == (2, ["1234", "567", "2023"])
+
+
+def test_text_without_form_feeds(monkeypatch):
+  monkeypatch.setattr(tabular, "BLOCK_LINES", 2)
+
+  (pages, _, digits) = count("Page 1\n10\n20\n30\n40\n", 'text', filters={'skip_page_numbers': True})
+
+  assert pages == 3
+  assert digits == ["1", "10", "20", "30", "40"]
@@ -0,0 +1,133 @@
+#
+# test_tally.py
+#
+# The tally backends must agree: every backend counts the same
+# digits on text whose numbers are plain whitespace-delimited
+# integers, and the regex backend matches the python reference on
+# any ASCII text (see tally.py).
+#
+
+import random
+
+import pytest
+import tally
+
+#
+# text on which every backend reads the same numbers
+#
+SHARED = [
+  "",
+  "no numbers on this page",
+  "revenue 1234 and 56 units over 7 years",
+  "ids 0042 007 000 0 900 1000000",
+  "columns\n12\n345\t6789 10 11 99\n",
+  "9 98 987 9876 98765 987654 9876543 98765432109876543210",
+  "1 2 3 4 5 6 7 8 9 10 20 30 40 50 60 70 80 90 100",
+]
+
+
+def punctuated_page(rng, words_per_page=600, numeric_fraction=0.4):
+  """
+  A page of prose, figures and table cells, with punctuation:
+  thousands separators, currency, parentheses and decimals.
+  """
+
+  prose = ["the", "total", "revenue", "(net)", "for", "Q3", "was", "as",
+           "follows:", "see", "note", "FY2023", "in", "USD", "—", "and"]
+  words = []
+
+  for _ in range(words_per_page):
+    if rng.random() < numeric_fraction:
+      kind = rng.randrange(5)
+      value = int(10 ** rng.uniform(0, 7))
+      if kind == 0:
+        words.append(str(value))
+      elif kind == 1:
+        words.append("{:,}".format(value))
+      elif kind == 2:
+        words.append("$" + "{:,.2f}".format(value / 100))
+      elif kind == 3:
+        words.append("(" + str(value) + ")")
+      else:
+        words.append("0." + str(value).zfill(6))
+    else:
+      words.append(rng.choice(prose))
+
+    if rng.random() < 0.08:
+      words.append("\n")
+
+  return " ".join(words)
+
+
+def plain_page(rng, words=400):
+  """
+  A page of prose and integers, some with leading zeros.
+  """
+
+  prose = ["the", "total", "for", "was", "see", "note", "in", "and"]
+  parts = []
+
+  for _ in range(words):
+    if rng.random() < 0.4:
+      parts.append("0" * rng.randrange(3) + str(int(10 ** rng.uniform(0, 9))))
+    else:
+      parts.append(rng.choice(prose))
+
+  return " ".join(parts)
+
+
+def tally_all(pages, backend, min_digits=1):
+  histograms = tally.new_histograms()
+  numbers = []
+  filters = {'min_digits': min_digits} if min_digits > 1 else None
+  count = 0
+
+  for text in pages:
+    count += tally.tally_text(text, histograms, backend, numbers, filters)
+
+  return count, histograms, numbers
+
+
+@pytest.mark.parametrize("text", SHARED)
+def test_backends_agree_on_shared_fixtures(text):
+  reference = tally_all([text], 'python')
+
+  for backend in tally.BACKENDS:
+    assert tally_all([text], backend) == reference, backend
+
+
+@pytest.mark.parametrize("min_digits", [1, 2, 4])
+def test_backends_agree_on_generated_pages(min_digits):
+  rng = random.Random(310)
+  pages = [plain_page(rng) for _ in range(20)]
+
+  reference = tally_all(pages, 'python', min_digits)
+
+  assert reference[0] > 0
+
+  for backend in tally.BACKENDS:
+    assert tally_all(pages, backend, min_digits) == reference, backend
+
+
+def test_regex_matches_python_on_punctuated_pages():
+  rng = random.Random(310)
+  pages = [punctuated_page(rng) for _ in range(20)]
+
+  assert tally_all(pages, 'regex') == tally_all(pages, 'python')
+
+
+def test_digit_slots():
+  (count, histograms, numbers) = tally_all(["0042 7 1906"], 'regex')
+
+  assert count == 3
+  assert numbers == ["42", "7", "1906"]
+  assert [histograms['first'][d] for d in (1, 4, 7)] == [1, 1, 1]
+  assert [histograms['second'][d] for d in (2, 9)] == [1, 1]
+  assert [histograms['first_two'][d] for d in (19, 42)] == [1, 1]
+  assert [histograms['last_two'][d] for d in (6, 42)] == [1, 1]
+  assert sum(histograms['second']) == 2
+
+
+def test_unknown_backend():
+  with pytest.raises(ValueError):
+    tally.tally_text("1 2 3", tally.new_histograms(), 'nope')
@@ -0,0 +1,63 @@
+#
+# test_textfilter.py
+#
+# The skip_page_numbers and skip_dates filters must remove page
+# numbers and dates, and nothing else.
+#
+
+import pytest
+import textfilter
+
+
+@pytest.mark.parametrize("text, expected", [
+  ("Page 12\nTotal 500\n", "\nTotal 500\n"),
+  ("Total 500\npg. 7", "Total 500\n"),
+  ("p. 4\nTotal 500\nPage 4 of 40", "\nTotal 500\n"),
+  ("Total 500\n  12 of 40  \n\n", "Total 500\n\n\n"),
+  ("12/40\nTotal 500", "\nTotal 500"),
+  ("- 12 -\nTotal 500\n— 13 —", "\nTotal 500\n"),
+])
+def test_page_numbers(text, expected):
+  assert textfilter.strip_page_numbers(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+  "12\nTotal 500\n2023",                 # figures on lines of their own
+  "Total\n500",
+  "Page 12 shows\nTotal 500",
+  "Total 500\nPage 12\nTotal 600",      # not the first or last line
+])
+def test_figures_are_not_page_numbers(text):
+  assert textfilter.strip_page_numbers(text) == text
+
+
+@pytest.mark.parametrize("date", [
+  "12/31/2023", "31/12/2023", "2023-12-31", "2023/1/5", "31.12.23",
+  "1.5.2023", "12-31-2023", "March 5, 2024", "Mar. 5th 2024",
+  "5 Mar 2024", "21st September", "March 2024",
+])
+def test_dates(date):
+  assert textfilter.strip_dates("due " + date + " at 500") == "due   at 500"
+
+
+@pytest.mark.parametrize("text", [
+  "3.14.15",        # day.month.year: no month 14
+  "1.50.2023",
+  "12-10-5",        # a one-digit year
+  "13/13/2023",
+  "2023-13-01",
+  "2023-12-32",
+  "0/5/2023",
+  "March 45, 2024",
+  "1.2.3.4",
+])
+def test_not_dates(text):
+  assert textfilter.strip_dates(text) == text
+
+
+def test_apply():
+  text = "Page 3\nOn 12/31/2023 we paid 500\n"
+
+  assert textfilter.apply(text, {'skip_dates': True}) == "Page 3\nOn   we paid 500\n"
+  assert textfilter.apply(text, {'skip_page_numbers': True, 'skip_dates': True}) == "\nOn   we paid 500\n"
+  assert textfilter.apply(text, {'min_digits': 2}) == text
@@ -0,0 +1,69 @@
+#
+# test_tokenizer.py
+#
+# The numbers the locale-aware tokenizer reads, and the tokens
+# backend of tally.py built on it.
+#
+
+import random
+
+import pytest
+import tally
+import tokenizer
+from test_tally import punctuated_page
+
+
+@pytest.mark.parametrize("text, numbers", [
+  ("1,234 12,345,678", ["1234", "12345678"]),
+  ("-0.045 +7 3.14 .5", ["45", "7", "314", "5"]),
+  ("4.5e3 1E-2 6.02e23", ["45", "1", "602"]),
+  ("($1,234) 12.5% €3.50", ["1234", "125", "350"]),
+  ("0 000 0.0", []),
+])
+def test_numbers(text, numbers):
+  assert list(tokenizer.iter_numbers(text)) == numbers
+
+
+@pytest.mark.parametrize("text", ["½", "²", "3²", "x2", "1,2,3", "1,23", "12,34,567"])
+def test_not_numbers(text):
+  assert list(tokenizer.iter_numbers(text)) == []
+
+
+def test_german_locale():
+  text = "1.234,56 1,5 12.345.678 1,234.56"
+
+  assert list(tokenizer.iter_numbers(text, 'de')) == ["123456", "15", "12345678"]
+
+
+def test_unknown_locale():
+  with pytest.raises(ValueError):
+    tokenizer.pattern_for('xx')
+
+
+@pytest.mark.parametrize("min_digits", [1, 3])
+def test_tokens_backend_without_numbers(min_digits):
+  #
+  # counting the tokens as they are read gives what counting the
+  # list of numbers kept gives
+  #
+  rng = random.Random(310)
+  filters = {'min_digits': min_digits}
+
+  for _ in range(10):
+    text = punctuated_page(rng)
+    kept = tally.new_histograms()
+    streamed = tally.new_histograms()
+    numbers = []
+
+    count = tally.tally_text(text, kept, 'tokens', numbers, filters)
+
+    assert count == len(numbers)
+    assert tally.tally_text(text, streamed, 'tokens', None, filters) == count
+    assert streamed == kept
+
+
+def test_tokens_backend_locale():
+  histograms = tally.new_histograms()
+
+  assert tally.tally_text("1.234,5 7,25", histograms, 'tokens-de') == 2
+  assert [histograms['first'][d] for d in (1, 7)] == [1, 1]